@@ -0,0 +1,185 @@
+"""
+Сквозной бенчмарк бота: все хендлеры из main.py на настоящем `Dispatcher`.
+
+Вместо Telegram используется `FakeSession`: она запоминает вызовы Bot API
+и сразу возвращает правдоподобный ответ (сообщение с новым message_id),
+поэтому измеряется только работа бота — фильтры, FSM, хендлеры, сервисы.
+Планировщик исходящих сообщений не подключается: его лимиты (30 сообщений
+в секунду) ограничили бы бенчмарк, а не бота.
+
+Каждый клиент проходит сценарий "старт → карточка → ответ":
+    /start → "Начать" → "Да" (карточка уходит менеджеру) →
+    ответ менеджера на карточку → сообщение клиента менеджеру.
+Клиенты работают параллельно, обновления одного клиента идут по порядку,
+как при обработке в aiogram.
+
+Отчет: обновлений в секунду, p50/p99 времени обработки одного обновления
+и память на одного активного клиента (отдельным прогоном под tracemalloc).
+
+Запуск:
+    python benchmarks/bot_bench.py [количество_клиентов] [одновременно]
+"""
+import asyncio
+import gc
+import itertools
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Any
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+MANAGER_ID = 1
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "1:bench")
+os.environ.setdefault("MANAGER_CHAT_ID", str(MANAGER_ID))
+os.environ.setdefault("MEDIA_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "media_cache.json"))
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat, Message, MessageId, Update, User
+
+import main
+
+CARD_USER_ID = re.compile(r"ID: (\d+)")
+
+
+class FakeSession(BaseSession):
+    """
+    Сессия Bot API без сети: считает вызовы по методам и отвечает сразу.
+    Запоминает ID карточек, чтобы менеджер мог ответить на них.
+    """
+    def __init__(self):
+        super().__init__()
+        self.calls: Counter[str] = Counter()
+        self.cards: dict[int, int] = {}
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: int | None = None) -> Any:
+        self.calls[type(method).__name__] += 1
+        returning = method.__returning__
+        if returning is Message:
+            chat_id = method.chat_id
+            message = Message(
+                message_id=next(self._message_ids), date=datetime.now(),
+                chat=Chat(id=chat_id, type="private"), text=getattr(method, "text", None),
+            )
+            if chat_id == MANAGER_ID and message.text and (match := CARD_USER_ID.search(message.text)):
+                self.cards[int(match.group(1))] = message.message_id
+            return message
+        if returning is MessageId:
+            return MessageId(message_id=next(self._message_ids))
+        if returning is bool:
+            return True
+        return []
+
+    async def stream_content(self, *args: Any, **kwargs: Any):
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+class Flow:
+    """
+    Генератор обновлений сценария для одного клиента.
+    """
+    _update_ids = itertools.count(1)
+
+    def __init__(self, bot: Bot, cards: dict[int, int]):
+        self.bot = bot
+        # user_id -> ID карточки клиента в чате менеджера
+        self.cards = cards
+
+    def _update(self, user_id: int, text: str, reply_to: int | None = None) -> Update:
+        user = User(id=user_id, is_bot=False, first_name=f"Client{user_id}", username=f"client{user_id}")
+        reply = None
+        if reply_to is not None:
+            reply = Message(message_id=reply_to, date=datetime.now(), chat=Chat(id=user_id, type="private"))
+        update_id = next(self._update_ids)
+        message = Message(
+            message_id=update_id, date=datetime.now(), chat=Chat(id=user_id, type="private"),
+            from_user=user, text=text, reply_to_message=reply,
+        )
+        return Update.model_validate(
+            Update(update_id=update_id, message=message).model_dump(), context={"bot": self.bot}
+        )
+
+    async def run(self, user_id: int, latencies: list[float]) -> None:
+        steps = [
+            lambda: self._update(user_id, "/start"),
+            lambda: self._update(user_id, "Начать"),
+            lambda: self._update(user_id, "Да"),
+            lambda: self._update(MANAGER_ID, "Здравствуйте! Чем помочь?", reply_to=self.cards[user_id]),
+            lambda: self._update(user_id, "Хочу дом у озера"),
+        ]
+        for step in steps:
+            update = step()
+            start = time.perf_counter()
+            await main.dp.feed_update(self.bot, update)
+            latencies.append(time.perf_counter() - start)
+
+
+async def run_clients(flow: Flow, user_ids: range, concurrency: int, latencies: list[float]) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(user_id: int) -> None:
+        async with semaphore:
+            await flow.run(user_id, latencies)
+
+    await asyncio.gather(*(one(user_id) for user_id in user_ids))
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def bench(clients: int, concurrency: int) -> None:
+    # aiogram пишет строку в лог на каждое обновление
+    logging.disable(logging.INFO)
+    session = FakeSession()
+    bot = main.bot
+    await bot.session.close()
+    bot.session = session
+    main.register_handlers()
+    flow = Flow(bot, session.cards)
+
+    # Прогрев
+    await run_clients(flow, range(10_000, 10_000 + min(clients, 1000)), concurrency, [])
+
+    latencies: list[float] = []
+    start = time.perf_counter()
+    await run_clients(flow, range(100_000, 100_000 + clients), concurrency, latencies)
+    elapsed = time.perf_counter() - start
+
+    # Память: сколько остается после сценария на каждого клиента, который ждет менеджера
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    await run_clients(flow, range(1_000_000, 1_000_000 + clients), concurrency, [])
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+    await main.reminder_scheduler.close()
+    print(f"Клиентов: {clients:,}, одновременно: {concurrency}, обновлений: {len(latencies):,}")
+    print(f"Пропускная способность: {len(latencies) / elapsed:9,.0f} обновлений/с")
+    print(f"Обработка обновления:   p50 {percentile(latencies, 0.5) * 1000:.3f} мс, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.3f} мс")
+    print(f"Память на клиента:      {retained / clients:,.0f} байт")
+    print("Вызовы Bot API:", ", ".join(f"{name} {count:,}" for name, count in session.calls.most_common()))
+
+
+if __name__ == "__main__":
+    asyncio.run(bench(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 5_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 100,
+    ))
@@ -0,0 +1,121 @@
+"""
+Бенчмарк маршрутизации сообщений: цепочка фильтров aiogram против DispatchIndex.
+
+Прежняя схема из main.py: Command("start"), кнопка "Начать", три фильтра
+состояний FSM, Command("manager") и две лямбды "менеджер/клиент", после
+которых обработчик клиента еще раз читает состояние из хранилища.
+Новая схема: один обработчик `DispatchIndex.dispatch`.
+
+Обработчики ничего не делают, поэтому измеряется только стоимость
+маршрутизации. Смесь обновлений: 70% — сообщения клиентов вне сценария,
+20% — сообщения менеджера, 10% — ответы клиентов внутри сценария FSM.
+
+Запуск:
+    python benchmarks/dispatch_bench.py [количество_обновлений]
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram import Bot, Dispatcher, F
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Chat, Message, Update, User
+
+from dispatch_index import DispatchIndex
+from states import Form
+
+MANAGER_ID = 1
+CLIENTS = 1000
+
+
+async def noop(message: Message) -> None:
+    pass
+
+
+async def client_handler(message: Message, state: FSMContext) -> None:
+    # Как прежний user_to_manager: повторное чтение состояния
+    if await state.get_state() is not None:
+        return
+
+
+def build_chain(storage: MemoryStorage) -> Dispatcher:
+    dp = Dispatcher(storage=storage)
+    dp.message(Command("start"))(noop)
+    dp.message(F.text == "Начать", Form.waiting_for_start)(noop)
+    dp.message(Form.waiting_for_houses)(noop)
+    dp.message(Form.waiting_for_questions)(noop)
+    dp.message(Form.waiting_for_house_choice)(noop)
+    dp.message(Command("manager"))(noop)
+    dp.message(lambda m: m.from_user.id == MANAGER_ID)(noop)
+    dp.message(lambda m: m.from_user.id != MANAGER_ID)(client_handler)
+    return dp
+
+
+def build_index(storage: MemoryStorage) -> Dispatcher:
+    index = DispatchIndex(lambda user_id: user_id == MANAGER_ID)
+    index.add(noop, text="/start")
+    index.add(noop, text="Начать", state=Form.waiting_for_start)
+    index.add(noop, state=Form.waiting_for_houses)
+    index.add(noop, state=Form.waiting_for_questions)
+    index.add(noop, state=Form.waiting_for_house_choice)
+    index.add(noop, text="/manager")
+    index.add(noop, manager=True)
+    index.add(noop, manager=False, state=None)
+    dp = Dispatcher(storage=storage)
+    dp.message()(index.dispatch)
+    return dp
+
+
+def make_updates(count: int) -> list[Update]:
+    updates = []
+    for i in range(count):
+        if i % 10 < 7:
+            user_id = 100 + i % CLIENTS
+        elif i % 10 < 9:
+            user_id = MANAGER_ID
+        else:
+            user_id = 100 + CLIENTS + i % CLIENTS  # клиенты внутри сценария
+        user = User(id=user_id, is_bot=False, first_name="Bench")
+        message = Message(
+            message_id=i, date=datetime.now(), chat=Chat(id=user_id, type="private"),
+            from_user=user, text="Здравствуйте",
+        )
+        updates.append(Update(update_id=i, message=message))
+    return updates
+
+
+async def measure(build, updates: list[Update]) -> float:
+    storage = MemoryStorage()
+    # Обработчики не обращаются к API, поэтому токен может быть любым
+    bot = Bot(token="1:bench")
+    for user_id in range(100 + CLIENTS, 100 + 2 * CLIENTS):
+        await storage.set_state(StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id), Form.waiting_for_houses)
+    dp = build(storage)
+    for update in updates[:1000]:  # прогрев
+        await dp.feed_update(bot, update)
+    start = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    elapsed = time.perf_counter() - start
+    await bot.session.close()
+    return len(updates) / elapsed
+
+
+async def main(count: int) -> None:
+    updates = make_updates(count)
+    chain = await measure(build_chain, updates)
+    index = await measure(build_index, updates)
+    print(f"Обновлений: {count:,}")
+    print(f"Цепочка фильтров: {chain:9,.0f} обновлений/с")
+    print(f"DispatchIndex:    {index:9,.0f} обновлений/с ({index / chain:.2f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000))
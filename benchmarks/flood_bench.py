@@ -0,0 +1,106 @@
+"""
+Бенчмарк `FloodControl`: миллион разных клиентов и один флудер.
+
+Время виртуальное. Каждую секунду пишут `ARRIVALS` новых клиентов (по
+одному сообщению), а один клиент присылает `SPAM_RATE` сообщений в секунду.
+Отчет: время проверки одного сообщения, максимум отслеживаемых клиентов
+и память структур middleware (словарь bucket-ов и колесо таймеров) — она
+определяется клиентами за последние `burst / rate` секунд, а не их общим
+числом, — и сколько сообщений флудера дошло до хендлера.
+
+Запуск:
+    python benchmarks/flood_bench.py [клиентов] [новых_в_секунду] [действие]
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram.types import Chat, Message, User
+
+from flood_control import FloodControl
+
+SPAMMER_ID = 1
+SPAM_RATE = 100
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def structures_size(flood: FloodControl) -> int:
+    """
+    Память словаря bucket-ов (вместе с числами) и колеса таймеров, в байтах.
+    """
+    size = sys.getsizeof(flood._tat) + len(flood._tat) * sys.getsizeof(0.0)
+    return size + sum(sys.getsizeof(slot) for slot in flood._slots)
+
+
+def make_message(user_id: int, message_id: int) -> Message:
+    # Без валидации pydantic: создание сообщений не должно попасть в замер
+    return Message.model_construct(
+        message_id=message_id, date=datetime.now(), text="привет",
+        chat=Chat.model_construct(id=user_id, type="private"),
+        from_user=User.model_construct(id=user_id, is_bot=False, first_name="Client"),
+    )
+
+
+async def bench(clients: int, arrivals: int, action: str) -> None:
+    flood = FloodControl(lambda user_id: False, rate=1, burst=10, action=action)
+    delivered: dict[str, int] = {"spam": 0, "clients": 0}
+
+    async def handler(message: Message, data: dict) -> None:
+        delivered["spam" if message.chat.id == SPAMMER_ID else "clients"] += 1
+
+    clock = Clock()
+    checked = 0
+    elapsed = 0.0
+    max_tracked = 0
+    max_size = 0
+    next_id = 1000
+    with patch("flood_control.time.monotonic", clock), patch("flood_control.yield_turn"):
+        second = 0
+        while next_id < 1000 + clients:
+            clock.now = float(second)
+            messages = [make_message(user_id, 1) for user_id in range(next_id, next_id + arrivals)]
+            messages += [make_message(SPAMMER_ID, second * SPAM_RATE + i) for i in range(SPAM_RATE)]
+            next_id += arrivals
+            start = time.perf_counter()
+            if action == "coalesce":
+                # Придержанные сообщения ждут токена: выполняем секунду целиком
+                await asyncio.gather(*(flood(handler, message, {}) for message in messages[:-SPAM_RATE]))
+                await asyncio.gather(*(flood(handler, message, {}) for message in messages[-SPAM_RATE:]))
+            else:
+                for message in messages:
+                    await flood(handler, message, {})
+            elapsed += time.perf_counter() - start
+            checked += len(messages)
+            max_tracked = max(max_tracked, len(flood))
+            max_size = max(max_size, structures_size(flood))
+            second += 1
+
+    stats = flood.stats()
+    print(f"Клиентов: {clients:,}, новых в секунду: {arrivals:,}, флудер: {SPAM_RATE} сообщений/с, "
+          f"действие: {action}, секунд: {second:,}")
+    print(f"Проверка сообщения:        {elapsed / checked * 1e6:.2f} мкс")
+    print(f"Отслеживается клиентов:    максимум {max_tracked:,}, в конце {stats['clients']:,}")
+    print(f"Память структур:           максимум {max_size / 1024 / 1024:.2f} МБ")
+    print(f"До хендлера дошло:         клиентов {delivered['clients']:,}, "
+          f"флудера {delivered['spam']:,} из {second * SPAM_RATE:,}")
+    print(f"Придержано/отброшено:      {stats['throttled']:,}")
+
+
+if __name__ == "__main__":
+    asyncio.run(bench(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 2_000,
+        sys.argv[3] if len(sys.argv) > 3 else "drop",
+    ))
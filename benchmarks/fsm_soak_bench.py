@@ -0,0 +1,114 @@
+"""
+Суточный прогон хранилища FSM с постоянным потоком новых пользователей.
+
+Время виртуальное: сутки проходят за секунды. Каждую секунду приходит
+`ARRIVAL_RATE` новых пользователей; каждый нажимает /start
+(`waiting_for_start`), часть отвечает и доходит до
+`waiting_for_house_choice` после напоминаний, часть вызывает менеджера
+(`state.clear()`), остальные больше не возвращаются. Напоминания читают
+состояние, как `ReminderScheduler`.
+
+Раз в час виртуального времени выводятся число записей и память
+хранилища (tracemalloc) для `MemoryStorage` и `TTLMemoryStorage`:
+у `MemoryStorage` они растут линейно, у `TTLMemoryStorage` выходят
+на плато через `ttl` секунд.
+
+Запуск:
+    python benchmarks/fsm_soak_bench.py [пользователей_в_секунду] [ttl_с] [часов]
+"""
+import asyncio
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from states import Form
+from ttl_storage import TTLMemoryStorage
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def user_step(storage: BaseStorage, key: StorageKey, age: int, fate: float) -> None:
+    """
+    Действия пользователя через `age` секунд после /start.
+    """
+    if age == 0:
+        await storage.set_state(key, Form.waiting_for_start)
+    elif age == 5 and fate < 0.6:
+        await storage.set_state(key, Form.waiting_for_houses)
+    elif age == 305 and fate < 0.6:
+        # Второе напоминание
+        if await storage.get_state(key) == Form.waiting_for_houses.state:
+            await storage.set_state(key, Form.waiting_for_questions)
+    elif age == 605 and fate < 0.6:
+        # Третье напоминание
+        if await storage.get_state(key) == Form.waiting_for_questions.state:
+            await storage.set_state(key, Form.waiting_for_house_choice)
+    elif age == 700 and fate < 0.2:
+        # Вызов менеджера
+        await storage.update_data(key, {"card_sent": True})
+        await storage.set_state(key, None)
+        await storage.set_data(key, {})
+
+
+async def soak(storage: BaseStorage, rate: int, hours: int) -> None:
+    clock = Clock()
+    steps = (0, 5, 305, 605, 700)
+    fates: dict[int, float] = {}
+    rng = random.Random(1)
+    next_user = 0
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    with patch("ttl_storage.time.monotonic", clock):
+        for second in range(hours * 3600):
+            clock.now = float(second)
+            for _ in range(rate):
+                fates[next_user] = rng.random()
+                next_user += 1
+            # Пользователи, для которых в эту секунду наступил очередной шаг
+            for age in steps:
+                first = (second - age) * rate
+                if first < 0:
+                    continue
+                for user_id in range(first, first + rate):
+                    key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+                    await user_step(storage, key, age, fates[user_id])
+                    if age == steps[-1]:
+                        del fates[user_id]
+            if (second + 1) % 3600 == 0:
+                memory = tracemalloc.get_traced_memory()[0] - base - sys.getsizeof(fates)
+                contexts = len(storage.storage) if isinstance(storage, MemoryStorage) else len(storage)
+                evicted = storage.stats()["evicted"] if isinstance(storage, TTLMemoryStorage) else 0
+                print(f"  {(second + 1) // 3600:3d} ч: записей {contexts:9,}, "
+                      f"память {memory / 1024 / 1024:8.1f} МБ, вытеснено {evicted:9,}")
+    tracemalloc.stop()
+
+
+async def main(rate: int, ttl: float, hours: int) -> None:
+    print(f"Новых пользователей в секунду: {rate}, ttl: {ttl:.0f} с, часов: {hours}")
+    print("MemoryStorage:")
+    await soak(MemoryStorage(), rate, hours)
+    print("TTLMemoryStorage:")
+    await soak(TTLMemoryStorage(ttl=ttl), rate, hours)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 4 * 60 * 60,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 24,
+    ))
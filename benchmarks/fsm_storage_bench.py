@@ -0,0 +1,63 @@
+"""
+Бенчмарк хранилищ FSM: MemoryStorage против SQLiteStorage.
+
+Для каждого "обновления" выполняется тот же набор операций, что делают
+хендлеры при ответе клиента: get_state, get_data, update_data, set_state.
+Выводится среднее время на одно обновление в микросекундах.
+
+Запуск:
+    python benchmarks/fsm_storage_bench.py [количество_обновлений]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from sqlite_storage import SQLiteStorage
+from states import Form
+
+USERS = 10_000
+
+
+async def run_updates(storage: BaseStorage, updates: int) -> float:
+    """
+    Прогоняет `updates` обновлений по USERS пользователям
+    и возвращает среднее время на обновление (мкс).
+    """
+    keys = [StorageKey(bot_id=1, chat_id=i, user_id=i) for i in range(USERS)]
+    start = time.perf_counter()
+    for i in range(updates):
+        key = keys[i % USERS]
+        await storage.get_state(key)
+        await storage.get_data(key)
+        await storage.update_data(key, {"card_sent": True})
+        await storage.set_state(key, Form.waiting_for_houses)
+    elapsed = time.perf_counter() - start
+    return elapsed / updates * 1e6
+
+
+async def main(updates: int) -> None:
+    memory = MemoryStorage()
+    memory_us = await run_updates(memory, updates)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite = SQLiteStorage(os.path.join(tmp, "bench.sqlite3"))
+        sqlite_us = await run_updates(sqlite, updates)
+        start = time.perf_counter()
+        await sqlite.close()
+        close_ms = (time.perf_counter() - start) * 1000
+
+    print(f"Обновлений: {updates}, пользователей: {USERS}")
+    print(f"MemoryStorage: {memory_us:.2f} мкс/обновление")
+    print(f"SQLiteStorage: {sqlite_us:.2f} мкс/обновление "
+          f"(+{sqlite_us - memory_us:.2f} мкс), финальный сброс {close_ms:.1f} мс")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000))
@@ -0,0 +1,75 @@
+"""
+Сквозной бенчмарк бота через HTTP: настоящий `Bot` с `AiohttpSession`
+обращается к локальному `FakeBotAPI` вместо Telegram.
+
+В отличие от bot_bench.py, здесь учитываются сериализация запросов,
+form-data, HTTP-соединения и разбор ответов — все, что делает сессия
+aiogram при работе с настоящим API. Сценарий тот же:
+    /start → "Начать" → "Да" (карточка) → ответ менеджера → сообщение клиента.
+
+Запуск:
+    python benchmarks/http_bench.py [количество_клиентов] [одновременно] [задержка_API_мс]
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot_bench import CARD_USER_ID, MANAGER_ID, Flow, main, percentile, run_clients
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from fake_bot_api import FakeBotAPI
+
+
+async def bench(clients: int, concurrency: int, latency_ms: float) -> None:
+    logging.disable(logging.INFO)
+    api = FakeBotAPI(latency=latency_ms / 1000)
+    cards: dict[int, int] = {}
+
+    def remember_card(message: dict) -> None:
+        if message["chat"]["id"] == MANAGER_ID and (match := CARD_USER_ID.search(message.get("text", ""))):
+            cards[int(match.group(1))] = message["message_id"]
+
+    api.on_message = remember_card
+    await api.start()
+    # Планировщик исходящих не подключается: его лимиты Telegram ограничили бы бенчмарк
+    bot = main.bot
+    await bot.session.close()
+    bot.session = AiohttpSession(api=TelegramAPIServer.from_base(api.url), limit=concurrency)
+    main.register_handlers()
+    flow = Flow(bot, cards)
+
+    try:
+        # Прогрев: соединения и кэши
+        await run_clients(flow, range(10_000, 10_000 + min(clients, 500)), concurrency, [])
+        api.calls.clear()
+
+        latencies: list[float] = []
+        start = time.perf_counter()
+        await run_clients(flow, range(100_000, 100_000 + clients), concurrency, latencies)
+        elapsed = time.perf_counter() - start
+    finally:
+        await main.reminder_scheduler.close()
+        await bot.session.close()
+        await api.stop()
+
+    requests = sum(api.calls.values())
+    print(f"Клиентов: {clients:,}, одновременно: {concurrency}, задержка API: {latency_ms} мс")
+    print(f"Пропускная способность: {len(latencies) / elapsed:9,.0f} обновлений/с, "
+          f"{requests / elapsed:9,.0f} запросов к API/с")
+    print(f"Обработка обновления:   p50 {percentile(latencies, 0.5) * 1000:.3f} мс, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.3f} мс")
+    print("Вызовы Bot API:", ", ".join(f"{name} {count:,}" for name, count in api.calls.most_common()))
+
+
+if __name__ == "__main__":
+    asyncio.run(bench(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 100,
+        float(sys.argv[3]) if len(sys.argv) > 3 else 0.0,
+    ))
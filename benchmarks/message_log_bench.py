@@ -0,0 +1,59 @@
+"""
+Бенчмарк запуска PersistentMessageMap.
+
+Заполняет журнал N связями, закрывает его (сохраняя индекс) и замеряет,
+за сколько открывается журнал при следующем запуске, а также время
+get_user по открытому журналу.
+
+Запуск:
+    python benchmarks/message_log_bench.py [количество_связей]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from message_map import PersistentMessageMap
+
+BASE_MSG_ID = 1_000_000
+BASE_USER_ID = 7_000_000_000
+
+
+def main(size: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "message_map.log")
+
+        start = time.perf_counter()
+        m = PersistentMessageMap(path, checkpoint_every=size + 1)
+        for i in range(size):
+            m.add(BASE_MSG_ID + i, BASE_USER_ID + i % 100_000)
+        fill_s = time.perf_counter() - start
+        start = time.perf_counter()
+        m.close()
+        close_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        m = PersistentMessageMap(path)
+        open_s = time.perf_counter() - start
+
+        probes = range(0, size, 7)
+        start = time.perf_counter()
+        for i in probes:
+            m.get_user(BASE_MSG_ID + i)
+        get_s = time.perf_counter() - start
+        assert len(m) == size
+
+        log_mb = os.path.getsize(path) / 2**20
+        idx_mb = os.path.getsize(m.index_path) / 2**20
+        m.close()
+
+    print(f"Связей: {size:,}; журнал {log_mb:.0f} МБ, индекс {idx_mb:.0f} МБ")
+    print(f"Заполнение: {fill_s / size * 1e9:.0f} нс/add, закрытие (сохранение индекса): {close_s:.2f} с")
+    print(f"Запуск (чтение индекса): {open_s * 1000:.0f} мс")
+    print(f"get_user: {get_s / len(probes) * 1e9:.0f} нс")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000)
@@ -0,0 +1,73 @@
+"""
+Бенчмарк памяти и скорости MessageMap.
+
+Сравнивает упакованный MessageMap с обычным словарем {msg_id: user_id}
+(так MessageMap был устроен раньше) на 1M и 10M связей.
+Память словаря считается через tracemalloc, память MessageMap — по размеру
+его массивов (stats()["memory_bytes"]); время — на одну операцию add/get_user.
+
+Запуск:
+    python benchmarks/message_map_bench.py [размер1,размер2,...]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from message_map import MessageMap
+
+# Реалистичные значения: ID сообщений растут, ID пользователей — 10-значные
+BASE_MSG_ID = 1_000_000
+BASE_USER_ID = 7_000_000_000
+
+
+def measure(name: str, factory, size: int) -> None:
+    start = time.perf_counter()
+    mapping = factory(size)
+    add_s = time.perf_counter() - start
+
+    probes = range(0, size, 7)
+    get = mapping.get_user if isinstance(mapping, MessageMap) else mapping.get
+    start = time.perf_counter()
+    for i in probes:
+        get(BASE_MSG_ID + i)
+    get_s = time.perf_counter() - start
+
+    if isinstance(mapping, MessageMap):
+        memory = mapping.stats()["memory_bytes"]
+    else:
+        # Словарь хранит отдельные объекты int, поэтому считаем его через tracemalloc
+        del mapping
+        tracemalloc.start()
+        mapping = factory(size)
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    print(
+        f"{name:<12} n={size:>10,}  память {memory / 2**20:8.1f} МБ "
+        f"({memory / size:5.1f} Б/связь)  add {add_s / size * 1e9:6.0f} нс  "
+        f"get {get_s / len(probes) * 1e9:6.0f} нс"
+    )
+
+
+def build_dict(size: int) -> dict[int, int]:
+    mapping = {}
+    for i in range(size):
+        mapping[BASE_MSG_ID + i] = BASE_USER_ID + i % 100_000
+    return mapping
+
+
+def build_message_map(size: int) -> MessageMap:
+    mapping = MessageMap(max_size=size)
+    for i in range(size):
+        mapping.add(BASE_MSG_ID + i, BASE_USER_ID + i % 100_000)
+    return mapping
+
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1].split(",")] if len(sys.argv) > 1 else [1_000_000, 10_000_000]
+    for size in sizes:
+        measure("dict", build_dict, size)
+        measure("MessageMap", build_message_map, size)
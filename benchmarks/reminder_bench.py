@@ -0,0 +1,81 @@
+"""
+Бенчмарк памяти на одно ожидающее напоминание.
+
+Сравнивает прежний подход (отдельная задача `wait_for_reply`, которая спит
+300 секунд и держит FSMContext) с `ReminderScheduler` (одна запись
+в колесе таймеров). Также выводится время постановки и отмены.
+
+Запуск:
+    python benchmarks/reminder_bench.py [количество_пользователей]
+"""
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from fsm_handlers import send_second_reminder, wait_for_reply
+from reminder_scheduler import ReminderScheduler
+from states import Form
+
+
+async def measure_tasks(users: int) -> float:
+    storage = MemoryStorage()
+    bot = MagicMock(id=1)
+    tracemalloc.start()
+    tasks = []
+    for chat_id in range(users):
+        state = FSMContext(storage, StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id))
+        tasks.append(asyncio.create_task(
+            wait_for_reply(chat_id, state, Form.waiting_for_houses, 300, send_second_reminder, bot)
+        ))
+    # Даем задачам дойти до asyncio.sleep, чтобы учесть их таймеры
+    await asyncio.sleep(0)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return memory / users
+
+
+async def measure_scheduler(users: int) -> tuple[float, float, float]:
+    scheduler = ReminderScheduler(MagicMock(id=1), MemoryStorage())
+    scheduler.arm(-1, Form.waiting_for_houses, 300, send_second_reminder)  # запуск фоновых задач
+
+    tracemalloc.start()
+    for chat_id in range(users):
+        scheduler.arm(chat_id, Form.waiting_for_houses, 300, send_second_reminder)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for chat_id in range(users):
+        scheduler.cancel(chat_id)
+    cancel_ns = (time.perf_counter() - start) / users * 1e9
+    start = time.perf_counter()
+    for chat_id in range(users):
+        scheduler.arm(chat_id, Form.waiting_for_houses, 300, send_second_reminder)
+    arm_ns = (time.perf_counter() - start) / users * 1e9
+    await scheduler.close()
+    return memory / users, arm_ns, cancel_ns
+
+
+async def main(users: int) -> None:
+    task_bytes = await measure_tasks(users)
+    wheel_bytes, arm_ns, cancel_ns = await measure_scheduler(users)
+    print(f"Ожидающих напоминаний: {users:,}")
+    print(f"Задача на пользователя:  {task_bytes:7.0f} Б/напоминание ({task_bytes * users / 2**20:.1f} МБ)")
+    print(f"ReminderScheduler:       {wheel_bytes:7.0f} Б/напоминание ({wheel_bytes * users / 2**20:.1f} МБ)")
+    print(f"arm: {arm_ns:.0f} нс, cancel: {cancel_ns:.0f} нс")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
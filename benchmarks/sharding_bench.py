@@ -0,0 +1,93 @@
+"""
+Бенчмарк многопроцессного режима: пропускная способность ShardedFront
+при разном числе рабочих процессов.
+
+Фронт раскладывает обновления по процессам так же, как в main.py,
+а каждый рабочий процесс передает их своему диспетчеру через `consume`.
+Обработчик имитирует работу хендлеров, занимая процессор на HANDLER_US
+микросекунд, поэтому результат показывает, насколько обработка
+масштабируется по ядрам. На машине с одним ядром ускорения не будет.
+
+Запуск:
+    python benchmarks/sharding_bench.py [количество_обновлений]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+
+from sharding import ShardedFront, consume
+
+CLIENTS = 1000
+HANDLER_US = 200
+BATCH = 100
+
+
+async def handler(message: Message) -> None:
+    deadline = time.perf_counter() + HANDLER_US / 1_000_000
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def run_worker(queue) -> None:
+    dp = Dispatcher()
+    dp.message()(handler)
+    # Обработчик не обращается к API, поэтому токен может быть любым
+    bot = Bot(token="1:bench")
+    try:
+        await consume(queue, dp, bot)
+    finally:
+        await bot.session.close()
+
+
+def worker_entry(index: int, queue) -> None:
+    asyncio.run(run_worker(queue))
+
+
+def make_updates(count: int) -> list[dict]:
+    return [
+        {
+            "update_id": i,
+            "message": {
+                "message_id": i,
+                "date": 0,
+                "chat": {"id": 100 + i % CLIENTS, "type": "private"},
+                "from": {"id": 100 + i % CLIENTS, "is_bot": False, "first_name": "Bench"},
+                "text": "Здравствуйте",
+            },
+        }
+        for i in range(count)
+    ]
+
+
+async def measure(workers: int, updates: list[dict]) -> float:
+    front = ShardedFront(workers, worker_entry, queue_size=max(1, len(updates) // BATCH))
+    front.start()
+    # Прогрев: ждем, пока процессы запустятся и обработают первую пачку
+    await front.route(updates[:BATCH])
+    await asyncio.sleep(2)
+    start = time.perf_counter()
+    for i in range(0, len(updates), BATCH):
+        await front.route(updates[i:i + BATCH])
+    # stop() ждет, пока рабочие процессы обработают все очереди
+    await asyncio.to_thread(front.stop, 300)
+    return len(updates) / (time.perf_counter() - start)
+
+
+async def main(count: int) -> None:
+    updates = make_updates(count)
+    print(f"Обновлений: {count:,}, ядер: {os.cpu_count()}, обработчик: {HANDLER_US} мкс")
+    baseline = None
+    for workers in (1, 2, 4, 8):
+        rate = await measure(workers, updates)
+        baseline = baseline or rate
+        print(f"Процессов: {workers}: {rate:9,.0f} обновлений/с ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000))
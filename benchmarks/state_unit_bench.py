@@ -0,0 +1,112 @@
+"""
+Бенчмарк единицы работы с состоянием FSM (`StateUnitMiddleware`).
+
+Сценарий тот же, что в bot_bench.py ("старт → карточка → ответ"), на
+настоящем `Dispatcher` из main.py. Хранилище FSM обернуто в счетчик
+обращений, а каждое обращение стоит `STORAGE_LATENCY` секунд, как запрос
+к внешнему хранилищу (Redis, база данных). Прогон выполняется дважды:
+с `StateUnitMiddleware` и без него.
+
+Отчет: обращений к хранилищу на обновление (чтения и записи отдельно),
+обновлений в секунду и p50/p99 времени обработки обновления.
+
+Запуск:
+    python benchmarks/state_unit_bench.py [количество_клиентов] [одновременно] [задержка_хранилища_мс]
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from collections.abc import Mapping
+from typing import Any
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot_bench import FakeSession, Flow, main, percentile, run_clients
+
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+STORAGE_LATENCY = 0.0
+
+
+class CountingStorage(BaseStorage):
+    """
+    Обертка хранилища: считает обращения и добавляет задержку к каждому.
+    `update_data` не переопределяется, поэтому, как у большинства внешних
+    хранилищ, это чтение и запись.
+    """
+    def __init__(self, storage: BaseStorage):
+        self.storage = storage
+        self.calls: Counter[str] = Counter()
+
+    async def _call(self, name: str) -> None:
+        self.calls[name] += 1
+        if STORAGE_LATENCY:
+            await asyncio.sleep(STORAGE_LATENCY)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._call("set_state")
+        await self.storage.set_state(key, state)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        await self._call("get_state")
+        return await self.storage.get_state(key)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self._call("set_data")
+        await self.storage.set_data(key, data)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        await self._call("get_data")
+        return await self.storage.get_data(key)
+
+    async def close(self) -> None:
+        await self.storage.close()
+
+
+async def run(flow: Flow, storage: CountingStorage, user_ids: range, concurrency: int, label: str) -> None:
+    storage.calls.clear()
+    latencies: list[float] = []
+    start = time.perf_counter()
+    await run_clients(flow, user_ids, concurrency, latencies)
+    elapsed = time.perf_counter() - start
+    updates = len(latencies)
+    reads = storage.calls["get_state"] + storage.calls["get_data"]
+    writes = storage.calls["set_state"] + storage.calls["set_data"]
+    print(f"{label}:")
+    print(f"  Обращений к хранилищу на обновление: {(reads + writes) / updates:.2f} "
+          f"(чтений {reads / updates:.2f}, записей {writes / updates:.2f})")
+    print(f"  Пропускная способность: {updates / elapsed:9,.0f} обновлений/с")
+    print(f"  Обработка обновления:   p50 {percentile(latencies, 0.5) * 1000:.3f} мс, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.3f} мс")
+
+
+async def bench(clients: int, concurrency: int) -> None:
+    logging.disable(logging.INFO)
+    session = FakeSession()
+    bot = main.bot
+    await bot.session.close()
+    bot.session = session
+    main.register_handlers()
+    storage = CountingStorage(main.dp.fsm.storage)
+    main.dp.fsm.storage = storage
+    flow = Flow(bot, session.cards)
+
+    # Прогрев
+    await run_clients(flow, range(10_000, 10_000 + min(clients, 500)), concurrency, [])
+
+    print(f"Клиентов: {clients:,}, одновременно: {concurrency}, задержка хранилища: {STORAGE_LATENCY * 1000} мс")
+    await run(flow, storage, range(100_000, 100_000 + clients), concurrency, "С StateUnitMiddleware")
+    main.dp.update.outer_middleware.unregister(main.state_unit)
+    await run(flow, storage, range(200_000, 200_000 + clients), concurrency, "Без StateUnitMiddleware")
+    await main.reminder_scheduler.close()
+
+
+if __name__ == "__main__":
+    STORAGE_LATENCY = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.0
+    asyncio.run(bench(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 100,
+    ))
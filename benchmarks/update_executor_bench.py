@@ -0,0 +1,156 @@
+"""
+Бенчмарк `UpdateExecutor` на синтетической нагрузке от многих пользователей.
+
+Каждый пользователь присылает несколько сообщений подряд; хендлер
+имитирует отправку в Bot API задержкой `SEND_LATENCY`, а у каждого
+двадцатого пользователя отправка в 20 раз медленнее. Обновления подаются
+пачками по 100, как из getUpdates. Сравниваются три режима приема:
+
+- polling по одному (`handle_as_tasks=False`): прием ждет каждое обновление;
+- задача на обновление (`handle_as_tasks=True`): без порядка и без ограничений;
+- `UpdateExecutor`: очередь на пользователя, пул обработчиков, обратное давление.
+
+Отчет: обновлений в секунду, p50/p99 времени от приема до конца обработки
+для "быстрых" пользователей, число наложений (обновление пользователя
+началось раньше, чем закончилось предыдущее) и нарушений порядка,
+максимум одновременно принятых, но не обработанных обновлений.
+
+Запуск:
+    python benchmarks/update_executor_bench.py [пользователей] [сообщений_на_пользователя] [обработчиков]
+"""
+import asyncio
+import itertools
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Chat, Message, Update, User
+
+from update_executor import UpdateExecutor
+
+SEND_LATENCY = 0.005
+SLOW_EVERY = 20
+BATCH = 100
+
+
+def build_updates(users: int, per_user: int) -> list[Update]:
+    """
+    Сообщения пользователей вперемешку: сначала первое сообщение каждого, потом второе...
+    """
+    update_ids = itertools.count(1)
+    updates = []
+    for seq in range(per_user):
+        for user_id in range(1, users + 1):
+            update_id = next(update_ids)
+            message = Message(
+                message_id=update_id, date=datetime.now(), chat=Chat(id=user_id, type="private"),
+                from_user=User(id=user_id, is_bot=False, first_name="Client"), text=str(seq),
+            )
+            updates.append(Update(update_id=update_id, message=message))
+    return updates
+
+
+class Probe:
+    """
+    Хендлер-имитация: записывает порядок и наложения обработки по пользователям.
+    """
+    def __init__(self):
+        self.running: set[int] = set()
+        self.last_seq: dict[int, int] = {}
+        self.overlaps = 0
+        self.reordered = 0
+        self.accepted_at: dict[int, float] = {}
+        self.latencies: list[float] = []
+
+    async def handle(self, message: Message) -> None:
+        user_id = message.chat.id
+        seq = int(message.text)
+        if user_id in self.running:
+            self.overlaps += 1
+        if seq != self.last_seq.get(user_id, -1) + 1:
+            self.reordered += 1
+        self.last_seq[user_id] = seq
+        self.running.add(user_id)
+        try:
+            slow = user_id % SLOW_EVERY == 0
+            await asyncio.sleep(SEND_LATENCY * (20 if slow else 1))
+        finally:
+            self.running.discard(user_id)
+        if not slow:
+            self.latencies.append(time.perf_counter() - self.accepted_at.pop(message.message_id))
+        else:
+            self.accepted_at.pop(message.message_id)
+
+    def accept(self, update: Update) -> None:
+        self.accepted_at[update.message.message_id] = time.perf_counter()
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run(mode: str, updates: list[Update], workers: int) -> None:
+    probe = Probe()
+    dp = Dispatcher()
+    dp.message.register(probe.handle)
+    executor = None
+    if mode == "executor":
+        executor = UpdateExecutor(workers=workers, high_water=workers * 4)
+        executor.install(dp)
+    bot = Bot(token="42:TEST")
+    tasks: set[asyncio.Task] = set()
+    max_pending = 0
+
+    start = time.perf_counter()
+    for offset in range(0, len(updates), BATCH):
+        # Пачка getUpdates
+        for update in updates[offset:offset + BATCH]:
+            probe.accept(update)
+            if mode == "tasks":
+                task = asyncio.create_task(dp.feed_update(bot, update))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                max_pending = max(max_pending, len(tasks))
+            else:
+                await dp.feed_update(bot, update)
+                if executor is not None:
+                    max_pending = max(max_pending, executor.stats()["pending"])
+    if tasks:
+        await asyncio.gather(*tasks)
+    if executor is not None:
+        await executor.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"{mode}:")
+    print(f"  Пропускная способность: {len(updates) / elapsed:9,.0f} обновлений/с ({elapsed:.2f} с)")
+    print(f"  Быстрые пользователи:   p50 {percentile(probe.latencies, 0.5) * 1000:8.1f} мс, "
+          f"p99 {percentile(probe.latencies, 0.99) * 1000:8.1f} мс")
+    print(f"  Наложений: {probe.overlaps:,}, нарушений порядка: {probe.reordered:,}, "
+          f"максимум в обработке: {max_pending:,}")
+
+
+async def main(users: int, per_user: int, workers: int) -> None:
+    logging.disable(logging.INFO)
+    updates = build_updates(users, per_user)
+    print(f"Пользователей: {users:,}, сообщений на пользователя: {per_user}, "
+          f"обработчиков: {workers}, задержка отправки: {SEND_LATENCY * 1000:.0f} мс")
+    if len(updates) <= 2_000:
+        await run("sequential", updates, workers)
+    else:
+        print("sequential: пропущен (слишком долго при таком числе обновлений)")
+    await run("tasks", updates, workers)
+    await run("executor", updates, workers)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 4,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 64,
+    ))
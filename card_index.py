@@ -0,0 +1,146 @@
+"""
+Индекс карточек клиентов, уже отправленных менеджерам.
+
+Отметка `card_sent` в данных FSM стирается, как только сценарий
+завершается (`state.clear()`), поэтому клиент, снова прошедший /start,
+получал бы новую карточку. `CardIndex` хранит карточки отдельно от FSM:
+user_id -> (чат менеджера, ID карточки, время отправки, число обращений)
+в течение `ttl` секунд. Повторное обращение обновляет существующую
+карточку вместо отправки новой.
+
+Проверка и резервирование выполняются без `await` между ними, поэтому
+два одновременных обновления одного клиента не отправят две карточки.
+Если задан `path`, карточки сохраняются в SQLite и переживают перезапуск.
+"""
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+
+
+class CardEntry:
+    """
+    Карточка клиента: где она лежит и сколько раз клиент обращался.
+    `message_id` равен None, пока карточка отправляется.
+    """
+    __slots__ = ("chat_id", "message_id", "sent_at", "visits")
+
+    def __init__(self, chat_id: int, message_id: int | None, sent_at: float, visits: int = 1):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.sent_at = sent_at
+        self.visits = visits
+
+
+class CardIndex:
+    """
+    Индекс отправленных карточек с временем жизни.
+
+    :param ttl: Сколько секунд карточка считается актуальной.
+    :param path: Путь к базе SQLite; None — только в памяти.
+    """
+    def __init__(self, ttl: float = 24 * 60 * 60, path: str | None = None):
+        self.ttl = ttl
+        self.path = path
+        # user_id -> карточка; по времени отправки, самые старые в начале
+        self._cards: OrderedDict[int, CardEntry] = OrderedDict()
+        self._db = self._connect() if path else None
+        self._deduplicated = 0
+        if self._db is not None:
+            self._load()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS cards ("
+            "user_id INTEGER PRIMARY KEY, chat_id INTEGER NOT NULL, message_id INTEGER NOT NULL, "
+            "sent_at REAL NOT NULL, visits INTEGER NOT NULL)"
+        )
+        return db
+
+    def _load(self) -> None:
+        rows = self._db.execute(
+            "SELECT user_id, chat_id, message_id, sent_at, visits FROM cards WHERE sent_at > ? ORDER BY sent_at",
+            (time.time() - self.ttl,),
+        ).fetchall()
+        for user_id, chat_id, message_id, sent_at, visits in rows:
+            self._cards[user_id] = CardEntry(chat_id, message_id, sent_at, visits)
+        logging.info(f"Восстановлено карточек клиентов: {len(rows)}")
+
+    def _expire(self, now: float) -> None:
+        while self._cards:
+            user_id, entry = next(iter(self._cards.items()))
+            if now - entry.sent_at < self.ttl:
+                break
+            del self._cards[user_id]
+
+    def get(self, user_id: int) -> CardEntry | None:
+        """
+        Возвращает актуальную карточку клиента (или резерв, если она
+        отправляется прямо сейчас) либо None.
+        """
+        self._expire(time.time())
+        return self._cards.get(user_id)
+
+    def reserve(self, user_id: int, chat_id: int) -> bool:
+        """
+        Резервирует отправку карточки. Возвращает False, если карточку
+        этого клиента уже отправляет другое обновление.
+        """
+        entry = self._cards.get(user_id)
+        if entry is not None and entry.message_id is None:
+            return False
+        self._cards[user_id] = CardEntry(chat_id, None, time.time())
+        self._cards.move_to_end(user_id)
+        return True
+
+    def release(self, user_id: int) -> None:
+        """
+        Снимает резерв, если карточку отправить не удалось.
+        """
+        entry = self._cards.get(user_id)
+        if entry is not None and entry.message_id is None:
+            del self._cards[user_id]
+
+    def put(self, user_id: int, chat_id: int, message_id: int) -> None:
+        """
+        Сохраняет отправленную карточку.
+        """
+        entry = CardEntry(chat_id, message_id, time.time())
+        self._cards[user_id] = entry
+        self._cards.move_to_end(user_id)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cards (user_id, chat_id, message_id, sent_at, visits) VALUES (?, ?, ?, ?, ?)",
+                (user_id, chat_id, message_id, entry.sent_at, entry.visits),
+            )
+
+    def visit(self, user_id: int) -> CardEntry:
+        """
+        Отмечает повторное обращение клиента, у которого уже есть карточка.
+        """
+        entry = self._cards[user_id]
+        entry.visits += 1
+        self._deduplicated += 1
+        if self._db is not None:
+            self._db.execute("UPDATE cards SET visits = ? WHERE user_id = ?", (entry.visits, user_id))
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+    def close(self) -> None:
+        """
+        Удаляет устаревшие карточки из базы и закрывает ее.
+        """
+        if self._db is not None:
+            self._db.execute("DELETE FROM cards WHERE sent_at <= ?", (time.time() - self.ttl,))
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> dict[str, int]:
+        """
+        Возвращает число карточек и повторных обращений без новой карточки.
+        """
+        return {"cards": len(self._cards), "deduplicated": self._deduplicated}
@@ -0,0 +1,117 @@
+"""
+Индексированная маршрутизация входящих сообщений.
+
+Вместо цепочки обработчиков, у каждого из которых свои фильтры (команда,
+текст кнопки, состояние FSM, лямбда "менеджер или клиент"), в диспетчере
+регистрируется один обработчик `DispatchIndex.dispatch`. Он определяет
+ключ сообщения — роль отправителя, состояние FSM и текст, если это
+команда или кнопка, — и находит обработчик одним поиском в словаре.
+
+Состояние FSM берется из `raw_state`, который aiogram уже прочитал
+из хранилища для этого обновления, поэтому повторных чтений нет.
+Правила проверяются в порядке добавления, как и фильтры aiogram;
+результат для каждого ключа вычисляется один раз и кэшируется.
+"""
+from collections.abc import Callable
+from typing import Any
+
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.fsm.state import State
+from aiogram.types import Message
+
+from tracing import span
+
+# Значение по умолчанию для параметров правила: "любое"
+ANY: Any = object()
+
+
+class _Rule:
+    __slots__ = ("handler", "text", "state", "manager")
+
+    def __init__(self, handler: CallableObject, text: str | None, state: Any, manager: bool | None):
+        self.handler = handler
+        self.text = text
+        self.state = state
+        self.manager = manager
+
+    def matches(self, manager: bool, state: str | None, text: str | None) -> bool:
+        return (
+            (self.text is None or self.text == text)
+            and (self.state is ANY or self.state == state)
+            and (self.manager is None or self.manager == manager)
+        )
+
+
+class DispatchIndex:
+    """
+    Таблица маршрутов сообщений: (роль, состояние FSM, текст) -> обработчик.
+
+    :param is_manager: Функция, определяющая по user_id, менеджер ли это.
+    """
+    def __init__(self, is_manager: Callable[[int], bool]):
+        self.is_manager = is_manager
+        self._rules: list[_Rule] = []
+        # Тексты команд и кнопок, которые участвуют в ключе; остальные тексты не различаются
+        self._texts: set[str] = set()
+        self._routes: dict[tuple[bool, str | None, str | None], CallableObject | None] = {}
+
+    def add(
+        self,
+        handler: Callable[..., Any],
+        text: str | None = None,
+        state: State | None = ANY,
+        manager: bool | None = None,
+    ) -> None:
+        """
+        Добавляет правило.
+
+        :param text: Команда ("/start") или точный текст кнопки; None — любой текст.
+        :param state: Состояние FSM; None — пользователь вне сценария; по умолчанию любое.
+        :param manager: True — только менеджеры, False — только клиенты, None — все.
+        """
+        if isinstance(state, State):
+            state = state.state
+        self._rules.append(_Rule(CallableObject(callback=handler), text, state, manager))
+        if text is not None:
+            self._texts.add(text)
+        self._routes.clear()
+
+    def _text_key(self, text: str | None) -> str | None:
+        if not text:
+            return None
+        if text[0] == "/":
+            # "/start payload" и "/start@bot" — та же команда, что и "/start"
+            text = text.split(maxsplit=1)[0].split("@", 1)[0]
+        return text if text in self._texts else None
+
+    def resolve(self, manager: bool, state: str | None, text: str | None) -> CallableObject | None:
+        """
+        Возвращает обработчик для ключа сообщения или None.
+        """
+        key = (manager, state, self._text_key(text))
+        try:
+            return self._routes[key]
+        except KeyError:
+            route = next((rule.handler for rule in self._rules if rule.matches(*key)), None)
+            self._routes[key] = route
+            return route
+
+    def route_name(self, message: Message, data: dict[str, Any]) -> str:
+        """
+        Возвращает имя обработчика, который получит сообщение (для метрик).
+        """
+        user = message.from_user
+        handler = self.resolve(user is not None and self.is_manager(user.id), data.get("raw_state"), message.text)
+        return handler.callback.__name__ if handler is not None else "unhandled"
+
+    async def dispatch(self, message: Message, raw_state: str | None = None, **data: Any) -> Any:
+        """
+        Единственный обработчик сообщений в диспетчере: находит маршрут
+        и вызывает обработчик с нужными ему аргументами.
+        """
+        user = message.from_user
+        with span("dispatch.resolve"):
+            handler = self.resolve(user is not None and self.is_manager(user.id), raw_state, message.text)
+        if handler is not None:
+            with span("handler", handler=handler.callback.__name__):
+                return await handler.call(message, raw_state=raw_state, **data)
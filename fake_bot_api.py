@@ -0,0 +1,225 @@
+"""
+Локальная замена Telegram Bot API для тестов и бенчмарков без сети.
+
+`FakeBotAPI` — aiohttp-сервер, который принимает запросы настоящего
+`aiogram.Bot` (те же URL `/bot<token>/<method>` и form-data) и отвечает
+в формате Bot API. Поддерживаются getMe, getUpdates, sendMessage,
+sendPhoto, copyMessage, editMessageText, getChat и setWebhook; на остальные методы
+сервер отвечает 404, как Telegram.
+
+Можно задать задержку ответа, долю ошибок сервера (500) и долю ответов
+"429 Too Many Requests", чтобы проверить поведение бота под нагрузкой
+и при ограничениях Telegram.
+
+Пример:
+    api = FakeBotAPI(latency=0.05, flood_rate=0.01)
+    await api.start()
+    bot = api.bot("42:TEST")
+    ...
+    await bot.session.close()
+    await api.stop()
+"""
+import asyncio
+import itertools
+import random
+import time
+from collections import Counter
+from collections.abc import Callable
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+
+
+def _chat_id(value: str) -> int | str:
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+class FakeBotAPI:
+    """
+    Сервер, имитирующий Bot API.
+
+    :param latency: Задержка перед каждым ответом, в секундах.
+    :param error_rate: Доля запросов, на которые сервер отвечает 500.
+    :param flood_rate: Доля запросов на отправку, на которые сервер отвечает 429.
+    :param retry_after: Значение retry_after в ответе 429, в секундах.
+    :param seed: Зерно генератора случайных ошибок (для воспроизводимости).
+    """
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        flood_rate: float = 0.0,
+        retry_after: int = 1,
+        seed: int | None = None,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.calls: Counter[str] = Counter()
+        self.errors: Counter[int] = Counter()
+        self.webhook_url = ""
+        # Вызывается с каждым отправленным ботом сообщением (в формате Bot API)
+        self.on_message: Callable[[dict[str, Any]], None] | None = None
+        self._random = random.Random(seed)
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._updates: list[dict[str, Any]] = []
+        self._update_ids = itertools.count(1)
+        self._new_updates = asyncio.Event()
+        self._handlers: dict[str, Callable[[int, dict[str, str]], Any]] = {
+            "getme": self._get_me,
+            "getupdates": self._get_updates,
+            "sendmessage": self._send_message,
+            "sendphoto": self._send_photo,
+            "copymessage": self._copy_message,
+            "editmessagetext": self._edit_message_text,
+            "getchat": self._get_chat,
+            "setwebhook": self._set_webhook,
+        }
+        self._runner: web.AppRunner | None = None
+        self.url = ""
+
+    # --- Запуск ---
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Запускает сервер (по умолчанию на свободном порту) и возвращает его адрес.
+        """
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host=host, port=port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def bot(self, token: str = "42:TEST", **kwargs: Any) -> Bot:
+        """
+        Создает настоящий `Bot`, который обращается к этому серверу.
+        """
+        session = AiohttpSession(api=TelegramAPIServer.from_base(self.url))
+        return Bot(token=token, session=session, **kwargs)
+
+    def push_update(self, update: dict[str, Any]) -> int:
+        """
+        Добавляет обновление для getUpdates; update_id назначается автоматически.
+        """
+        update = {**update, "update_id": next(self._update_ids)}
+        self._updates.append(update)
+        self._new_updates.set()
+        return update["update_id"]
+
+    # --- Обработка запросов ---
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        bot_id = int(request.match_info["token"].split(":", 1)[0])
+        params = {key: value for key, value in (await request.post()).items() if isinstance(value, str)}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        handler = self._handlers.get(method.lower())
+        if handler is None:
+            return self._error(404, "Not Found: method not found")
+        if self.error_rate and self._random.random() < self.error_rate:
+            return self._error(500, "Internal Server Error")
+        if self.flood_rate and method.startswith(("send", "copy")) and self._random.random() < self.flood_rate:
+            return self._error(
+                429, f"Too Many Requests: retry after {self.retry_after}",
+                parameters={"retry_after": self.retry_after},
+            )
+        result = await handler(bot_id, params)
+        return web.json_response({"ok": True, "result": result})
+
+    def _error(self, code: int, description: str, **extra: Any) -> web.Response:
+        self.errors[code] += 1
+        return web.json_response({"ok": False, "error_code": code, "description": description, **extra}, status=code)
+
+    def _message(self, bot_id: int, params: dict[str, str], **content: Any) -> dict[str, Any]:
+        chat_id = _chat_id(params["chat_id"])
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if isinstance(chat_id, int) and chat_id > 0 else "supergroup"},
+            "from": {"id": bot_id, "is_bot": True, "first_name": "FakeBot"},
+            **content,
+        }
+        if self.on_message is not None:
+            self.on_message(message)
+        return message
+
+    async def _get_me(self, bot_id: int, params: dict[str, str]) -> dict[str, Any]:
+        return {"id": bot_id, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+    async def _get_updates(self, bot_id: int, params: dict[str, str]) -> list[dict[str, Any]]:
+        offset = int(params.get("offset", 0))
+        timeout = float(params.get("timeout", 0))
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get("limit", 100))
+        return self._updates[:limit]
+
+    async def _send_message(self, bot_id: int, params: dict[str, str]) -> dict[str, Any]:
+        return self._message(bot_id, params, text=params.get("text", ""))
+
+    async def _send_photo(self, bot_id: int, params: dict[str, str]) -> dict[str, Any]:
+        file_id = f"fake-photo-{next(self._file_ids)}"
+        content: dict[str, Any] = {
+            "photo": [{"file_id": file_id, "file_unique_id": file_id, "width": 800, "height": 600}],
+        }
+        if "caption" in params:
+            content["caption"] = params["caption"]
+        return self._message(bot_id, params, **content)
+
+    async def _copy_message(self, bot_id: int, params: dict[str, str]) -> dict[str, Any]:
+        message = self._message(bot_id, params)
+        return {"message_id": message["message_id"]}
+
+    async def _edit_message_text(self, bot_id: int, params: dict[str, str]) -> dict[str, Any]:
+        chat_id = _chat_id(params["chat_id"])
+        return {
+            "message_id": int(params["message_id"]),
+            "date": int(time.time()),
+            "edit_date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if isinstance(chat_id, int) and chat_id > 0 else "supergroup"},
+            "from": {"id": bot_id, "is_bot": True, "first_name": "FakeBot"},
+            "text": params.get("text", ""),
+        }
+
+    async def _get_chat(self, bot_id: int, params: dict[str, str]) -> dict[str, Any]:
+        chat_id = _chat_id(params["chat_id"])
+        return {
+            "id": chat_id,
+            "type": "private",
+            "first_name": f"User{chat_id}",
+            "accent_color_id": 0,
+            "max_reaction_count": 11,
+            "accepted_gift_types": {
+                "unlimited_gifts": True, "limited_gifts": True,
+                "unique_gifts": True, "premium_subscription": True, "gifts_from_channels": True,
+            },
+        }
+
+    async def _set_webhook(self, bot_id: int, params: dict[str, str]) -> bool:
+        self.webhook_url = params.get("url", "")
+        return True
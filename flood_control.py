@@ -0,0 +1,188 @@
+"""
+Защита чата менеджера от флуда одного клиента.
+
+Каждое сообщение клиента превращается в отправку менеджеру, поэтому
+клиент, присылающий сотни сообщений, расходует общий лимит отправок
+бота (`OutboundScheduler`) за счет остальных. `FloodControl` — outer
+middleware сообщений с token bucket на каждого клиента: в среднем не
+больше `rate` сообщений в секунду и не больше `burst` подряд. Сообщения
+менеджеров не ограничиваются.
+
+Что делать с сообщениями сверх лимита (`action`):
+- `drop` — отбросить;
+- `warn` — отбросить и один раз за серию ответить клиенту просьбой писать реже;
+- `coalesce` — придержать до появления токена и передать хендлеру вместе,
+  в аргументе `coalesced` (`user_to_manager` пересылает их одним сообщением,
+  как серию из `BurstBuffer`). Хендлеры сценария FSM получают только первое.
+
+Bucket хранится одним числом — теоретическим временем следующего
+сообщения (GCRA). Как только оно наступило, bucket снова полон и
+ничем не отличается от нового, поэтому запись удаляется. Удаление
+выполняет колесо таймеров: запись попадает в ячейку своего времени,
+а при каждом сообщении разбираются только ячейки прошедших тактов.
+Память пропорциональна числу клиентов, писавших за последние
+`burst / rate` секунд, а не всем когда-либо писавшим; сверх `max_users`
+новые клиенты не ограничиваются.
+"""
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject
+
+from update_executor import yield_turn
+
+ACTIONS = ("drop", "warn", "coalesce")
+WARNING_TEXT = "Вы отправляете слишком много сообщений. Пожалуйста, пишите чуть реже — менеджер увидит все."
+
+
+class FloodControl(BaseMiddleware):
+    """
+    Ограничение частоты сообщений каждого клиента.
+
+    :param is_manager: Функция, определяющая менеджера по ID (их сообщения не ограничиваются).
+    :param rate: Сколько сообщений в секунду в среднем разрешено клиенту.
+    :param burst: Сколько сообщений подряд разрешено без пауз.
+    :param action: "drop", "warn" или "coalesce".
+    :param max_users: Сколько клиентов отслеживается одновременно.
+    :param resolution: Длина такта колеса таймеров, в секундах.
+    """
+    def __init__(
+        self,
+        is_manager: Callable[[int], bool],
+        rate: float = 1.0,
+        burst: int = 10,
+        action: str = "coalesce",
+        max_users: int = 1_000_000,
+        resolution: float = 1.0,
+    ):
+        if action not in ACTIONS:
+            raise ValueError(f"Неизвестное действие при флуде: {action!r}, допустимы {', '.join(ACTIONS)}")
+        self.is_manager = is_manager
+        self.action = action
+        self.max_users = max_users
+        self.resolution = resolution
+        self._interval = 1 / rate
+        self._tolerance = self._interval * (burst - 1)
+        # user_id -> теоретическое время следующего сообщения (GCRA)
+        self._tat: dict[int, float] = {}
+        # Колесо таймеров: в ячейке — клиенты, чей bucket заполнится в этот такт
+        self._slots: list[list[int]] = [[] for _ in range(int((self._tolerance + self._interval) / resolution) + 3)]
+        # Последний разобранный такт колеса
+        self._tick: int | None = None
+        # Клиенты, которым уже отправлено предупреждение в текущей серии
+        self._warned: set[int] = set()
+        # user_id -> сообщения, ждущие токена (coalesce); первое ждет за всех
+        self._held: dict[int, list[Message]] = {}
+        self._passed = 0
+        self._throttled = 0
+        self._overflow = 0
+
+    def _advance(self, now: float) -> None:
+        """
+        Удаляет записи из ячеек прошедших тактов.
+        """
+        tick = int(now / self.resolution)
+        if self._tick is None:
+            self._tick = tick
+        size = len(self._slots)
+        for past in range(max(self._tick, tick - size), tick):
+            index = past % size
+            keep = []
+            for user_id in self._slots[index]:
+                tat = self._tat.get(user_id)
+                if tat is None:
+                    continue
+                if tat <= now:
+                    del self._tat[user_id]
+                    self._warned.discard(user_id)
+                elif int(tat / self.resolution) % size == index and int(tat / self.resolution) != past:
+                    # Запись на следующий оборот колеса
+                    keep.append(user_id)
+            self._slots[index] = keep
+        self._tick = max(self._tick, tick)
+
+    def _take(self, user_id: int, now: float) -> float:
+        """
+        Пытается взять токен. Возвращает 0, если сообщение разрешено,
+        иначе — сколько секунд ждать токена.
+        """
+        self._advance(now)
+        tat = self._tat.get(user_id)
+        if tat is None:
+            if len(self._tat) >= self.max_users:
+                self._overflow += 1
+                return 0.0
+            tat = now
+        tat = max(tat, now)
+        wait = tat - self._tolerance - now
+        if wait > 0:
+            return wait
+        tat += self._interval
+        self._tat[user_id] = tat
+        self._slots[int(tat / self.resolution) % len(self._slots)].append(user_id)
+        return 0.0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = getattr(event, "from_user", None)
+        if not isinstance(event, Message) or user is None or self.is_manager(user.id):
+            return await handler(event, data)
+        user_id = user.id
+        held = self._held.get(user_id)
+        if held is not None:
+            # Первое придержанное сообщение уже ждет токена; это уйдет вместе с ним
+            held.append(event)
+            self._throttled += 1
+            return None
+        wait = self._take(user_id, time.monotonic())
+        if not wait:
+            self._passed += 1
+            return await handler(event, data)
+
+        self._throttled += 1
+        if self.action == "drop":
+            return None
+        if self.action == "warn":
+            if user_id not in self._warned:
+                self._warned.add(user_id)
+                try:
+                    await event.answer(WARNING_TEXT)
+                except Exception as e:
+                    logging.error(f"Не удалось предупредить клиента {user_id} о флуде: {e}")
+            return None
+
+        held = self._held[user_id] = [event]
+        # Следующие сообщения клиента должны дойти сюда, пока мы ждем
+        yield_turn()
+        try:
+            while wait:
+                await asyncio.sleep(wait)
+                wait = self._take(user_id, time.monotonic())
+        finally:
+            del self._held[user_id]
+        self._passed += 1
+        data["coalesced"] = sorted(held, key=lambda message: message.message_id)
+        return await handler(event, data)
+
+    def __len__(self) -> int:
+        return len(self._tat)
+
+    def stats(self) -> dict[str, int]:
+        """
+        Возвращает число пропущенных и придержанных (или отброшенных) сообщений,
+        отслеживаемых клиентов и клиентов сверх `max_users`.
+        """
+        return {
+            "passed": self._passed,
+            "throttled": self._throttled,
+            "clients": len(self._tat),
+            "overflow": self._overflow,
+        }
@@ -0,0 +1,326 @@
+"""
+Пересылка сообщений между клиентом и менеджером.
+
+Сообщения любого типа (фото, голосовые, документы, стикеры...) пересылаются
+через `copy_message`: Telegram копирует файл на своей стороне, и медиа
+не скачивается и не загружается ботом заново. Подпись вида
+"Сообщение от ..." или "Менеджер: " сохраняется — в тексте, в подписи
+к медиа или отдельным сообщением для вложений без подписи.
+
+Альбомы (несколько фото/видео с общим `media_group_id`) приходят отдельными
+обновлениями. `AlbumBuffer` собирает их за короткое окно, и альбом
+пересылается целиком одним `send_media_group` по `file_id`.
+
+Серию коротких сообщений клиента `BurstBuffer` может собрать так же:
+идущие подряд тексты уходят менеджеру одним сообщением (`relay_burst`).
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+
+from aiogram import Bot
+from aiogram.enums import ContentType
+from aiogram.types import (InputMediaAudio, InputMediaDocument,
+                           InputMediaPhoto, InputMediaVideo, Message,
+                           ReplyParameters)
+
+from update_executor import yield_turn
+
+# Типы сообщений, к которым Telegram позволяет добавить подпись
+CAPTION_TYPES = {
+    ContentType.PHOTO,
+    ContentType.VIDEO,
+    ContentType.DOCUMENT,
+    ContentType.AUDIO,
+    ContentType.VOICE,
+    ContentType.ANIMATION,
+}
+# Максимальная длина подписи к медиа в Telegram
+CAPTION_LIMIT = 1024
+# Максимальная длина текста сообщения в Telegram
+MESSAGE_LIMIT = 4096
+
+
+def _utf16_len(text: str) -> int:
+    # Смещения сущностей Telegram считает в UTF-16
+    return len(text.encode("utf-16-le")) // 2
+
+
+async def relay_message(bot: Bot, chat_id: int, message: Message, prefix: str) -> list[int]:
+    """
+    Пересылает `message` в чат `chat_id`, добавляя `prefix` перед текстом
+    или подписью. Возвращает ID всех отправленных сообщений, чтобы по любому
+    из них можно было найти собеседника.
+    """
+    if message.text is not None:
+        sent = await bot.send_message(chat_id, f"{prefix}{message.text}")
+        return [sent.message_id]
+
+    if message.content_type in CAPTION_TYPES:
+        caption = prefix + message.caption if message.caption else prefix.rstrip()
+        if _utf16_len(caption) <= CAPTION_LIMIT:
+            shift = _utf16_len(prefix)
+            entities = [
+                entity.model_copy(update={"offset": entity.offset + shift})
+                for entity in message.caption_entities or []
+            ]
+            copied = await bot.copy_message(
+                chat_id, message.chat.id, message.message_id,
+                caption=caption, caption_entities=entities or None,
+            )
+            return [copied.message_id]
+
+    # Вложения без подписи (стикеры, кружки, геопозиция...) или слишком длинная подпись:
+    # подпись уходит отдельным сообщением, а копия — ответом на нее
+    header = await bot.send_message(chat_id, prefix.rstrip())
+    copied = await bot.copy_message(
+        chat_id, message.chat.id, message.message_id,
+        reply_parameters=ReplyParameters(message_id=header.message_id),
+    )
+    return [header.message_id, copied.message_id]
+
+
+def _input_media(message: Message, caption: str | None, caption_entities: list | None):
+    """
+    Собирает элемент альбома по `file_id` уже загруженного в Telegram файла.
+    """
+    if message.photo:
+        return InputMediaPhoto(
+            media=message.photo[-1].file_id, caption=caption, caption_entities=caption_entities,
+            has_spoiler=message.has_media_spoiler,
+        )
+    if message.video:
+        return InputMediaVideo(
+            media=message.video.file_id, caption=caption, caption_entities=caption_entities,
+            has_spoiler=message.has_media_spoiler,
+        )
+    if message.document:
+        return InputMediaDocument(media=message.document.file_id, caption=caption, caption_entities=caption_entities)
+    if message.audio:
+        return InputMediaAudio(media=message.audio.file_id, caption=caption, caption_entities=caption_entities)
+    return None
+
+
+async def relay_album(bot: Bot, chat_id: int, album: list[Message], prefix: str) -> list[int]:
+    """
+    Пересылает альбом одним `send_media_group`, добавляя `prefix` к подписи
+    первого элемента. Возвращает ID всех отправленных сообщений.
+    Один элемент (остальные пришли позже окна сборки) пересылается как
+    обычное сообщение: `send_media_group` принимает от 2 до 10 элементов.
+    """
+    if len(album) == 1:
+        return await relay_message(bot, chat_id, album[0], prefix)
+    first = album[0]
+    caption = prefix + first.caption if first.caption else prefix.rstrip()
+    header_id = None
+    if _utf16_len(caption) <= CAPTION_LIMIT:
+        shift = _utf16_len(prefix)
+        first_entities = [
+            entity.model_copy(update={"offset": entity.offset + shift})
+            for entity in first.caption_entities or []
+        ] or None
+    else:
+        # Подпись не помещается: заголовок уходит отдельным сообщением
+        caption, first_entities = first.caption, first.caption_entities
+        header = await bot.send_message(chat_id, prefix.rstrip())
+        header_id = header.message_id
+
+    media = [_input_media(first, caption, first_entities)]
+    media += [_input_media(item, item.caption, item.caption_entities) for item in album[1:]]
+    if any(item is None for item in media):
+        # Неизвестный тип вложения: пересылаем элементы по одному
+        sent_ids = [] if header_id is None else [header_id]
+        for item in album:
+            sent_ids += await relay_message(bot, chat_id, item, prefix)
+        return sent_ids
+
+    sent = await bot.send_media_group(
+        chat_id, media,
+        reply_parameters=ReplyParameters(message_id=header_id) if header_id else None,
+    )
+    return ([] if header_id is None else [header_id]) + [item.message_id for item in sent]
+
+
+class AlbumBuffer:
+    """
+    Собирает элементы альбома, пришедшие отдельными обновлениями.
+
+    Первый обработчик, получивший элемент альбома, ждет, пока в течение
+    `window` секунд не перестанут приходить новые элементы, и получает
+    весь альбом. Обработчики остальных элементов сразу получают None.
+    """
+    def __init__(self, window: float = 0.5):
+        self.window = window
+        # (chat_id, media_group_id) -> [элементы, время последнего элемента]
+        self._albums: dict[tuple[int, str], list] = {}
+
+    async def collect(self, message: Message) -> list[Message] | None:
+        """
+        Добавляет элемент альбома. Возвращает весь альбом (по порядку)
+        первому вызвавшему и None остальным.
+        """
+        key = (message.chat.id, message.media_group_id)
+        entry = self._albums.get(key)
+        if entry is not None:
+            entry[0].append(message)
+            entry[1] = time.monotonic()
+            return None
+
+        entry = self._albums[key] = [[message], time.monotonic()]
+        # Остальные элементы альбома должны дойти до collect, пока мы ждем
+        yield_turn()
+        try:
+            while (delay := entry[1] + self.window - time.monotonic()) > 0:
+                await asyncio.sleep(delay)
+        finally:
+            del self._albums[key]
+        return sorted(entry[0], key=lambda item: item.message_id)
+
+    def __len__(self) -> int:
+        return len(self._albums)
+
+
+async def relay_burst(bot: Bot, chat_id: int, burst: list[Message], prefix: str) -> list[tuple[int, list[int]]]:
+    """
+    Пересылает серию сообщений клиента: идущие подряд тексты склеиваются
+    в одно сообщение (каждый с новой строки), остальные сообщения
+    пересылаются по одному через `relay_message`.
+
+    Возвращает пары (ID отправленного сообщения, ID исходных сообщений
+    клиента), чтобы по любому отправленному можно было найти исходные.
+    """
+    relayed: list[tuple[int, list[int]]] = []
+    texts: list[str] = []
+    originals: list[int] = []
+    length = _utf16_len(prefix)
+
+    async def flush() -> None:
+        nonlocal length
+        if texts:
+            sent = await bot.send_message(chat_id, prefix + "\n".join(texts))
+            relayed.append((sent.message_id, originals.copy()))
+            texts.clear()
+            originals.clear()
+            length = _utf16_len(prefix)
+
+    for message in burst:
+        if message.text is not None:
+            text_length = _utf16_len(message.text) + (1 if texts else 0)
+            if texts and length + text_length > MESSAGE_LIMIT:
+                await flush()
+                text_length -= 1
+            texts.append(message.text)
+            originals.append(message.message_id)
+            length += text_length
+        else:
+            # Вложения сохраняют порядок: сначала уходят накопленные тексты
+            await flush()
+            for sent_id in await relay_message(bot, chat_id, message, prefix):
+                relayed.append((sent_id, [message.message_id]))
+    await flush()
+    return relayed
+
+
+class BurstBuffer:
+    """
+    Собирает серию сообщений одного клиента, чтобы переслать ее менеджеру
+    одним сообщением.
+
+    Как и в `AlbumBuffer`, первый обработчик ждет, пока клиент не замолчит
+    на `window` секунд (но не дольше `max_delay` от первого сообщения),
+    и получает всю серию; обработчики остальных сообщений получают None.
+    Окно растет вместе с очередью исходящих сообщений: чем больше отправок
+    ждут лимита Telegram, тем выгоднее склеивать.
+
+    :param window: Окно тишины при пустой очереди, в секундах.
+    :param max_window: Максимальное окно при глубокой очереди.
+    :param max_delay: Максимальная задержка первого сообщения серии.
+    :param queue_depth: Функция, возвращающая число ожидающих отправок.
+    :param depth_scale: При такой глубине очереди окно удваивается.
+    :param max_origins: Сколько связей "пересланное сообщение -> исходные" хранить.
+    """
+    def __init__(
+        self,
+        window: float = 1.0,
+        max_window: float = 5.0,
+        max_delay: float = 10.0,
+        queue_depth: Callable[[], int] | None = None,
+        depth_scale: int = 30,
+        max_origins: int = 100_000,
+    ):
+        self.window = window
+        self.max_window = max_window
+        self.max_delay = max_delay
+        self.queue_depth = queue_depth
+        self.depth_scale = depth_scale
+        self.max_origins = max_origins
+        # chat_id -> [сообщения, время последнего сообщения]
+        self._bursts: dict[int, list] = {}
+        # ключ пересланного сообщения в MessageMap -> ID исходных сообщений клиента
+        self._origins: OrderedDict[int, tuple[int, ...]] = OrderedDict()
+        self._collected = 0
+        self._flushed = 0
+
+    def current_window(self) -> float:
+        """
+        Текущее окно тишины с учетом глубины очереди исходящих.
+        """
+        if self.queue_depth is None:
+            return self.window
+        return min(self.max_window, self.window * (1 + self.queue_depth() / self.depth_scale))
+
+    async def collect(self, message: Message) -> list[Message] | None:
+        """
+        Добавляет сообщение в серию клиента. Возвращает всю серию (по порядку)
+        первому вызвавшему и None остальным.
+        """
+        key = message.chat.id
+        now = time.monotonic()
+        self._collected += 1
+        entry = self._bursts.get(key)
+        if entry is not None:
+            entry[0].append(message)
+            entry[1] = now
+            return None
+
+        entry = self._bursts[key] = [[message], now]
+        deadline = now + self.max_delay
+        # Следующие сообщения клиента должны дойти до collect, пока мы ждем
+        yield_turn()
+        try:
+            while (delay := min(entry[1] + self.current_window(), deadline) - time.monotonic()) > 0:
+                await asyncio.sleep(delay)
+        finally:
+            del self._bursts[key]
+        self._flushed += 1
+        return sorted(entry[0], key=lambda item: item.message_id)
+
+    def remember(self, key: int, originals: list[int]) -> None:
+        """
+        Запоминает, из каких сообщений клиента собрано пересланное сообщение.
+        """
+        self._origins[key] = tuple(originals)
+        self._origins.move_to_end(key)
+        if len(self._origins) > self.max_origins:
+            self._origins.popitem(last=False)
+
+    def originals(self, key: int) -> tuple[int, ...] | None:
+        """
+        Возвращает ID исходных сообщений клиента для пересланного сообщения.
+        """
+        return self._origins.get(key)
+
+    def __len__(self) -> int:
+        return len(self._bursts)
+
+    def stats(self) -> dict[str, float]:
+        """
+        Возвращает число принятых сообщений, собранных из них серий
+        и текущее окно.
+        """
+        return {
+            "collected": self._collected,
+            "bursts": self._flushed,
+            "window": self.current_window(),
+        }
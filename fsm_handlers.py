@@ -5,44 +5,109 @@
 от приветствия до передачи диалога менеджеру.
 """
 import asyncio
+import logging
+from datetime import datetime
+
 from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, ReplyKeyboardRemove
 
+from card_index import CardEntry, CardIndex
 from keyboards import start_kb, yes_no_kb, location_ipo_kb, house_choice_kb
+from manager_router import ManagerRouter
+from media_registry import MediaRegistry
 from message_map import MessageMap
 from notification_service import NotificationService, build_manager_message
+from outbound_scheduler import Lane, send_lane
+from profile_cache import ProfileCache
+from reminder_scheduler import ReminderScheduler
 from states import Form
+from tracing import span
 from user_session import UserSession
 
+# Фото готового дома для третьего напоминания
+HOUSE_PHOTO_URL = "https://i.imgur.com/4M34hi2.jpg"
+# Все статические медиа сценария: их file_id готовятся при запуске бота
+STATIC_MEDIA = [HOUSE_PHOTO_URL]
+
+
+async def _update_card(bot: Bot, user, entry: CardEntry) -> bool:
+    """
+    Обновляет существующую карточку клиента вместо отправки новой.
+    Возвращает False, если карточку изменить не удалось (например, ее удалили).
+    """
+    text = build_manager_message(user) + f"\n\nПовторное обращение ({entry.visits}): {datetime.now():%d.%m %H:%M}"
+    try:
+        with send_lane(Lane.CARD):
+            await bot.edit_message_text(text=text, chat_id=entry.chat_id, message_id=entry.message_id)
+    except TelegramBadRequest as e:
+        logging.warning(f"Не удалось обновить карточку {entry.message_id}: {e}")
+        return False
+    return True
+
 
 async def _send_manager_card_if_needed(
     message: Message,
     state: FSMContext,
     bot: Bot,
     notification_service: NotificationService,
-    message_map: MessageMap
+    message_map: MessageMap,
+    manager_router: ManagerRouter | None = None,
+    card_index: CardIndex | None = None
 ) -> None:
     """
     Приватная функция-хелпер.
 
     Проверяет, была ли уже отправлена карточка клиента менеджеру.
-    Если нет, отправляет ее и сохраняет связь между ID сообщения
-    менеджеру и ID пользователя для последующих ответов.
+    Если нет, отправляет ее (менеджеру клиента, если задан `manager_router`)
+    и сохраняет связь между ID сообщения менеджеру и ID пользователя
+    для последующих ответов.
+
+    При заданном `card_index` карточка, отправленная этому менеджеру раньше
+    (например, до повторного /start), обновляется, а новая не отправляется.
     """
     data = await state.get_data()
-    if not data.get("card_sent"):
-        user = message.from_user
-        if user and user.id:
-            # Отправляем карточку с информацией о клиенте менеджеру
-            card = await bot.send_message(
-                notification_service.manager_chat_id,
-                build_manager_message(user)
-            )
-            # Сохраняем ID сообщения и ID пользователя, чтобы связать их для ответа
+    if data.get("card_sent"):
+        return
+    user = message.from_user
+    if not (user and user.id):
+        return
+    if manager_router is not None:
+        manager_chat_id = manager_router.assign(user.id)
+    else:
+        manager_chat_id = notification_service.manager_chat_id
+
+    if card_index is not None:
+        entry = card_index.get(user.id)
+        if entry is not None and entry.chat_id == manager_chat_id:
+            # Карточку уже отправляет другое обновление этого клиента
+            if entry.message_id is None:
+                return
+            if await _update_card(bot, user, card_index.visit(user.id)):
+                await state.update_data(card_sent=True)
+                return
+        if not card_index.reserve(user.id, manager_chat_id):
+            return
+
+    # Отправляем карточку с информацией о клиенте менеджеру
+    try:
+        with send_lane(Lane.CARD):
+            card = await bot.send_message(manager_chat_id, build_manager_message(user))
+    except Exception:
+        if card_index is not None:
+            card_index.release(user.id)
+        raise
+    # Сохраняем ID сообщения и ID пользователя, чтобы связать их для ответа
+    with span("message_map.add"):
+        if manager_router is not None:
+            message_map.add(manager_router.message_key(manager_chat_id, card.message_id), user.id)
+        else:
             message_map.add(card.message_id, user.id)
-            # Помечаем в состоянии, что карточка была отправлена
-            await state.update_data(card_sent=True)
+    if card_index is not None:
+        card_index.put(user.id, manager_chat_id, card.message_id)
+    # Помечаем в состоянии, что карточка была отправлена
+    await state.update_data(card_sent=True)
 
 
 async def stop_chain_and_call_manager(
@@ -83,7 +148,11 @@ async def send_welcome(message: Message, state: FSMContext) -> None:
     await state.set_state(Form.waiting_for_start)
 
 
-async def process_start(message: Message, state: FSMContext) -> None:
+async def process_start(
+    message: Message,
+    state: FSMContext,
+    reminder_scheduler: ReminderScheduler | None = None
+) -> None:
     """
     Обрабатывает нажатие кнопки "Начать". Задает первый вопрос
     и запускает таймер для напоминания.
@@ -96,10 +165,13 @@ async def process_start(message: Message, state: FSMContext) -> None:
     )
     await message.answer(text, reply_markup=yes_no_kb)
     await state.set_state(Form.waiting_for_houses)
-    # Запускаем задачу, которая сработает через 5 минут, если пользователь не ответит
-    asyncio.create_task(
-        wait_for_reply(message.chat.id, state, Form.waiting_for_houses, 300, send_second_reminder, message.bot)
-    )
+    # Через 5 минут, если пользователь не ответит, уйдет второе напоминание
+    if reminder_scheduler is not None:
+        reminder_scheduler.arm(message.chat.id, Form.waiting_for_houses, 300, send_second_reminder)
+    else:
+        asyncio.create_task(
+            wait_for_reply(message.chat.id, state, Form.waiting_for_houses, 300, send_second_reminder, message.bot)
+        )
 
 
 async def process_houses(
@@ -108,13 +180,18 @@ async def process_houses(
     user_session: UserSession,
     notification_service: NotificationService,
     message_map: MessageMap,
-    bot: Bot
+    bot: Bot,
+    reminder_scheduler: ReminderScheduler | None = None,
+    manager_router: ManagerRouter | None = None,
+    card_index: CardIndex | None = None
 ) -> None:
     """
     Обрабатывает ответ на вопрос о домах.
-    Отправляет карточку менеджеру и завершает FSM.
+    Отменяет ожидающее напоминание, отправляет карточку менеджеру и завершает FSM.
     """
-    await _send_manager_card_if_needed(message, state, bot, notification_service, message_map)
+    if reminder_scheduler is not None:
+        reminder_scheduler.cancel(message.chat.id)
+    await _send_manager_card_if_needed(message, state, bot, notification_service, message_map, manager_router, card_index)
     await stop_chain_and_call_manager(message, state, user_session)
 
 
@@ -124,13 +201,18 @@ async def process_questions(
     user_session: UserSession,
     notification_service: NotificationService,
     message_map: MessageMap,
-    bot: Bot
+    bot: Bot,
+    reminder_scheduler: ReminderScheduler | None = None,
+    manager_router: ManagerRouter | None = None,
+    card_index: CardIndex | None = None
 ) -> None:
     """
     Обрабатывает ответ на вопрос о локации/ипотеке.
-    Отправляет карточку менеджеру и завершает FSM.
+    Отменяет ожидающее напоминание, отправляет карточку менеджеру и завершает FSM.
     """
-    await _send_manager_card_if_needed(message, state, bot, notification_service, message_map)
+    if reminder_scheduler is not None:
+        reminder_scheduler.cancel(message.chat.id)
+    await _send_manager_card_if_needed(message, state, bot, notification_service, message_map, manager_router, card_index)
     await stop_chain_and_call_manager(message, state, user_session)
 
 
@@ -140,13 +222,18 @@ async def process_house_choice(
     user_session: UserSession,
     notification_service: NotificationService,
     message_map: MessageMap,
-    bot: Bot
+    bot: Bot,
+    reminder_scheduler: ReminderScheduler | None = None,
+    manager_router: ManagerRouter | None = None,
+    card_index: CardIndex | None = None
 ) -> None:
     """
     Обрабатывает ответ на вопрос о выборе дома.
-    Отправляет карточку менеджеру и завершает FSM.
+    Отменяет ожидающее напоминание, отправляет карточку менеджеру и завершает FSM.
     """
-    await _send_manager_card_if_needed(message, state, bot, notification_service, message_map)
+    if reminder_scheduler is not None:
+        reminder_scheduler.cancel(message.chat.id)
+    await _send_manager_card_if_needed(message, state, bot, notification_service, message_map, manager_router, card_index)
     await stop_chain_and_call_manager(message, state, user_session)
 
 
@@ -163,6 +250,9 @@ async def wait_for_reply(
     Ожидает ответ от пользователя в течение `timeout` секунд.
     Если пользователь не отвечает и состояние не изменилось,
     вызывает `callback` для отправки напоминания.
+
+    Запасной вариант для случаев без `ReminderScheduler`: держит
+    отдельную спящую задачу на каждого пользователя.
     """
     await asyncio.sleep(timeout)
     current_state = await state.get_state()
@@ -171,35 +261,77 @@ async def wait_for_reply(
         await callback(chat_id, state, bot)
 
 
-async def send_second_reminder(chat_id: int, state: FSMContext, bot: Bot):
+async def _advance_state(state: FSMContext, expected_state: Form, new_state: Form) -> bool:
+    """
+    Переводит пользователя на `new_state`, только если он все еще в `expected_state`.
+
+    Напоминание ждет своей очереди в полосе `Lane.REMINDER`, и за это время
+    пользователь мог ответить: тогда его состояние не трогаем.
+    """
+    if await state.get_state() != expected_state.state:
+        return False
+    await state.set_state(new_state)
+    return True
+
+
+async def send_second_reminder(
+    chat_id: int,
+    state: FSMContext,
+    bot: Bot,
+    reminder_scheduler: ReminderScheduler | None = None,
+    profile_cache: ProfileCache | None = None,
+    media_registry: MediaRegistry | None = None
+):
     """
     Отправляет второе напоминание пользователю и переводит
     его на следующий шаг FSM.
+
+    Имя пользователя берется из кэша профилей; `get_chat` вызывается
+    только при промахе или если кэш не передан.
     """
-    user = await bot.get_chat(chat_id)
+    if profile_cache is not None:
+        user = await profile_cache.fetch(bot, chat_id)
+    else:
+        user = await bot.get_chat(chat_id)
     user_name = user.first_name or "друг"
     text = (
         f"{user_name}, может быть у вас уже появились какие-то вопросы? "
         "Наприм��р, про локацию или условия покупки?"
     )
-    await bot.send_message(chat_id, text, reply_markup=location_ipo_kb)
-    await state.set_state(Form.waiting_for_questions)
+    with send_lane(Lane.REMINDER):
+        await bot.send_message(chat_id, text, reply_markup=location_ipo_kb)
+    if not await _advance_state(state, Form.waiting_for_houses, Form.waiting_for_questions):
+        return
     # Запускаем таймер для третьего напоминания
-    asyncio.create_task(
-        wait_for_reply(chat_id, state, Form.waiting_for_questions, 300, send_third_reminder, bot)
-    )
+    if reminder_scheduler is not None:
+        reminder_scheduler.arm(chat_id, Form.waiting_for_questions, 300, send_third_reminder)
+    else:
+        asyncio.create_task(
+            wait_for_reply(chat_id, state, Form.waiting_for_questions, 300, send_third_reminder, bot)
+        )
 
 
-async def send_third_reminder(chat_id: int, state: FSMContext, bot: Bot):
+async def send_third_reminder(
+    chat_id: int,
+    state: FSMContext,
+    bot: Bot,
+    reminder_scheduler: ReminderScheduler | None = None,
+    profile_cache: ProfileCache | None = None,
+    media_registry: MediaRegistry | None = None
+):
     """
     Отправляет третье, финальное, напоминание с предложением
-    конкретного дома.
+    конкретного дома. Фото отправляется по сохраненному file_id,
+    если передан реестр медиа.
     """
     text = (
         "С платежом 55 190 руб на весь срок у нас можно приобрести такой готовый дом. "
         "Вам подходит такой вариант или хотели бы площадь побольше?"
     )
-    photo_url = "https://i.imgur.com/4M34hi2.jpg"
-    await bot.send_photo(chat_id, photo=photo_url, caption=text, reply_markup=house_choice_kb)
-    await state.set_state(Form.waiting_for_house_choice)
+    with send_lane(Lane.REMINDER):
+        if media_registry is not None:
+            await media_registry.send_photo(chat_id, HOUSE_PHOTO_URL, caption=text, reply_markup=house_choice_kb)
+        else:
+            await bot.send_photo(chat_id, photo=HOUSE_PHOTO_URL, caption=text, reply_markup=house_choice_kb)
+    await _advance_state(state, Form.waiting_for_questions, Form.waiting_for_house_choice)
  
\ No newline at end of file
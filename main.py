@@ -5,26 +5,47 @@
 Отвечает за:
 1. Инициализацию всех сервисов и объектов бота.
 2. Регистрацию обработчиков сообщений (хендлеров).
-3. Запуск бота.
+3. Запуск бота (long polling или webhook), в одном процессе
+   или с раздачей обновлений нескольким рабочим процессам (BOT_WORKERS).
 """
 import asyncio
 import logging
 import os
+import signal
 
-from aiogram import Bot, Dispatcher, F
-from aiogram.filters import Command
+from aiogram import Bot, Dispatcher
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import Message
+from aiohttp import web
 from dotenv import load_dotenv
 
-from fsm_handlers import (process_house_choice, process_houses,
-                          process_questions, process_start, send_welcome)
+from card_index import CardIndex
+from dispatch_index import DispatchIndex
+from flood_control import FloodControl
+from forwarding import AlbumBuffer, BurstBuffer, relay_album, relay_burst, relay_message
+from fsm_handlers import (STATIC_MEDIA, process_house_choice,
+                          process_houses, process_questions, process_start,
+                          send_second_reminder, send_third_reminder,
+                          send_welcome)
 from manager_auth import ManagerStore, check_manager_command
-from message_map import MessageMap
+from manager_router import ManagerRouter
+from media_registry import MediaRegistry
+from message_map import MessageMap, PersistentMessageMap, SharedMessageMap
+from metrics import ApiMetrics, HandlerMetrics, Metrics, serve_metrics
 from notification_service import NotificationService
+from outbound_scheduler import OutboundScheduler
+from profile_cache import ProfileCache
+from reminder_scheduler import ReminderScheduler
+from sharding import ShardedFront, consume
+from sqlite_storage import SQLiteStorage
+from state_unit import StateUnitMiddleware
 from states import Form
-from user_session import UserSession
+from tracing import BotCallSpans, TracedStorage, Tracer, span
+from ttl_storage import TTLMemoryStorage
+from update_executor import UpdateExecutor
+from user_session import SharedUserSession, UserSession
+from webhook_server import WebhookConfig, run_webhook
 
 # --- 1. Конфигурация и инициализация ---
 
@@ -37,20 +58,211 @@ if not API_TOKEN:
 # Настраиваем базовое логирование
 logging.basicConfig(level=logging.INFO)
 
+# Многопроцессный режим: BOT_WORKERS рабочих процессов, обновления распределяются по user_id.
+# Данные, общие для процессов, хранятся в SQLite-базе SHARED_DB_PATH.
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+# Номер рабочего процесса (задается фронт-процессом); None — фронт или однопроцессный режим
+WORKER_INDEX = int(os.environ["BOT_WORKER_INDEX"]) if "BOT_WORKER_INDEX" in os.environ else None
+SHARED_DB_PATH = os.getenv("SHARED_DB_PATH", "bot_shared.sqlite3")
+
 # Создаем основные объекты aiogram
-# `storage=MemoryStorage()` означает, что все состояния FSM будут храниться в оперативной памяти.
-# Для production-окружения рекомендуется использовать более надежное хранилище, например, Redis.
+# По умолчанию состояния FSM хранятся в оперативной памяти (TTLMemoryStorage) и теряются при перезапуске;
+# состояния пользователей, неактивных дольше FSM_TTL секунд, удаляются (0 — хранить вечно, MemoryStorage).
+# При FSM_STORAGE=sqlite используется SQLiteStorage: чтения идут из памяти,
+# а изменения пакетно сохраняются в файл FSM_SQLITE_PATH и переживают перезапуск.
+# В многопроцессном режиме состояния всегда хранятся в SQLite.
 bot = Bot(token=API_TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
+fsm_ttl = float(os.getenv("FSM_TTL", "86400"))
+if BOT_WORKERS > 1 or os.getenv("FSM_STORAGE", "memory").strip().lower() == "sqlite":
+    storage = SQLiteStorage(os.getenv("FSM_SQLITE_PATH", "fsm_storage.sqlite3"))
+elif fsm_ttl:
+    storage = TTLMemoryStorage(ttl=fsm_ttl)
+else:
+    storage = MemoryStorage()
+fsm_storage = storage
+# Трассировка обновлений в JSONL-файл TRACE_PATH (не задан — выключена): сохраняется доля
+# TRACE_SAMPLE_RATE обновлений и все обновления дольше TRACE_SLOW_MS миллисекунд.
+# В многопроцессном режиме у каждого рабочего процесса свой файл.
+trace_path = os.getenv("TRACE_PATH") or None
+if trace_path and WORKER_INDEX is not None:
+    root, ext = os.path.splitext(trace_path)
+    trace_path = f"{root}.{WORKER_INDEX}{ext}"
+tracer = Tracer(
+    trace_path,
+    sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.01")),
+    slow_threshold=float(os.getenv("TRACE_SLOW_MS", "1000")) / 1000,
+) if trace_path else None
+if tracer is not None:
+    storage = TracedStorage(storage)
+dp = Dispatcher(storage=storage)
+if tracer is not None:
+    tracer.install(dp)
+# Состояние FSM читается и записывается один раз на обновление: хендлеры работают
+# с копией в памяти, а изменения сбрасываются в хранилище после обработки.
+state_unit = StateUnitMiddleware()
+state_unit.install(dp)
+
+# Все отправки бота проходят через планировщик, который соблюдает лимиты Telegram
+# (глобальный и на каждый чат) и отправляет ответы менеджера раньше карточек и напоминаний.
+# Общий лимит делится поровну между рабочими процессами.
+outbound_scheduler = OutboundScheduler(global_rate=float(os.getenv("OUTBOUND_GLOBAL_RATE", "30")) / BOT_WORKERS)
+bot.session.middleware(outbound_scheduler)
+if tracer is not None:
+    # После планировщика: спан вызова API отдельно от ожидания в очереди (outbound.wait)
+    bot.session.middleware(BotCallSpans())
 
 # Создаем экземпляры наших сервисных классов.
 # Эти объекты будут использоваться в обработчиках для выполнения бизнес-логики.
 # Такой подход (создание объектов здесь и передача их в хендлеры) называется
 # Dependency Injection (Внедрение зависимостей) и упрощает тестирование.
-user_session = UserSession()
 notification_service = NotificationService(bot)
-message_map = MessageMap()
 manager_store = ManagerStore()
+# Клиенты распределяются между менеджерами из MANAGER_IDS (по умолчанию — один MANAGER_CHAT_ID):
+# новый клиент достается наименее загруженному менеджеру, а клиенты менеджера,
+# неактивного дольше MANAGER_IDLE_TIMEOUT секунд, переходят к другим активным.
+# В многопроцессном режиме закрепления у каждого процесса свои (см. manager_router.py).
+# Если связи сообщений переживают перезапуск, рядом с ними хранятся номера менеджеров,
+# чтобы изменение MANAGER_IDS не перепутало ответы на старые карточки.
+if BOT_WORKERS > 1:
+    manager_slots_path = f"{SHARED_DB_PATH}.managers.json"
+elif os.getenv("MESSAGE_MAP_PATH"):
+    manager_slots_path = f"{os.getenv('MESSAGE_MAP_PATH')}.managers.json"
+else:
+    manager_slots_path = None
+manager_router = ManagerRouter(
+    manager_store.manager_ids() or [notification_service.manager_chat_id],
+    idle_timeout=float(os.getenv("MANAGER_IDLE_TIMEOUT", "900")),
+    slots_path=manager_slots_path,
+)
+# Связи "сообщение менеджера -> клиент" (TTL в секундах, 0 — без ограничения).
+# Если задан MESSAGE_MAP_PATH, связи хранятся в файле-журнале и переживают перезапуск.
+# В многопроцессном режиме связи и активные клиенты менеджеров хранятся в общей базе.
+message_map_ttl = float(os.getenv("MESSAGE_MAP_TTL", "0")) or None
+if BOT_WORKERS > 1:
+    user_session = SharedUserSession(SHARED_DB_PATH, manager_router)
+    message_map = SharedMessageMap(SHARED_DB_PATH, ttl=message_map_ttl)
+elif os.getenv("MESSAGE_MAP_PATH"):
+    message_map = PersistentMessageMap(os.getenv("MESSAGE_MAP_PATH"), ttl=message_map_ttl)
+else:
+    message_map = MessageMap(
+        max_size=int(os.getenv("MESSAGE_MAP_MAX_SIZE", "1000000")),
+        ttl=message_map_ttl,
+    )
+if BOT_WORKERS == 1:
+    user_session = UserSession(manager_router)
+# Элементы альбома приходят отдельными обновлениями; собираем их за ALBUM_WINDOW секунд.
+# В многопроцессном режиме обновления клиента обрабатываются строго по одному и
+# альбом собраться не может: элементы пересылаются по одному, как обычные сообщения.
+album_buffer = AlbumBuffer(window=float(os.getenv("ALBUM_WINDOW", "0.5"))) if BOT_WORKERS == 1 else None
+# Серия сообщений клиента, разделенных паузами меньше BURST_WINDOW секунд, пересылается
+# менеджеру одним сообщением (0 — выключено). Окно растет с очередью исходящих
+# до BURST_MAX_WINDOW, а первое сообщение серии ждет не дольше BURST_MAX_DELAY.
+# В многопроцессном режиме обновления клиента обрабатываются строго по одному,
+# серия собраться не может, поэтому склейка не используется.
+burst_window = float(os.getenv("BURST_WINDOW", "0")) if BOT_WORKERS == 1 else 0
+burst_buffer = BurstBuffer(
+    window=burst_window,
+    max_window=float(os.getenv("BURST_MAX_WINDOW", "5")),
+    max_delay=float(os.getenv("BURST_MAX_DELAY", "10")),
+    queue_depth=outbound_scheduler.queue_depth,
+) if burst_window > 0 else None
+# Клиенту разрешено в среднем FLOOD_RATE сообщений в секунду и FLOOD_BURST подряд (0 — без ограничений).
+# Сообщения сверх лимита (FLOOD_ACTION): coalesce — пересылаются менеджеру одним сообщением,
+# warn — отбрасываются с одним предупреждением клиенту, drop — отбрасываются.
+flood_rate = float(os.getenv("FLOOD_RATE", "1"))
+flood_control = FloodControl(
+    manager_router.is_manager,
+    rate=flood_rate,
+    burst=int(os.getenv("FLOOD_BURST", "10")),
+    action=os.getenv("FLOOD_ACTION", "coalesce").strip().lower(),
+) if flood_rate > 0 else None
+# Профили пользователей запоминаются из входящих обновлений, чтобы напоминаниям
+# не нужно было запрашивать имя через bot.get_chat.
+profile_cache = ProfileCache(
+    max_size=int(os.getenv("PROFILE_CACHE_SIZE", "100000")),
+    ttl=float(os.getenv("PROFILE_CACHE_TTL", "86400")),
+)
+dp.update.outer_middleware(profile_cache)
+# file_id загруженных картинок сохраняются в MEDIA_CACHE_PATH, чтобы Telegram
+# не скачивал одно и то же фото по URL для каждого пользователя.
+# В многопроцессном режиме у каждого рабочего процесса свой файл.
+media_cache_path = os.getenv("MEDIA_CACHE_PATH", "media_cache.json")
+if WORKER_INDEX is not None:
+    root, ext = os.path.splitext(media_cache_path)
+    media_cache_path = f"{root}.{WORKER_INDEX}{ext}"
+media_registry = MediaRegistry(
+    bot,
+    path=media_cache_path,
+    warmup_chat_id=int(os.getenv("MEDIA_WARMUP_CHAT_ID", "0")) or None,
+)
+# Одна фоновая задача обслуживает напоминания всех пользователей.
+# Если задан REMINDER_DB_PATH, напоминания сохраняются в SQLite и переживают перезапуск
+# (у каждого рабочего процесса — свой файл с номером процесса в имени).
+reminder_db_path = os.getenv("REMINDER_DB_PATH") or None
+if reminder_db_path and WORKER_INDEX is not None:
+    root, ext = os.path.splitext(reminder_db_path)
+    reminder_db_path = f"{root}.{WORKER_INDEX}{ext}"
+reminder_scheduler = ReminderScheduler(
+    bot,
+    storage,
+    path=reminder_db_path,
+    callbacks=[send_second_reminder, send_third_reminder],
+    callback_kwargs={"profile_cache": profile_cache, "media_registry": media_registry},
+)
+# Отправленные карточки клиентов: повторное обращение в течение CARD_TTL секунд
+# обновляет старую карточку вместо новой (0 — выключено). Если задан
+# CARD_INDEX_PATH, карточки сохраняются в SQLite и переживают перезапуск.
+card_ttl = float(os.getenv("CARD_TTL", "86400"))
+card_index_path = os.getenv("CARD_INDEX_PATH") or None
+if card_index_path and WORKER_INDEX is not None:
+    root, ext = os.path.splitext(card_index_path)
+    card_index_path = f"{root}.{WORKER_INDEX}{ext}"
+card_index = CardIndex(ttl=card_ttl, path=card_index_path) if card_ttl else None
+webhook_config = WebhookConfig()
+# Обновления одного пользователя обрабатываются по порядку, разных — параллельно,
+# не больше UPDATE_WORKERS одновременно (0 — как в aiogram, задача на каждое обновление).
+# Когда необработанных обновлений UPDATE_HIGH_WATER, прием новых приостанавливается.
+# Обновления менеджеров обрабатываются раньше клиентских, но не больше
+# UPDATE_PRIORITY_RUN подряд, пока ждут клиенты.
+# В многопроцессном режиме порядок обеспечивают рабочие процессы.
+update_workers = int(os.getenv("UPDATE_WORKERS", "64")) if BOT_WORKERS == 1 else 0
+update_executor = UpdateExecutor(
+    workers=update_workers,
+    high_water=int(os.getenv("UPDATE_HIGH_WATER", "1000")),
+    is_priority=manager_router.is_manager,
+    priority_run=int(os.getenv("UPDATE_PRIORITY_RUN", "8")),
+) if update_workers > 0 else None
+
+# Метрики Prometheus на http://METRICS_HOST:METRICS_PORT/metrics (0 — выключены).
+# В многопроцессном режиме рабочий процесс N слушает порт METRICS_PORT + 1 + N.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+metrics = Metrics() if METRICS_PORT else None
+if metrics is not None:
+    # После планировщика: измеряется сам вызов API, без ожидания в очереди
+    bot.session.middleware(ApiMetrics(metrics))
+    metrics.register_stats("message_map", message_map.stats)
+    metrics.register_stats("reminders", reminder_scheduler.stats)
+    metrics.register_stats("outbound", outbound_scheduler.stats)
+    metrics.register_stats("profile_cache", profile_cache.stats)
+    metrics.register_stats("state", state_unit.stats)
+    if isinstance(fsm_storage, TTLMemoryStorage):
+        metrics.register_stats("fsm", fsm_storage.stats)
+    metrics.register_stats("managers", manager_router.stats)
+    metrics.register_stats("media", media_registry.stats)
+    if card_index is not None:
+        metrics.register_stats("cards", card_index.stats)
+    if flood_control is not None:
+        metrics.register_stats("flood", flood_control.stats)
+    if update_executor is not None:
+        metrics.register_stats("updates", update_executor.stats)
+        update_executor.latency = metrics.histogram(
+            "bot_update_seconds", "Время от приема обновления ботом до конца обработки (без ожидания у Telegram)", ("lane",),
+        )
+    if burst_buffer is not None:
+        metrics.register_stats("bursts", burst_buffer.stats)
+    if tracer is not None:
+        metrics.register_stats("tracing", tracer.stats)
 
 
 # --- 2. Обработчики для пересылки сообщений ---
@@ -61,14 +273,26 @@ async def user_to_manager(
     bot: Bot,
     notification_service: NotificationService,
     user_session: UserSession,
-    message_map: MessageMap
+    message_map: MessageMap,
+    album_buffer: AlbumBuffer | None = None,
+    manager_router: ManagerRouter | None = None,
+    skip_state_check: bool = False,
+    burst_buffer: BurstBuffer | None = None,
+    coalesced: list[Message] | None = None
 ):
     """
     Пересылает сообщение от обычного пользователя менеджеру.
-    Срабатывает только если пользователь не находится ни в одном из состояний FSM.
+    Сообщения любого типа копируются через `copy_message`, альбомы
+    собираются `album_buffer` и пересылаются одним запросом.
+    При заданном `burst_buffer` серия сообщений клиента пересылается
+    одним сообщением; ответ на него уходит тому же клиенту.
+    `coalesced` — сообщения, придержанные `FloodControl`; они пересылаются
+    так же, как серия.
+    При заданном `manager_router` сообщение уходит менеджеру клиента.
+    Срабатывает только если пользователь не находится ни в одном из состояний FSM;
+    `skip_state_check=True` означает, что это уже проверил `DispatchIndex`.
     """
-    current_state = await state.get_state()
-    if current_state is not None:
+    if not skip_state_check and await state.get_state() is not None:
         # Если пользователь в FSM-сценарии, этот хендлер не должен срабатывать.
         # Его сообщения будут обработаны FSM-хендлерами.
         return
@@ -76,44 +300,84 @@ async def user_to_manager(
     if message.from_user and message.from_user.id:
         user_id = message.from_user.id
         first_name = message.from_user.first_name
-        user_session.set_active_user(user_id)
-
-        # Пересылаем текстовое сообщение менеджеру
-        sent_message = await bot.send_message(
-            notification_service.manager_chat_id,
-            f"Сообщение от {first_name} ({user_id}):\n{message.text}"
-        )
-        # Сохраняем связь между сообщением и пользователем для ответа
-        message_map.add(sent_message.message_id, user_id)
+        prefix = f"Сообщение от {first_name} ({user_id}):\n"
+        originals = None
+        if manager_router is not None:
+            manager_chat_id = manager_router.assign(user_id)
+        else:
+            manager_chat_id = notification_service.manager_chat_id
+
+        if message.media_group_id and album_buffer is not None:
+            album = await album_buffer.collect(message)
+            if album is None:
+                # Этот элемент уйдет вместе с остальными элементами альбома
+                return
+            user_session.set_active_user(user_id)
+            sent_ids = await relay_album(bot, manager_chat_id, album, prefix)
+        elif coalesced or burst_buffer is not None:
+            burst = coalesced or await burst_buffer.collect(message)
+            if burst is None:
+                # Это сообщение уйдет вместе с остальными сообщениями серии
+                return
+            user_session.set_active_user(user_id)
+            with span("relay_burst", messages=len(burst)):
+                relayed = await relay_burst(bot, manager_chat_id, burst, prefix)
+            sent_ids = [sent_id for sent_id, _ in relayed]
+            originals = [ids for _, ids in relayed]
+        else:
+            user_session.set_active_user(user_id)
+            # Пересылаем сообщение менеджеру (медиа копируется на стороне Telegram)
+            sent_ids = await relay_message(bot, manager_chat_id, message, prefix)
+        # Сохраняем связь между сообщениями и пользователем для ответа
+        with span("message_map.add", count=len(sent_ids)):
+            for index, message_id in enumerate(sent_ids):
+                if manager_router is not None:
+                    message_id = manager_router.message_key(manager_chat_id, message_id)
+                message_map.add(message_id, user_id)
+                if originals is not None and burst_buffer is not None:
+                    # Для каждого пересланного сообщения помним исходные сообщения клиента
+                    burst_buffer.remember(message_id, originals[index])
 
 
 async def manager_to_user(
     message: Message,
     bot: Bot,
     message_map: MessageMap,
-    user_session: UserSession
+    user_session: UserSession,
+    manager_router: ManagerRouter | None = None
 ):
     """
     Обрабатывает сообщение от менеджера и пересылает его клиенту.
+    При заданном `manager_router` отмечает активность менеджера, а клиент,
+    которому он ответил, закрепляется за ним.
     """
+    if manager_router is not None:
+        manager_router.touch(message.chat.id)
     # Если менеджер отвечает на конкретное сообщение (делает reply)
     if message.reply_to_message and message.reply_to_message.message_id:
         # Находим ID пользователя, которому предназначался ответ
-        user_id = message_map.get_user(message.reply_to_message.message_id)
+        key = message.reply_to_message.message_id
+        if manager_router is not None:
+            key = manager_router.message_key(message.chat.id, key)
+        with span("message_map.get_user"):
+            user_id = message_map.get_user(key)
         if user_id:
+            if manager_router is not None:
+                manager_router.claim(user_id, message.chat.id)
             try:
-                await bot.send_message(user_id, f"Менеджер: {message.text}")
+                await relay_message(bot, user_id, message, "Менеджер: ")
             except Exception as e:
                 logging.error(f"Не удалось отправить сообщение пользователю {user_id}: {e}")
                 await message.answer(f"Не удалось отправить сообщение пользователю: {e}")
         else:
             await message.answer("Не удалось определить пользователя для ответа. Ответьте на сообщение пользователя.")
     else:
-        # Если менеджер пишет обычное сообщение, оно отправляется последнему активному пользователю
-        active_user_id = user_session.get_active_user()
+        # Если менеджер пишет обычное сообщение, оно отправляется его последнему активному пользователю
+        with span("user_session.get_active_user"):
+            active_user_id = user_session.get_active_user(message.chat.id)
         if active_user_id:
             try:
-                await bot.send_message(active_user_id, f"Менеджер: {message.text}")
+                await relay_message(bot, active_user_id, message, "Менеджер: ")
             except Exception as e:
                 logging.error(f"Не удалось отправить сообщение последнему активному пользователю {active_user_id}: {e}")
                 await message.answer(f"Не удалось отправить сообщение пользователю: {e}")
@@ -121,11 +385,10 @@ async def manager_to_user(
             await message.answer("Нет активного чата с пользователем.")
 
 
-# --- 3. Основная функция и регистрация хендлеров ---
+# --- 3. Регистрация хендлеров и запуск ---
 
-async def main():
+def register_handlers() -> None:
     """
-    Главная асинхронная функция.
     Создает обертки для хендлеров и регистрирует их в диспетчере.
     """
 
@@ -135,50 +398,165 @@ async def main():
     # основную логику из других файлов.
     # Это позволяет держать код чистым и тестируемым.
 
+    async def handle_process_start(message: Message, state: FSMContext):
+        await process_start(message, state, reminder_scheduler)
+
     async def handle_process_houses(message: Message, state: FSMContext):
-        await process_houses(message, state, user_session, notification_service, message_map, bot)
+        await process_houses(message, state, user_session, notification_service, message_map, bot, reminder_scheduler, manager_router, card_index)
 
     async def handle_process_questions(message: Message, state: FSMContext):
-        await process_questions(message, state, user_session, notification_service, message_map, bot)
+        await process_questions(message, state, user_session, notification_service, message_map, bot, reminder_scheduler, manager_router, card_index)
 
     async def handle_process_house_choice(message: Message, state: FSMContext):
-        await process_house_choice(message, state, user_session, notification_service, message_map, bot)
+        await process_house_choice(message, state, user_session, notification_service, message_map, bot, reminder_scheduler, manager_router, card_index)
 
     async def handle_manager_command(message: Message):
-        await check_manager_command(message, manager_store)
+        if await check_manager_command(message, manager_store):
+            manager_router.touch(message.from_user.id)
 
     async def handle_manager_to_user(message: Message):
-        await manager_to_user(message, bot, message_map, user_session)
+        await manager_to_user(message, bot, message_map, user_session, manager_router)
 
-    async def handle_user_to_manager(message: Message, state: FSMContext):
-        await user_to_manager(message, state, bot, notification_service, user_session, message_map)
+    async def handle_user_to_manager(message: Message, state: FSMContext, coalesced: list[Message] | None = None):
+        await user_to_manager(
+            message, state, bot, notification_service, user_session, message_map, album_buffer, manager_router,
+            skip_state_check=True, burst_buffer=burst_buffer, coalesced=coalesced,
+        )
 
-    # --- Регистрация хендлеров в диспетчере ---
-    # Порядок регистрации имеет значение! aiogram проверяет фильтры по очереди.
+    # --- Регистрация хендлеров ---
+    # Вместо цепочки фильтров все сообщения проходят через один обработчик,
+    # который находит нужный хендлер по роли, состоянию FSM и тексту команды/кнопки.
+    # Порядок правил имеет значение: побеждает первое подходящее, как и с фильтрами aiogram.
+    dispatch_index = DispatchIndex(manager_router.is_manager)
 
     # 1. Хендлеры для команд и старта FSM
-    dp.message(Command("start"))(send_welcome)
-    dp.message(F.text == "Начать", Form.waiting_for_start)(process_start)
+    dispatch_index.add(send_welcome, text="/start")
+    dispatch_index.add(handle_process_start, text="Начать", state=Form.waiting_for_start)
 
     # 2. Хендлеры для состояний FSM
-    dp.message(Form.waiting_for_houses)(handle_process_houses)
-    dp.message(Form.waiting_for_questions)(handle_process_questions)
-    dp.message(Form.waiting_for_house_choice)(handle_process_house_choice)
+    dispatch_index.add(handle_process_houses, state=Form.waiting_for_houses)
+    dispatch_index.add(handle_process_questions, state=Form.waiting_for_questions)
+    dispatch_index.add(handle_process_house_choice, state=Form.waiting_for_house_choice)
 
     # 3. Хендлер для команды /manager
-    dp.message(Command("manager"))(handle_manager_command)
+    dispatch_index.add(handle_manager_command, text="/manager")
+
+    # 4. Хендлеры для пересылки сообщений: сначала менеджеры,
+    # затем клиенты вне FSM-сценария.
+    dispatch_index.add(handle_manager_to_user, manager=True)
+    dispatch_index.add(handle_user_to_manager, manager=False, state=None)
+
+    dp.message()(dispatch_index.dispatch)
+    if flood_control is not None:
+        dp.message.outer_middleware(flood_control)
+
+    if metrics is not None:
+        # Время работы каждого хендлера, по имени без префикса handle_
+        dp.message.middleware(HandlerMetrics(
+            metrics, lambda message, data: dispatch_index.route_name(message, data).removeprefix("handle_"),
+        ))
+
+
+async def start_metrics(port: int) -> web.AppRunner | None:
+    """
+    Запускает сервер /metrics, если метрики включены.
+    """
+    if metrics is None:
+        return None
+    return await serve_metrics(metrics, METRICS_HOST, port)
 
-    # 4. Хендлеры для пересылки сообщений.
-    # Они должны идти в конце, так как их фильтры более "широкие".
-    # Сначала проверяем, не пишет ли нам менеджер.
-    dp.message(lambda m: m.from_user.id == notification_service.manager_chat_id)(handle_manager_to_user)
-    # Если нет, то это обычный пользователь.
-    dp.message(lambda m: m.from_user.id != notification_service.manager_chat_id)(handle_user_to_manager)
 
-    # Запускаем polling
-    await dp.start_polling(bot)
+async def close_services() -> None:
+    """
+    Останавливает фоновые задачи и сохраняет данные сервисов.
+    """
+    if update_executor is not None:
+        # Обычно очередь уже дообработана при dp.shutdown (UpdateExecutor.install)
+        await update_executor.close()
+    await reminder_scheduler.close()
+    await outbound_scheduler.close()
+    message_map.close()
+    user_session.close()
+    if card_index is not None:
+        card_index.close()
+    if tracer is not None:
+        tracer.close()
+
+
+async def run_worker(queue) -> None:
+    """
+    Рабочий процесс многопроцессного режима: обрабатывает обновления,
+    которые фронт-процесс присылает через `queue`.
+    """
+    register_handlers()
+    reminder_scheduler.restore()
+    await media_registry.warm(STATIC_MEDIA)
+    await dp.emit_startup(bot=bot, **dp.workflow_data)
+    metrics_runner = await start_metrics(METRICS_PORT + 1 + WORKER_INDEX)
+    try:
+        await consume(queue, dp, bot, manager_router.touch)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await dp.emit_shutdown(bot=bot, **dp.workflow_data)
+        await close_services()
+        await bot.session.close()
+
+
+def worker_entry(index: int, queue) -> None:
+    """
+    Точка входа рабочего процесса. Ctrl+C получает фронт-процесс,
+    а рабочие процессы завершаются, дообработав свою очередь.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(run_worker(queue))
+
+
+async def main():
+    """
+    Главная асинхронная функция.
+    При BOT_WORKERS > 1 запускает фронт-процесс, иначе обрабатывает
+    обновления в текущем процессе.
+    """
+    if BOT_WORKERS > 1:
+        front = ShardedFront(BOT_WORKERS, worker_entry, manager_ids=manager_router.manager_ids())
+        front.start()
+        metrics_runner = await start_metrics(METRICS_PORT)
+        try:
+            if webhook_config.is_webhook:
+                await front.run_webhook(bot, webhook_config)
+            else:
+                await front.run_polling(bot)
+        finally:
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+            front.stop()
+            await bot.session.close()
+        return
+
+    register_handlers()
+    if update_executor is not None:
+        update_executor.install(dp)
+
+    # Восстанавливаем напоминания, сохраненные до перезапуска
+    reminder_scheduler.restore()
+    # Проверяем статические медиа и готовим их file_id
+    await media_registry.warm(STATIC_MEDIA)
+
+    metrics_runner = await start_metrics(METRICS_PORT)
+
+    # Запускаем прием обновлений: webhook или polling, в зависимости от BOT_MODE
+    try:
+        # С исполнителем прием ждет feed_update, чтобы чувствовать обратное давление
+        if webhook_config.is_webhook:
+            await run_webhook(dp, bot, webhook_config, handle_in_background=update_executor is None)
+        else:
+            await dp.start_polling(bot, handle_as_tasks=update_executor is None)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await close_services()
 
 
 if __name__ == "__main__":
     asyncio.run(main())
- 
\ No newline at end of file
@@ -41,6 +41,12 @@ class ManagerStore:
         """
         return user_id in self._managers
 
+    def manager_ids(self) -> list[int]:
+        """
+        Возвращает ID всех менеджеров в постоянном порядке.
+        """
+        return sorted(self._managers)
+
 
 async def check_manager_command(message: Message, store: ManagerStore) -> bool:
     """
@@ -0,0 +1,199 @@
+"""
+Маршрутизация клиентов между несколькими менеджерами.
+
+Каждый новый клиент закрепляется за наименее загруженным менеджером
+(по числу закрепленных за ним клиентов), и его карточка и сообщения
+уходят этому менеджеру. Если менеджер долго не проявлял активности,
+он считается ушедшим: новые клиенты ему не назначаются, а его клиенты
+при следующем сообщении переходят к другому активному менеджеру. Если
+активных менеджеров нет, клиент остается у своего менеджера (иначе он
+переходил бы от одного ушедшего к другому, каждый раз с новой карточкой).
+
+В многопроцессном режиме у каждого рабочего процесса свой `ManagerRouter`:
+нагрузка считается по клиентам этого процесса, а `claim` действует, только
+если ответ менеджера обработан в процессе клиента. Закрепление, сделанное
+в другом процессе, теряется, и клиент остается у назначенного менеджера.
+
+Ключ связи в `MessageMap` — ID сообщения в чате менеджера плюс номер
+менеджера (слот). Если связи хранятся на диске или в общей базе, слоты
+сохраняются в файл `slots_path`: уже известный менеджер сохраняет свой
+номер при любом изменении MANAGER_IDS, новый получает следующий свободный,
+а номера удаленных не переиспользуются. Иначе старые ключи указывали бы
+на карточки другого менеджера.
+
+Поиск менеджера клиента и проверка "это менеджер?" — O(1); выбор
+наименее загруженного выполняется только для новых и переназначаемых
+клиентов и линейно зависит лишь от числа менеджеров.
+"""
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+
+class ManagerRouter:
+    """
+    Закрепляет клиентов за менеджерами.
+
+    :param manager_ids: ID менеджеров (их личные чаты с ботом).
+    :param idle_timeout: Через сколько секунд без активности менеджер считается ушедшим.
+    :param assignment_ttl: Через сколько секунд без сообщений клиент открепляется.
+    :param slots_path: JSON-файл с номерами менеджеров для ключей `MessageMap`
+        (нужен, если связи переживают перезапуск).
+    """
+    def __init__(
+        self,
+        manager_ids: list[int],
+        idle_timeout: float = 15 * 60,
+        assignment_ttl: float = 24 * 60 * 60,
+        slots_path: str | None = None,
+    ):
+        if not manager_ids:
+            raise ValueError("Нужен хотя бы один менеджер")
+        self.idle_timeout = idle_timeout
+        self.assignment_ttl = assignment_ttl
+        self._managers = list(manager_ids)
+        self.slots_path = slots_path
+        # Номер менеджера — старшие биты ключа в MessageMap (ID сообщений уникальны только в чате)
+        self._slots = self._load_slots()
+        self._load = dict.fromkeys(self._managers, 0)
+        now = time.monotonic()
+        self._last_seen = dict.fromkeys(self._managers, now)
+        # user_id -> [manager_id, время последнего сообщения]; по порядку активности
+        self._assignments: OrderedDict[int, list] = OrderedDict()
+        self._reassigned = 0
+
+    def _load_slots(self) -> dict[int, int]:
+        """
+        Возвращает номера текущих менеджеров: сохраненные — как были,
+        новым — следующие свободные (в порядке `manager_ids`).
+        """
+        known: dict[int, int] = {}
+        if self.slots_path and os.path.exists(self.slots_path):
+            try:
+                with open(self.slots_path, encoding="utf-8") as f:
+                    known = {int(manager_id): slot for manager_id, slot in json.load(f).items()}
+            except (OSError, ValueError) as e:
+                # Без файла ключи старых связей могут указать на другого менеджера
+                raise RuntimeError(f"Не удалось прочитать номера менеджеров из {self.slots_path}: {e}") from e
+        added = [manager_id for manager_id in self._managers if manager_id not in known]
+        for manager_id in added:
+            known[manager_id] = max(known.values(), default=-1) + 1
+        if added and self.slots_path:
+            # Процессы с одинаковыми MANAGER_IDS вычисляют одно и то же, поэтому гонка записи безопасна
+            tmp_path = f"{self.slots_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({str(manager_id): slot for manager_id, slot in known.items()}, f, indent=2)
+            os.replace(tmp_path, self.slots_path)
+            logging.info(f"Номера менеджеров для связей сообщений сохранены в {self.slots_path}")
+        return {manager_id: known[manager_id] for manager_id in self._managers}
+
+    def is_manager(self, user_id: int) -> bool:
+        return user_id in self._slots
+
+    def manager_ids(self) -> list[int]:
+        return list(self._managers)
+
+    def touch(self, manager_id: int) -> None:
+        """
+        Отмечает активность менеджера.
+        """
+        if manager_id in self._last_seen:
+            self._last_seen[manager_id] = time.monotonic()
+
+    def _is_online(self, manager_id: int, now: float) -> bool:
+        return now - self._last_seen[manager_id] < self.idle_timeout
+
+    def _least_loaded(self, now: float) -> int | None:
+        """
+        Возвращает наименее загруженного активного менеджера или None, если активных нет.
+        """
+        online = [manager_id for manager_id in self._managers if self._is_online(manager_id, now)]
+        return min(online, key=self._load.__getitem__) if online else None
+
+    def _expire(self, now: float) -> None:
+        # Самые давние клиенты — в начале словаря
+        while self._assignments:
+            user_id, (manager_id, last_active) = next(iter(self._assignments.items()))
+            if now - last_active < self.assignment_ttl:
+                break
+            del self._assignments[user_id]
+            self._load[manager_id] -= 1
+
+    def _set(self, user_id: int, manager_id: int, now: float) -> None:
+        entry = self._assignments.get(user_id)
+        if entry is not None:
+            if entry[0] != manager_id:
+                self._load[entry[0]] -= 1
+                self._load[manager_id] += 1
+            entry[0], entry[1] = manager_id, now
+            self._assignments.move_to_end(user_id)
+        else:
+            self._assignments[user_id] = [manager_id, now]
+            self._load[manager_id] += 1
+
+    def assign(self, user_id: int) -> int:
+        """
+        Возвращает менеджера клиента, при необходимости закрепляя
+        клиента за наименее загруженным активным менеджером.
+        """
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._assignments.get(user_id)
+        if entry is not None and self._is_online(entry[0], now):
+            entry[1] = now
+            self._assignments.move_to_end(user_id)
+            return entry[0]
+        manager_id = self._least_loaded(now)
+        if manager_id is None:
+            # Все менеджеры ушли: клиент остается у своего, а новый — у наименее
+            # загруженного из всех, ведь сообщение все равно должно кому-то прийти
+            if entry is not None:
+                entry[1] = now
+                self._assignments.move_to_end(user_id)
+                return entry[0]
+            manager_id = min(self._managers, key=self._load.__getitem__)
+        if entry is not None and entry[0] != manager_id:
+            self._reassigned += 1
+        self._set(user_id, manager_id, now)
+        return manager_id
+
+    def claim(self, user_id: int, manager_id: int) -> None:
+        """
+        Закрепляет клиента за менеджером, который ему ответил.
+        """
+        if manager_id in self._slots:
+            self._set(user_id, manager_id, time.monotonic())
+
+    def manager_for(self, user_id: int) -> int | None:
+        """
+        Возвращает текущего менеджера клиента без назначения.
+        """
+        entry = self._assignments.get(user_id)
+        return entry[0] if entry else None
+
+    def message_key(self, manager_id: int, message_id: int) -> int:
+        """
+        Ключ для MessageMap: ID сообщения в чате менеджера плюс номер менеджера.
+        У первого менеджера ключ совпадает с ID сообщения.
+        """
+        slot = self._slots.get(manager_id)
+        if slot is None:
+            # Слот 0 чужого менеджера совпал бы с ключами первого менеджера
+            raise ValueError(f"{manager_id} не входит в число менеджеров")
+        return (slot << 32) | message_id
+
+    def stats(self) -> dict[str, int]:
+        """
+        Возвращает число закрепленных клиентов, активных менеджеров,
+        переназначений и нагрузку на каждого менеджера.
+        """
+        now = time.monotonic()
+        stats = {
+            "assigned": len(self._assignments),
+            "online": sum(self._is_online(manager_id, now) for manager_id in self._managers),
+            "reassigned": self._reassigned,
+        }
+        stats.update({f"load_{manager_id}": load for manager_id, load in self._load.items()})
+        return stats
@@ -0,0 +1,181 @@
+"""
+Реестр статических медиафайлов бота.
+
+Telegram позволяет один раз загрузить файл (или указать URL), а затем
+отправлять его по `file_id` без повторной загрузки. `MediaRegistry`
+запоминает `file_id` для каждого источника (URL или локального файла)
+и хранит их в JSON-файле, поэтому после перезапуска картинки тоже
+уходят по `file_id`.
+
+Вместе с `file_id` хранится отпечаток источника: хеш содержимого для
+локального файла и ETag/Last-Modified для URL. Если источник изменился,
+запись сбрасывается и файл загружается заново. Так же запись сбрасывается,
+если Telegram отклонил сам `file_id`; остальные ошибки отправки (чат не
+найден, слишком длинная подпись...) передаются вызывающему коду.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+import aiohttp
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+
+# Фрагменты ответов Telegram, означающих, что отклонен именно file_id
+_FILE_ID_ERRORS = ("wrong file identifier", "wrong remote file identifier", "file reference")
+
+
+def _is_url(source: str) -> bool:
+    return source.startswith(("http://", "https://"))
+
+
+def _is_file_id_error(error: TelegramBadRequest) -> bool:
+    message = error.message.lower().replace("_", " ")
+    return any(fragment in message for fragment in _FILE_ID_ERRORS)
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"sha256:{digest.hexdigest()}"
+
+
+class MediaRegistry:
+    """
+    Кэш `file_id` для фотографий, которые бот отправляет многим пользователям.
+
+    `send_photo` отправляет фото по сохраненному `file_id`, а при его
+    отсутствии — по исходному URL или файлу, запоминая полученный `file_id`.
+    `warm` вызывается при запуске: проверяет, не изменились ли источники,
+    и при заданном `warmup_chat_id` заранее получает недостающие `file_id`.
+    """
+    def __init__(self, bot: Bot, path: str | None = None, warmup_chat_id: int | None = None):
+        self.bot = bot
+        self.path = path
+        self.warmup_chat_id = warmup_chat_id
+        # источник -> {"file_id": ..., "fingerprint": ...}
+        self._entries: dict[str, dict[str, str | None]] = self._load()
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._hits = 0
+        self._uploads = 0
+        self._invalidated = 0
+
+    def _load(self) -> dict[str, dict[str, str | None]]:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Не удалось прочитать кэш медиа {self.path}: {e}")
+            return {}
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    async def _fingerprint(self, source: str) -> str | None:
+        """
+        Возвращает отпечаток источника или None, если его не удалось получить.
+        """
+        if not _is_url(source):
+            return await asyncio.to_thread(_file_digest, source)
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
+                async with session.head(source, allow_redirects=True) as response:
+                    return response.headers.get("ETag") or response.headers.get("Last-Modified")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning(f"Не удалось проверить {source}: {e}")
+            return None
+
+    def get_file_id(self, source: str) -> str | None:
+        entry = self._entries.get(source)
+        return entry["file_id"] if entry else None
+
+    def invalidate(self, source: str) -> None:
+        """
+        Забывает `file_id` источника: следующая отправка загрузит файл заново.
+        """
+        if self._entries.pop(source, None) is not None:
+            self._invalidated += 1
+            self._save()
+
+    async def send_photo(self, chat_id: int | str, source: str, **kwargs) -> Message:
+        """
+        Отправляет фото из `source` (URL или путь к файлу), по возможности по `file_id`.
+        Остальные аргументы передаются в `bot.send_photo`.
+        """
+        file_id = self.get_file_id(source)
+        if file_id is None:
+            # Пока источник загружается в первый раз, остальные отправки ждут его file_id
+            async with self._locks.setdefault(source, asyncio.Lock()):
+                file_id = self.get_file_id(source)
+                if file_id is None:
+                    return await self._upload(chat_id, source, **kwargs)
+        try:
+            message = await self.bot.send_photo(chat_id, photo=file_id, **kwargs)
+            self._hits += 1
+            return message
+        except TelegramBadRequest as e:
+            if not _is_file_id_error(e):
+                raise
+            logging.warning(f"file_id для {source} больше не действителен, загружаем заново: {e}")
+            self.invalidate(source)
+            return await self._upload(chat_id, source, **kwargs)
+
+    async def _upload(self, chat_id: int | str, source: str, **kwargs) -> Message:
+        photo = source if _is_url(source) else FSInputFile(source)
+        message = await self.bot.send_photo(chat_id, photo=photo, **kwargs)
+        self._uploads += 1
+        if message.photo:
+            # Последний размер — самый большой, его file_id и отправляем дальше
+            self._entries[source] = {
+                "file_id": message.photo[-1].file_id,
+                "fingerprint": await self._fingerprint(source),
+            }
+            self._save()
+        return message
+
+    async def warm(self, sources: list[str]) -> int:
+        """
+        Проверяет источники при запуске: сбрасывает записи, чей источник
+        изменился, и, если задан `warmup_chat_id`, загружает недостающие
+        файлы туда (служебное сообщение сразу удаляется).
+        Возвращает число источников с готовым `file_id`.
+        """
+        for source in sources:
+            entry = self._entries.get(source)
+            if entry is not None:
+                fingerprint = await self._fingerprint(source)
+                # Неизвестный отпечаток (сеть недоступна) не повод терять file_id
+                if fingerprint is not None and fingerprint != entry["fingerprint"]:
+                    logging.info(f"Источник {source} изменился, file_id будет получен заново")
+                    self.invalidate(source)
+            if self.warmup_chat_id and self.get_file_id(source) is None:
+                try:
+                    message = await self._upload(self.warmup_chat_id, source, disable_notification=True)
+                    await self.bot.delete_message(self.warmup_chat_id, message.message_id)
+                except Exception as e:
+                    logging.error(f"Не удалось заранее загрузить {source}: {e}")
+        return sum(1 for source in sources if self.get_file_id(source) is not None)
+
+    def stats(self) -> dict[str, int]:
+        """
+        Возвращает число закэшированных файлов, отправок по `file_id`,
+        загрузок и сброшенных записей.
+        """
+        return {
+            "cached": len(self._entries),
+            "hits": self._hits,
+            "uploads": self._uploads,
+            "invalidated": self._invalidated,
+        }
@@ -5,6 +5,20 @@
 менеджеру, с исходным пользователем. Это делает возможным
 корректную работу функции "Ответ" (reply).
 """
+import logging
+import mmap
+import os
+import sqlite3
+import struct
+import time
+from array import array
+
+# Множитель для хеширования ID сообщений (золотое сечение, 64 бита)
+_HASH_MULT = 0x9E3779B97F4A7C15
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+_EMPTY = -1
+_INITIAL_CAPACITY = 1024
+
 
 class MessageMap:
     """
@@ -12,27 +26,523 @@ class MessageMap:
     с ID пользователя, который инициировал это сообщение.
 
     Структура: {manager_message_id: user_id}
+
+    Вместо словаря используются упакованные массивы:
+    - кольцевой буфер записей (manager_msg_id, user_id, время добавления),
+      по 20 байт на запись;
+    - хеш-индекс с открытой адресацией (int32 номер ячейки кольца).
+
+    Размер ограничен `max_size`: при переполнении вытесняется самая старая
+    запись. Если задан `ttl` (в секундах), записи старше него считаются
+    отсутствующими и удаляются. Добавление, поиск и вытеснение — O(1).
     """
-    def __init__(self):
-        self._msg_to_user: dict[int, int] = {}
+    def __init__(self, max_size: int = 1_000_000, ttl: float | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        # Кольцо чуть больше max_size: запас под "мертвые" ячейки после clear(),
+        # чтобы уплотнение требовалось не чаще, чем раз в max_size / 4 добавлений
+        self._ring_limit = max_size + max(max_size // 4, 1)
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expired = 0
+        self._allocate(min(_INITIAL_CAPACITY, self._ring_limit))
+
+    def _allocate(self, capacity: int) -> None:
+        self._capacity = capacity
+        self._keys = array("q", bytes(8 * capacity))
+        self._users = array("q", bytes(8 * capacity))
+        self._times = array("I", bytes(4 * capacity))
+        # Кольцо: запись идет в _head, самая старая занятая ячейка — _tail
+        self._head = 0
+        self._used = 0
+        self._init_index(1 << max(4, (2 * capacity - 1).bit_length()))
+
+    def _init_index(self, table_size: int, index: array | None = None) -> None:
+        self._shift = 64 - (table_size.bit_length() - 1)
+        self._table_mask = table_size - 1
+        self._index = index if index is not None else array("i", [_EMPTY]) * table_size
+
+    def _hash(self, key: int) -> int:
+        return ((key * _HASH_MULT) & _MASK64) >> self._shift
+
+    def _find(self, key: int) -> int:
+        """
+        Возвращает позицию ключа в хеш-индексе или позицию пустой ячейки.
+        """
+        index, keys, mask = self._index, self._keys, self._table_mask
+        pos = ((key * _HASH_MULT) & _MASK64) >> self._shift
+        slot = index[pos]
+        while slot != _EMPTY and keys[slot] != key:
+            pos = (pos + 1) & mask
+            slot = index[pos]
+        return pos
+
+    def _index_delete(self, pos: int) -> None:
+        """
+        Удаляет элемент из хеш-индекса со сдвигом следующих элементов назад,
+        чтобы не оставлять "надгробий" в цепочке линейного пробирования.
+        """
+        index, keys, mask = self._index, self._keys, self._table_mask
+        hole = pos
+        nxt = pos
+        while True:
+            nxt = (nxt + 1) & mask
+            slot = index[nxt]
+            if slot == _EMPTY:
+                break
+            home = self._hash(keys[slot])
+            # Элемент можно перенести в "дыру", если его исходная позиция
+            # не лежит циклически в промежутке (hole, nxt]
+            if (hole <= nxt and (home <= hole or home > nxt)) or (hole > nxt and home <= hole and home > nxt):
+                index[hole] = slot
+                hole = nxt
+        index[hole] = _EMPTY
+
+    def _evict_oldest(self) -> bool:
+        """
+        Освобождает самую старую ячейку кольца. Возвращает True,
+        если в ней была живая запись.
+        """
+        tail = (self._head - self._used) % self._capacity
+        self._used -= 1
+        pos = self._find(self._keys[tail])
+        if self._index[pos] == tail:
+            self._index_delete(pos)
+            self._size -= 1
+            return True
+        return False
+
+    def _expire(self, now: int) -> None:
+        deadline = now - self.ttl
+        while self._used:
+            tail = (self._head - self._used) % self._capacity
+            if self._times[tail] > deadline:
+                break
+            if self._evict_oldest():
+                self._expired += 1
+
+    def _grow(self) -> None:
+        """
+        Увеличивает кольцо вдвое (не больше предела) или, если предел уже
+        достигнут, уплотняет его: переносит живые записи в порядке
+        добавления и перестраивает индекс.
+        """
+        keys, users, times = self._keys, self._users, self._times
+        capacity, head, used = self._capacity, self._head, self._used
+        # Живые ячейки — те, на которые ссылается индекс
+        live = bytearray(capacity)
+        for slot in self._index:
+            if slot != _EMPTY:
+                live[slot] = 1
+        self._allocate(min(capacity * 2, self._ring_limit))
+        for i in range(used):
+            slot = (head - used + i) % capacity
+            if live[slot]:
+                self._append(keys[slot], users[slot], times[slot])
+
+    def _append(self, key: int, user_id: int, added_at: int, pos: int | None = None) -> None:
+        slot = self._head
+        self._keys[slot] = key
+        self._users[slot] = user_id
+        self._times[slot] = added_at
+        self._head = slot + 1 if slot + 1 < self._capacity else 0
+        self._used += 1
+        self._index[self._find(key) if pos is None else pos] = slot
 
     def add(self, manager_msg_id: int, user_id: int) -> None:
         """
         Добавляет новую связь "сообщение менеджера -> пользователь".
         """
-        self._msg_to_user[manager_msg_id] = user_id
+        now = int(time.time())
+        if self.ttl is not None:
+            self._expire(now)
+        pos = self._find(manager_msg_id)
+        if self._index[pos] != _EMPTY:
+            # Повторное добавление: старая ячейка кольца становится "мертвой"
+            self._index_delete(pos)
+            self._size -= 1
+            pos = None
+        if self._size >= self.max_size:
+            # Освобождаем ячейки с конца кольца, пока не вытесним живую запись
+            while not self._evict_oldest():
+                pass
+            self._evictions += 1
+            pos = None
+        if self._used == self._capacity:
+            self._grow()
+            pos = None
+        # Позицию в индексе ищем заново, только если индекс менялся
+        self._append(manager_msg_id, user_id, now, pos)
+        self._size += 1
 
     def get_user(self, manager_msg_id: int) -> int | None:
         """
         Возвращает ID пользователя по ID сообщения в чате менеджера.
         """
-        return self._msg_to_user.get(manager_msg_id)
+        # Поиск встроен вручную: это горячий путь каждого ответа менеджера
+        index, keys, mask = self._index, self._keys, self._table_mask
+        pos = ((manager_msg_id * _HASH_MULT) & _MASK64) >> self._shift
+        slot = index[pos]
+        while slot != _EMPTY and keys[slot] != manager_msg_id:
+            pos = (pos + 1) & mask
+            slot = index[pos]
+        if slot == _EMPTY or (self.ttl is not None and self._times[slot] <= time.time() - self.ttl):
+            self._misses += 1
+            return None
+        self._hits += 1
+        return self._users[slot]
 
     def clear(self, manager_msg_id: int) -> None:
         """
         Удаляет связь из хранилища. Может быть полезно,
         когда диалог считается завершенным.
         """
-        if manager_msg_id in self._msg_to_user:
-            del self._msg_to_user[manager_msg_id]
- 
\ No newline at end of file
+        pos = self._find(manager_msg_id)
+        if self._index[pos] != _EMPTY:
+            self._index_delete(pos)
+            self._size -= 1
+
+    def __len__(self) -> int:
+        return self._size
+
+    def close(self) -> None:
+        """
+        Освобождает ресурсы хранилища. Для хранилища в памяти ничего не делает.
+        """
+
+    def stats(self) -> dict[str, float]:
+        """
+        Возвращает статистику: размер, емкость, попадания/промахи,
+        долю попаданий, число вытесненных записей и занимаемую память.
+        """
+        lookups = self._hits + self._misses
+        return {
+            "size": self._size,
+            "capacity": self._capacity,
+            "max_size": self.max_size,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "evictions": self._evictions,
+            "expired": self._expired,
+            "memory_bytes": self._memory_bytes(),
+        }
+
+    def _memory_bytes(self) -> int:
+        return sum(
+            a.buffer_info()[1] * a.itemsize
+            for a in (self._keys, self._users, self._times, self._index)
+        )
+
+
+# Формат журнала: заголовок и записи одинаковой длины (3 x int64 = 24 байта)
+_LOG_MAGIC = b"MSGLOG01"
+_LOG_HEADER = struct.Struct("<8sqq")  # магия, поколение, число записей
+_IDX_MAGIC = b"MSGIDX01"
+_IDX_HEADER = struct.Struct("<8sqqqq")  # магия, поколение, покрыто записей, размер, размер таблицы
+_RECORD_WORDS = 3
+_RECORD_SIZE = _RECORD_WORDS * 8
+_INITIAL_LOG_RECORDS = 4096
+# user_id = 0 в журнале означает, что связь удалена через clear()
+_TOMBSTONE = 0
+
+
+class PersistentMessageMap(MessageMap):
+    """
+    Версия MessageMap, которая переживает перезапуск бота.
+
+    Каждая связь дописывается в конец файла-журнала записью фиксированной
+    длины (manager_msg_id, user_id, время добавления); файл отображается
+    в память через mmap, и столбцы записей читаются прямо из него.
+    Хеш-индекс хранит номера записей и периодически сохраняется рядом
+    (`<path>.idx`): при старте он читается с диска целиком, а из журнала
+    дочитывается только хвост после последнего сохранения.
+
+    Журнал только растет: clear() дописывает запись-"надгробие".
+    compact() переписывает журнал, оставляя лишь живые и не истекшие связи.
+    Ограничения по количеству (max_size) здесь нет — объем регулируется
+    через ttl и сжатие.
+    """
+    def __init__(self, path: str, ttl: float | None = None, checkpoint_every: int = 1_000_000):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.ttl = ttl
+        self.max_size = None
+        self.checkpoint_every = checkpoint_every
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expired = 0
+        self._since_checkpoint = 0
+        self._open_log()
+        covered = self._load_checkpoint()
+        if covered is None:
+            self._init_index(16)
+            self._size = 0
+            covered = 0
+        self._replay(covered, self._used)
+
+    # --- Журнал ---
+
+    def _open_log(self) -> None:
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < _LOG_HEADER.size:
+            with open(self.path, "wb") as f:
+                f.write(_LOG_HEADER.pack(_LOG_MAGIC, time.time_ns(), 0))
+        self._file = open(self.path, "r+b")
+        magic, self._generation, self._used = _LOG_HEADER.unpack(self._file.read(_LOG_HEADER.size))
+        if magic != _LOG_MAGIC:
+            raise ValueError(f"Файл {self.path} не является журналом MessageMap")
+        records = (os.path.getsize(self.path) - _LOG_HEADER.size) // _RECORD_SIZE
+        self._map(max(records, self._used, _INITIAL_LOG_RECORDS))
+
+    def _map(self, capacity: int) -> None:
+        """
+        Отображает файл в память на `capacity` записей (при необходимости
+        увеличивая его) и создает представления столбцов.
+        """
+        self._file.truncate(_LOG_HEADER.size + _RECORD_SIZE * capacity)
+        self._capacity = capacity
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        self._words = memoryview(self._mm).cast("q")
+        # Заголовок занимает ровно одну запись, поэтому столбцы начинаются с 3-го слова
+        self._keys = self._words[3::_RECORD_WORDS]
+        self._users = self._words[4::_RECORD_WORDS]
+        self._times = self._words[5::_RECORD_WORDS]
+
+    def _unmap(self) -> None:
+        for view in (self._keys, self._users, self._times, self._words):
+            view.release()
+        self._mm.close()
+
+    def _append(self, key: int, user_id: int, added_at: int) -> int:
+        if self._used == self._capacity:
+            self._unmap()
+            self._map(self._capacity * 2)
+        record = self._used
+        self._keys[record] = key
+        self._users[record] = user_id
+        self._times[record] = added_at
+        # Счетчик обновляется после записи: недописанная запись при сбое игнорируется
+        self._used += 1
+        self._words[2] = self._used
+        return record
+
+    # --- Индекс ---
+
+    def _index_put(self, key: int, record: int) -> None:
+        if (self._size + 1) * 2 > self._table_mask + 1:
+            old = self._index
+            self._init_index((self._table_mask + 1) * 2)
+            for slot in old:
+                if slot != _EMPTY:
+                    self._index[self._find(self._keys[slot])] = slot
+        pos = self._find(key)
+        if self._index[pos] == _EMPTY:
+            self._size += 1
+        self._index[pos] = record
+
+    def _replay(self, start: int, end: int) -> None:
+        """
+        Применяет к индексу записи журнала с номерами [start, end).
+        """
+        keys, users = self._keys, self._users
+        for record in range(start, end):
+            if users[record] == _TOMBSTONE:
+                pos = self._find(keys[record])
+                if self._index[pos] != _EMPTY:
+                    self._index_delete(pos)
+                    self._size -= 1
+            else:
+                self._index_put(keys[record], record)
+
+    def _load_checkpoint(self) -> int | None:
+        """
+        Загружает сохраненный индекс. Возвращает число записей журнала,
+        которые он покрывает, или None, если индекс отсутствует или устарел.
+        """
+        if not os.path.exists(self.index_path):
+            return None
+        try:
+            with open(self.index_path, "rb") as f:
+                magic, generation, covered, size, table_size = _IDX_HEADER.unpack(f.read(_IDX_HEADER.size))
+                if magic != _IDX_MAGIC or generation != self._generation or covered > self._used:
+                    return None
+                index = array("i")
+                index.fromfile(f, table_size)
+        except (OSError, EOFError, struct.error) as e:
+            logging.warning(f"Индекс {self.index_path} поврежден, журнал будет прочитан целиком: {e}")
+            return None
+        self._init_index(table_size, index)
+        self._size = size
+        return covered
+
+    def checkpoint(self) -> None:
+        """
+        Сбрасывает журнал на диск и атомарно сохраняет индекс.
+        """
+        self._mm.flush()
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_IDX_HEADER.pack(_IDX_MAGIC, self._generation, self._used, self._size, len(self._index)))
+            self._index.tofile(f)
+        os.replace(tmp_path, self.index_path)
+        self._since_checkpoint = 0
+
+    # --- Публичный API ---
+
+    def add(self, manager_msg_id: int, user_id: int) -> None:
+        """
+        Добавляет новую связь "сообщение менеджера -> пользователь".
+        """
+        self._index_put(manager_msg_id, self._append(manager_msg_id, user_id, int(time.time())))
+        self._since_checkpoint += 1
+        if self._since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def clear(self, manager_msg_id: int) -> None:
+        """
+        Удаляет связь из хранилища. Может быть полезно,
+        когда диалог считается завершенным.
+        """
+        pos = self._find(manager_msg_id)
+        if self._index[pos] != _EMPTY:
+            self._append(manager_msg_id, _TOMBSTONE, int(time.time()))
+            self._index_delete(pos)
+            self._size -= 1
+
+    def compact(self) -> None:
+        """
+        Переписывает журнал, оставляя только живые и не истекшие связи
+        в исходном порядке, и перестраивает индекс.
+
+        Работает за O(число записей журнала), поэтому вызывается не на
+        горячем пути, а при остановке бота (см. close()).
+        """
+        deadline = time.time() - self.ttl if self.ttl is not None else None
+        records = array("q")
+        for record in range(self._used):
+            key = self._keys[record]
+            if self._index[self._find(key)] != record:
+                continue
+            if deadline is not None and self._times[record] <= deadline:
+                self._expired += 1
+                continue
+            records.extend((key, self._users[record], self._times[record]))
+
+        tmp_path = self.path + ".compact"
+        with open(tmp_path, "wb") as f:
+            f.write(_LOG_HEADER.pack(_LOG_MAGIC, time.time_ns(), len(records) // _RECORD_WORDS))
+            records.tofile(f)
+        self._unmap()
+        self._file.close()
+        os.replace(tmp_path, self.path)
+
+        self._open_log()
+        self._init_index(16)
+        self._size = 0
+        self._replay(0, self._used)
+        self.checkpoint()
+
+    def close(self) -> None:
+        """
+        Сохраняет индекс (предварительно сжав журнал, если в нем больше
+        половины записей устарели) и закрывает файл.
+        """
+        if self._used > 2 * self._size + _INITIAL_LOG_RECORDS:
+            self.compact()
+        else:
+            self.checkpoint()
+        self._unmap()
+        self._file.close()
+
+    def _memory_bytes(self) -> int:
+        # Записи журнала живут в mmap (кеш страниц ОС), в куче только индекс
+        return len(self._index) * self._index.itemsize
+
+    def stats(self) -> dict[str, float]:
+        stats = super().stats()
+        stats["log_records"] = self._used
+        return stats
+
+
+class SharedMessageMap:
+    """
+    Сопоставление сообщений в общей базе SQLite для режима нескольких
+    процессов (BOT_WORKERS > 1): карточку менеджеру отправляет процесс,
+    обслуживающий клиента, а ответ менеджера обрабатывает процесс менеджера.
+
+    Интерфейс тот же, что у `MessageMap`. База открывается в режиме WAL,
+    поэтому чтения не блокируются записью из других процессов.
+    """
+    def __init__(self, path: str, ttl: float | None = None, cleanup_every: int = 10_000):
+        self.path = path
+        self.ttl = ttl
+        self.cleanup_every = cleanup_every
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS message_map ("
+            "manager_msg_id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, added_at INTEGER NOT NULL)"
+        )
+        self._since_cleanup = 0
+        self._hits = 0
+        self._misses = 0
+
+    def _expire(self) -> None:
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM message_map WHERE added_at <= ?", (int(time.time() - self.ttl),))
+        self._since_cleanup = 0
+
+    def add(self, manager_msg_id: int, user_id: int) -> None:
+        """
+        Добавляет новую связь "сообщение менеджера -> пользователь".
+        """
+        self._db.execute(
+            "INSERT OR REPLACE INTO message_map (manager_msg_id, user_id, added_at) VALUES (?, ?, ?)",
+            (manager_msg_id, user_id, int(time.time())),
+        )
+        self._since_cleanup += 1
+        if self._since_cleanup >= self.cleanup_every:
+            self._expire()
+
+    def get_user(self, manager_msg_id: int) -> int | None:
+        """
+        Возвращает ID пользователя по ID сообщения в чате менеджера.
+        """
+        row = self._db.execute(
+            "SELECT user_id, added_at FROM message_map WHERE manager_msg_id = ?", (manager_msg_id,)
+        ).fetchone()
+        if row is None or (self.ttl is not None and row[1] <= time.time() - self.ttl):
+            self._misses += 1
+            return None
+        self._hits += 1
+        return row[0]
+
+    def clear(self, manager_msg_id: int) -> None:
+        """
+        Удаляет связь из хранилища.
+        """
+        self._db.execute("DELETE FROM message_map WHERE manager_msg_id = ?", (manager_msg_id,))
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM message_map").fetchone()[0]
+
+    def close(self) -> None:
+        """
+        Удаляет устаревшие записи и закрывает базу.
+        """
+        self._expire()
+        self._db.close()
+
+    def stats(self) -> dict[str, float]:
+        lookups = self._hits + self._misses
+        return {
+            "size": len(self),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,220 @@
+"""
+Метрики бота в формате Prometheus.
+
+- `HandlerMetrics` — middleware aiogram: гистограмма времени работы
+  каждого хендлера (`bot_handler_seconds`) и число ошибок в хендлерах.
+- `ApiMetrics` — request middleware сессии бота: число вызовов Bot API,
+  их время (`bot_api_seconds`) и ошибки по методам.
+- `Metrics.register_stats` — показатели сервисов (`MessageMap`,
+  `ReminderScheduler` и др.) из их `stats()`, считываются в момент запроса.
+
+Все это отдается по HTTP на `/metrics` (`serve_metrics`).
+
+Запись метрики — пара вызовов `perf_counter`, бинарный поиск корзины
+и увеличение счетчика, без блокировок и выделения памяти на каждое
+событие, поэтому метрики можно не выключать в продакшене.
+"""
+import logging
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.types import Message, TelegramObject
+from aiohttp import web
+
+# Границы корзин гистограмм, в секундах
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Гистограмма Prometheus с фиксированными корзинами.
+    """
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # Последняя ячейка — значения больше последней границы (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Family:
+    """
+    Метрика с метками: значение (счетчик или гистограмма) на каждый набор меток.
+    """
+    def __init__(self, name: str, help: str, kind: str, labels: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = labels
+        if kind == "histogram":
+            self.values: dict[tuple[str, ...], Any] = defaultdict(lambda: Histogram(buckets))
+        else:
+            self.values = defaultdict(float)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.values.items()):
+            if self.kind == "histogram":
+                total = 0
+                for bound, count in zip((*value.buckets, "+Inf"), value.counts):
+                    total += count
+                    le = f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {total}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, key)} {value.sum}")
+                lines.append(f"{self.name}_count{_labels(self.labels, key)} {value.count}")
+            else:
+                lines.append(f"{self.name}{_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Metrics:
+    """
+    Реестр метрик бота.
+
+    :param buckets: Границы корзин гистограмм времени, в секундах.
+    """
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._families: dict[str, _Family] = {}
+        self._stats: dict[str, Callable[[], dict[str, float]]] = {}
+        self.handler_seconds = self.histogram("bot_handler_seconds", "Время работы хендлера", ("handler",))
+        self.handler_errors = self.counter("bot_handler_errors_total", "Ошибки в хендлерах", ("handler",))
+        self.api_seconds = self.histogram("bot_api_seconds", "Время вызова Bot API", ("method",))
+        self.api_errors = self.counter("bot_api_errors_total", "Ошибки вызовов Bot API", ("method", "error"))
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = ()) -> dict[tuple[str, ...], Histogram]:
+        """
+        Создает гистограмму; возвращает словарь "значения меток -> Histogram".
+        """
+        family = _Family(name, help, "histogram", labels, self.buckets)
+        self._families[name] = family
+        return family.values
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> dict[tuple[str, ...], float]:
+        """
+        Создает счетчик; возвращает словарь "значения меток -> значение".
+        """
+        family = _Family(name, help, "counter", labels, self.buckets)
+        self._families[name] = family
+        return family.values
+
+    def register_stats(self, prefix: str, stats: Callable[[], dict[str, float]]) -> None:
+        """
+        Публикует показатели сервиса как метрики `bot_<prefix>_<ключ>`.
+        `stats` вызывается только при запросе /metrics.
+        """
+        self._stats[prefix] = stats
+
+    def render(self) -> str:
+        """
+        Возвращает все метрики в текстовом формате Prometheus.
+        """
+        lines: list[str] = []
+        for family in self._families.values():
+            lines.extend(family.render())
+        for prefix, stats in self._stats.items():
+            try:
+                values = stats()
+            except Exception as e:
+                logging.error(f"Не удалось получить показатели {prefix}: {e}")
+                continue
+            for key, value in values.items():
+                name = f"bot_{prefix}_{key}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class HandlerMetrics(BaseMiddleware):
+    """
+    Middleware, которое измеряет время обработки сообщения хендлером.
+
+    :param name_of: Функция, возвращающая имя хендлера для сообщения; нужна,
+        когда все сообщения проходят через один обработчик (`DispatchIndex`).
+        По умолчанию используется имя функции-обработчика.
+    """
+    def __init__(self, metrics: Metrics, name_of: Callable[[Message, dict[str, Any]], str] | None = None):
+        self.metrics = metrics
+        self.name_of = name_of
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if self.name_of is not None:
+            name = self.name_of(event, data)
+        else:
+            name = data["handler"].callback.__name__
+        key = (name,)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.metrics.handler_errors[key] += 1
+            raise
+        finally:
+            self.metrics.handler_seconds[key].observe(time.perf_counter() - start)
+
+
+class ApiMetrics(BaseRequestMiddleware):
+    """
+    Request middleware сессии бота: время и ошибки каждого вызова Bot API.
+    Подключается после `OutboundScheduler`, поэтому время ожидания
+    в очереди не учитывается, а каждая повторная попытка считается отдельно.
+    """
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        api_method = method.__api_method__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            self.metrics.api_errors[(api_method, type(e).__name__)] += 1
+            raise
+        finally:
+            self.metrics.api_seconds[(api_method,)].observe(time.perf_counter() - start)
+
+
+def build_metrics_app(metrics: Metrics) -> web.Application:
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    return app
+
+
+async def serve_metrics(metrics: Metrics, host: str, port: int) -> web.AppRunner:
+    """
+    Запускает HTTP-сервер с /metrics в фоне; вернувшийся runner нужно
+    остановить через `runner.cleanup()`.
+    """
+    runner = web.AppRunner(build_metrics_app(metrics), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logging.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
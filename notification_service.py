@@ -11,14 +11,17 @@ from aiogram import Bot
 from aiogram.types import User
 from dotenv import load_dotenv
 
+from profile_cache import CachedProfile
+
 # Загружаем ID чата менеджера из переменных окружения
 load_dotenv()
 MANAGER_CHAT_ID = int(os.getenv("MANAGER_CHAT_ID", "0"))
 
 
-def build_manager_message(user: User) -> str:
+def build_manager_message(user: User | CachedProfile) -> str:
     """
     Создаетформатированный текст ("карточку клиента") для отправки м��неджеру.
+    Принимает как `User` из обновления, так и профиль из `ProfileCache`.
     """
     username = f"@{user.username}" if user.username else "не указан"
     return (
@@ -0,0 +1,292 @@
+"""
+Планировщик исходящих сообщений с учетом лимитов Telegram.
+
+`OutboundScheduler` подключается к сессии бота как request middleware
+(`bot.session.middleware(scheduler)`), поэтому через него проходят все
+отправки: `bot.send_message`, `send_photo`, `message.answer` и т.д.
+Остальные методы API (getUpdates, getChat, setWebhook...) не задерживаются.
+
+Перед отправкой запрос ждет своей очереди:
+- глобальный token bucket (по умолчанию 30 сообщений в секунду);
+- token bucket на каждый чат (1 сообщение в секунду для личных чатов,
+  20 в минуту для групп);
+- приоритетные полосы: ответы менеджера раньше карточек,
+  карточки раньше напоминаний.
+
+При `TelegramRetryAfter` отправки приостанавливаются на указанное
+Telegram время, и запрос повторяется автоматически. Повтор встает в начало
+очереди своего чата, а следующая отправка в чат разрешается только после
+завершения предыдущей, поэтому сообщения в один чат не обгоняют друг друга.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from enum import IntEnum
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+
+from tracing import span
+
+# Префиксы методов API, которые отправляют сообщения в чат и подпадают под лимиты
+_SEND_PREFIXES = ("send", "copy", "forward")
+
+
+class Lane(IntEnum):
+    """
+    Приоритетные полосы очереди (меньше — важнее).
+    """
+    REPLY = 0      # живой диалог: ответы менеджера и пересылка сообщений клиента
+    CARD = 1       # карточки новых клиентов
+    REMINDER = 2   # напоминания FSM
+
+
+_current_lane: contextvars.ContextVar[Lane] = contextvars.ContextVar("outbound_lane", default=Lane.REPLY)
+
+
+@contextmanager
+def send_lane(lane: Lane):
+    """
+    Задает полосу для всех отправок внутри блока `with`.
+    """
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+class _Bucket:
+    """
+    Token bucket: `rate` токенов в секунду, не больше `burst` в запасе.
+    """
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self) -> float:
+        """
+        Сколько секунд осталось до появления целого токена.
+        """
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """
+    Центральная очередь исходящих сообщений.
+
+    Каждая полоса хранит очереди по чатам в порядке поступления. Фоновая
+    задача выбирает самую приоритетную полосу, в ней — первый чат, у которого
+    есть токен, и разрешает отправку его самого старого запроса. Чат затем
+    переходит в конец полосы, поэтому один "шумный" чат не задерживает остальные.
+    """
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        group_rate: float = 20 / 60,
+        chat_burst: float = 3.0,
+        max_retries: int = 3,
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global = _Bucket(global_rate, global_rate, time.monotonic())
+        self._chats: dict[int | str, _Bucket] = {}
+        # Чаты, запрос в которые сейчас выполняется
+        self._busy: set[int | str] = set()
+        self._lanes: list[OrderedDict[int | str, deque[asyncio.Future]]] = [OrderedDict() for _ in Lane]
+        self._depth = [0] * len(Lane)
+        self._paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._sent = 0
+        self._retry_after = 0
+        self._last_prune = time.monotonic()
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or not method.__api_method__.startswith(_SEND_PREFIXES):
+            return await make_request(bot, method)
+
+        lane = _current_lane.get()
+        for attempt in range(self.max_retries + 1):
+            with span("outbound.wait", lane=lane.name):
+                await self._acquire(lane, chat_id, retry=attempt > 0)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self._retry_after += 1
+                logging.warning(
+                    f"Telegram просит подождать {e.retry_after} с (чат {chat_id}), "
+                    f"попытка {attempt + 1} из {self.max_retries + 1}"
+                )
+                # Лимит мог быть превышен глобально, поэтому приостанавливаем все отправки
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                if attempt == self.max_retries:
+                    raise
+            finally:
+                self._release(chat_id)
+
+    async def _acquire(self, lane: Lane, chat_id: int | str, retry: bool = False) -> None:
+        """
+        Ставит запрос в очередь и ждет разрешения на отправку.
+        Повтор (`retry`) встает в начало очереди чата, чтобы не уступить
+        место более поздним сообщениям.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        queue = self._lanes[lane].setdefault(chat_id, deque())
+        if retry:
+            queue.appendleft(future)
+        else:
+            queue.append(future)
+        self._depth[lane] += 1
+        self._wakeup.set()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Отправку уже разрешили, но отправитель отменен: освобождаем чат
+                self._release(chat_id)
+            raise
+
+    def _release(self, chat_id: int | str) -> None:
+        """
+        Отмечает, что запрос в чат завершился, и разрешает следующий.
+        """
+        self._busy.discard(chat_id)
+        self._wakeup.set()
+
+    def _chat_bucket(self, chat_id: int | str, now: float) -> _Bucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Отрицательные ID (и @username) — группы и каналы, у них свой лимит
+            is_group = not isinstance(chat_id, int) or chat_id < 0
+            bucket = _Bucket(self.group_rate if is_group else self.chat_rate, self.chat_burst, now)
+            self._chats[chat_id] = bucket
+        bucket.refill(now)
+        return bucket
+
+    def _grant_next(self, now: float) -> float:
+        """
+        Разрешает одну отправку, если это возможно. Возвращает 0, если отправка
+        разрешена, иначе — сколько секунд ждать до следующей попытки.
+        """
+        wait = float("inf")
+        for lane, chats in enumerate(self._lanes):
+            for chat_id in list(chats):
+                queue = chats[chat_id]
+                # Запросы, чьи отправители были отменены, просто выбрасываем
+                while queue and queue[0].done():
+                    queue.popleft()
+                    self._depth[lane] -= 1
+                if not queue:
+                    del chats[chat_id]
+                    continue
+                if chat_id in self._busy:
+                    # Ждем завершения предыдущего запроса в этот чат (_release разбудит)
+                    continue
+                bucket = self._chat_bucket(chat_id, now)
+                if bucket.tokens < 1:
+                    wait = min(wait, bucket.wait_time())
+                    continue
+                bucket.tokens -= 1
+                self._global.tokens -= 1
+                self._depth[lane] -= 1
+                self._sent += 1
+                self._busy.add(chat_id)
+                queue.popleft().set_result(None)
+                if queue:
+                    chats.move_to_end(chat_id)
+                else:
+                    del chats[chat_id]
+                return 0.0
+        return wait
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                wait = self._paused_until - now
+            else:
+                self._global.refill(now)
+                wait = self._global.wait_time() or self._grant_next(now)
+                self._prune(now)
+            if wait == 0.0:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=None if wait == float("inf") else wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _prune(self, now: float) -> None:
+        """
+        Раз в минуту удаляет полностью восстановленные корзины чатов,
+        чтобы словарь не рос с каждым новым клиентом.
+        """
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        for chat_id, bucket in list(self._chats.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.burst and not any(chat_id in chats for chats in self._lanes):
+                del self._chats[chat_id]
+
+    def queue_depth(self, lane: Lane | None = None) -> int:
+        """
+        Возвращает число ожидающих отправки запросов (в полосе или всего).
+        """
+        return sum(self._depth) if lane is None else self._depth[lane]
+
+    def stats(self) -> dict[str, float]:
+        """
+        Возвращает метрики очереди: глубину по полосам, число отправок
+        и полученных RetryAfter, оставшуюся паузу.
+        """
+        stats = {f"queued_{lane.name.lower()}": self._depth[lane] for lane in Lane}
+        stats.update(
+            queued=sum(self._depth),
+            sent=self._sent,
+            retry_after=self._retry_after,
+            paused_for=max(0.0, self._paused_until - time.monotonic()),
+            chat_buckets=len(self._chats),
+        )
+        return stats
+
+    async def close(self) -> None:
+        """
+        Останавливает фоновую задачу и отменяет ожидающие запросы.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for chats in self._lanes:
+            for queue in chats.values():
+                for future in queue:
+                    future.cancel()
+            chats.clear()
+        self._depth = [0] * len(Lane)
+        self._busy.clear()
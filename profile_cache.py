@@ -0,0 +1,120 @@
+"""
+Кэш профилей пользователей.
+
+Имя и username пользователя приходят в каждом входящем обновлении
+(`message.from_user`), поэтому их не нужно отдельно запрашивать через
+`bot.get_chat`. `ProfileCache` подключается к диспетчеру как outer middleware
+(`dp.update.outer_middleware(cache)`) и запоминает отправителя каждого
+обновления. Напоминания и карточки берут профиль из кэша и обращаются
+к Bot API только при промахе.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, NamedTuple
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.types import Chat, TelegramObject, User
+
+
+class CachedProfile(NamedTuple):
+    """
+    Запись кэша: только те поля, которые нужны для текстов бота.
+    Совместима по атрибутам с `User` для `build_manager_message`.
+    """
+    id: int
+    first_name: str | None
+    username: str | None
+    expires_at: float
+
+
+class ProfileCache(BaseMiddleware):
+    """
+    Ограниченный по размеру LRU-кэш профилей с временем жизни записей.
+
+    Хранит не больше `max_size` профилей; при переполнении вытесняется
+    профиль, к которому дольше всего не обращались. Запись старше `ttl`
+    секунд считается промахом, чтобы смена имени рано или поздно попадала в кэш.
+    """
+    def __init__(self, max_size: int = 100_000, ttl: float = 24 * 60 * 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._profiles: OrderedDict[int, CachedProfile] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expired = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        # event_from_user заполняет встроенный UserContextMiddleware aiogram
+        user = data.get("event_from_user")
+        if user is not None and not user.is_bot:
+            self.put(user)
+        return await handler(event, data)
+
+    def put(self, user: User | Chat) -> CachedProfile:
+        """
+        Сохраняет (или обновляет) профиль пользователя.
+        """
+        profile = self._profiles.get(user.id)
+        expires_at = time.monotonic() + self.ttl
+        if profile is not None and profile.first_name == user.first_name and profile.username == user.username:
+            # Частый случай: профиль не менялся, продлеваем запись без создания новой строки
+            profile = profile._replace(expires_at=expires_at)
+        else:
+            profile = CachedProfile(user.id, user.first_name, user.username, expires_at)
+        self._profiles[user.id] = profile
+        self._profiles.move_to_end(user.id)
+        if len(self._profiles) > self.max_size:
+            self._profiles.popitem(last=False)
+            self._evictions += 1
+        return profile
+
+    def get(self, user_id: int) -> CachedProfile | None:
+        """
+        Возвращает профиль из кэша или None, если его нет или он устарел.
+        """
+        profile = self._profiles.get(user_id)
+        if profile is not None and profile.expires_at <= time.monotonic():
+            del self._profiles[user_id]
+            self._expired += 1
+            profile = None
+        if profile is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._profiles.move_to_end(user_id)
+        return profile
+
+    async def fetch(self, bot: Bot, user_id: int) -> CachedProfile:
+        """
+        Возвращает профиль из кэша, а при промахе запрашивает его
+        через `bot.get_chat` и сохраняет.
+        """
+        profile = self.get(user_id)
+        if profile is None:
+            profile = self.put(await bot.get_chat(user_id))
+        return profile
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def stats(self) -> dict[str, float]:
+        """
+        Возвращает размер кэша, число попаданий и промахов, долю попаданий,
+        число вытесненных и устаревших записей.
+        """
+        lookups = self._hits + self._misses
+        return {
+            "size": len(self._profiles),
+            "max_size": self.max_size,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "evictions": self._evictions,
+            "expired": self._expired,
+        }
@@ -0,0 +1,268 @@
+"""
+Планировщик напоминаний FSM.
+
+Вместо отдельной "спящей" задачи `wait_for_reply` на каждого пользователя
+все напоминания хранятся в одном хешированном колесе таймеров (timer wheel),
+которое обслуживает одна фоновая задача. Постановка и отмена напоминания
+по chat_id — O(1), а на каждое ожидающее напоминание тратится одна
+небольшая запись вместо корутины с ее фреймом.
+
+Если указан путь к базе, напоминания дополнительно сохраняются в SQLite
+строками (chat_id, expected_state, fire_at, step) и восстанавливаются
+после перезапуска через `restore()`.
+"""
+import asyncio
+import logging
+import math
+import sqlite3
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+
+ReminderCallback = Callable[..., Awaitable[None]]
+
+
+class _Reminder:
+    __slots__ = ("fire_tick", "fire_at", "expected_state", "callback")
+
+    def __init__(self, fire_tick: int, fire_at: float, expected_state: str, callback: ReminderCallback):
+        self.fire_tick = fire_tick
+        self.fire_at = fire_at
+        self.expected_state = expected_state
+        self.callback = callback
+
+
+class ReminderScheduler:
+    """
+    Колесо таймеров для напоминаний: `slots` ячеек по `tick` секунд.
+
+    Напоминание кладется в ячейку `fire_tick % slots`; фоновая задача
+    раз в `tick` секунд забирает из текущей ячейки наступившие напоминания
+    и передает их небольшому пулу обработчиков. Перед отправкой, как и в
+    `wait_for_reply`, проверяется, что пользователь все еще в ожидаемом
+    состоянии, поэтому отвечавшему пользователю напоминание не уйдет.
+
+    При заданном `path` изменения (постановка, отмена, срабатывание)
+    копятся в памяти и раз в тик записываются в SQLite одной транзакцией.
+    Шаг напоминания хранится как имя функции-обработчика, поэтому все
+    обработчики, которые могут быть восстановлены, передаются в `callbacks`.
+    Обработчик получает `reminder_scheduler=self` и все `callback_kwargs`.
+    """
+    def __init__(
+        self,
+        bot: Bot,
+        storage: BaseStorage,
+        tick: float = 1.0,
+        slots: int = 512,
+        workers: int = 16,
+        path: str | None = None,
+        callbacks: list[ReminderCallback] | None = None,
+        callback_kwargs: dict | None = None,
+    ):
+        self.bot = bot
+        self.storage = storage
+        self.tick = tick
+        self.workers = workers
+        self.path = path
+        self._callbacks = {callback.__name__: callback for callback in callbacks or []}
+        # Дополнительные зависимости обработчиков (например, profile_cache)
+        self.callback_kwargs = callback_kwargs or {}
+        # chat_id -> строка для записи в базу или None для удаления
+        self._dirty: dict[int, tuple | None] = {}
+        self._db = self._connect() if path else None
+        self._flush_lock = asyncio.Lock()
+        self._wheel: list[dict[int, _Reminder]] = [{} for _ in range(slots)]
+        self._pending: dict[int, _Reminder] = {}
+        self._current_tick = 0
+        self._started_at = 0.0
+        self._due: deque[tuple[int, _Reminder]] = deque()
+        self._due_event = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._fired = 0
+        self._cancelled = 0
+
+    def arm(self, chat_id: int, expected_state: State, delay: float, callback: ReminderCallback) -> None:
+        """
+        Ставит напоминание: через `delay` секунд вызвать `callback`, если
+        пользователь все еще в состоянии `expected_state`. Предыдущее
+        напоминание этого чата заменяется.
+        """
+        self._arm(chat_id, expected_state.state, delay, time.time() + delay, callback)
+
+    def _arm(self, chat_id: int, expected_state: str, delay: float, fire_at: float, callback: ReminderCallback) -> None:
+        self._ensure_started()
+        self.cancel(chat_id, count=False)
+        fire_tick = self._current_tick + max(1, math.ceil(delay / self.tick))
+        reminder = _Reminder(fire_tick, fire_at, expected_state, callback)
+        self._wheel[fire_tick % len(self._wheel)][chat_id] = reminder
+        self._pending[chat_id] = reminder
+        if self._db is not None:
+            self._dirty[chat_id] = (chat_id, expected_state, fire_at, callback.__name__)
+
+    def cancel(self, chat_id: int, count: bool = True) -> bool:
+        """
+        Отменяет ожидающее напоминание чата. Возвращает True, если оно было.
+        """
+        reminder = self._pending.pop(chat_id, None)
+        if reminder is None:
+            return False
+        self._wheel[reminder.fire_tick % len(self._wheel)].pop(chat_id, None)
+        if self._db is not None:
+            self._dirty[chat_id] = None
+        if count:
+            self._cancelled += 1
+        return True
+
+    # --- Хранение в SQLite ---
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS reminders ("
+            "chat_id INTEGER PRIMARY KEY, expected_state TEXT NOT NULL, "
+            "fire_at REAL NOT NULL, step TEXT NOT NULL)"
+        )
+        db.commit()
+        return db
+
+    def restore(self, overdue_rate: float = 5.0) -> int:
+        """
+        Загружает сохраненные напоминания после перезапуска.
+
+        Напоминания, чей срок еще не наступил, ставятся на свое время.
+        Просроченные за время простоя не отправляются все разом, а
+        распределяются по времени: не больше `overdue_rate` в секунду,
+        в порядке исходного срока. Возвращает число восстановленных напоминаний.
+        """
+        if self._db is None:
+            return 0
+        now = time.time()
+        overdue = 0
+        restored = 0
+        rows = self._db.execute(
+            "SELECT chat_id, expected_state, fire_at, step FROM reminders ORDER BY fire_at"
+        ).fetchall()
+        for chat_id, expected_state, fire_at, step in rows:
+            callback = self._callbacks.get(step)
+            if callback is None:
+                logging.warning(f"Неизвестный шаг напоминания {step!r} для чата {chat_id}, пропускаем")
+                self._dirty[chat_id] = None
+                continue
+            if fire_at > now:
+                delay = fire_at - now
+            else:
+                delay = overdue / overdue_rate
+                overdue += 1
+            self._arm(chat_id, expected_state, delay, fire_at, callback)
+            restored += 1
+        logging.info(f"Восстановлено напоминаний: {restored} (просроченных: {overdue})")
+        return restored
+
+    async def flush(self) -> None:
+        """
+        Записывает накопленные изменения в базу одной транзакцией.
+        """
+        async with self._flush_lock:
+            if self._db is None or not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+            try:
+                await asyncio.to_thread(self._write, dirty)
+            except Exception as e:
+                logging.error(f"Не удалось сохранить напоминания в {self.path}: {e}")
+                # Более свежие изменения, сделанные во время записи, важнее
+                self._dirty = {**dirty, **self._dirty}
+
+    def _write(self, dirty: dict[int, tuple | None]) -> None:
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO reminders (chat_id, expected_state, fire_at, step) VALUES (?, ?, ?, ?)",
+                [row for row in dirty.values() if row is not None],
+            )
+            self._db.executemany(
+                "DELETE FROM reminders WHERE chat_id = ?",
+                [(chat_id,) for chat_id, row in dirty.items() if row is None],
+            )
+
+    def _ensure_started(self) -> None:
+        if self._tasks and not self._tasks[0].done():
+            return
+        self._started_at = time.monotonic() - self._current_tick * self.tick
+        self._tasks = [asyncio.create_task(self._run())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _run(self) -> None:
+        while True:
+            # Ждем до начала следующего тика по абсолютному времени, чтобы не накапливать дрейф
+            next_at = self._started_at + (self._current_tick + 1) * self.tick
+            await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+            self._current_tick += 1
+            slot = self._wheel[self._current_tick % len(self._wheel)]
+            due = [chat_id for chat_id, r in slot.items() if r.fire_tick <= self._current_tick]
+            for chat_id in due:
+                reminder = slot.pop(chat_id)
+                del self._pending[chat_id]
+                self._due.append((chat_id, reminder))
+                if self._db is not None:
+                    self._dirty[chat_id] = None
+            if due:
+                self._due_event.set()
+            # shield: остановка планировщика не должна прерывать запись посреди транзакции
+            await asyncio.shield(self.flush())
+
+    async def _worker(self) -> None:
+        while True:
+            if not self._due:
+                self._due_event.clear()
+                await self._due_event.wait()
+                continue
+            chat_id, reminder = self._due.popleft()
+            try:
+                await self._fire(chat_id, reminder)
+            except Exception as e:
+                logging.error(f"Не удалось отправить напоминание пользователю {chat_id}: {e}")
+
+    async def _fire(self, chat_id: int, reminder: _Reminder) -> None:
+        # В личном чате chat_id совпадает с user_id
+        state = FSMContext(self.storage, StorageKey(bot_id=self.bot.id, chat_id=chat_id, user_id=chat_id))
+        if await state.get_state() == reminder.expected_state:
+            self._fired += 1
+            await reminder.callback(chat_id, state, self.bot, reminder_scheduler=self, **self.callback_kwargs)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> dict[str, int]:
+        """
+        Возвращает число ожидающих, отправленных и отмененных напоминаний.
+        """
+        return {
+            "pending": len(self._pending),
+            "due": len(self._due),
+            "fired": self._fired,
+            "cancelled": self._cancelled,
+        }
+
+    async def close(self) -> None:
+        """
+        Останавливает фоновые задачи. Без базы ожидающие напоминания
+        теряются; с базой — сохраняются и будут восстановлены при запуске.
+        """
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._db is not None:
+            await self.flush()
+            self._db.close()
+            self._db = None
@@ -0,0 +1,207 @@
+"""
+Многопроцессный режим работы бота (BOT_WORKERS > 1).
+
+Фронт-процесс принимает обновления (long polling или webhook) и раздает
+их рабочим процессам по `user_id`: все обновления одного пользователя
+всегда попадают в один и тот же процесс. Каждый рабочий процесс запускает
+обычные хендлеры из `main.py` в своем цикле событий и на своем ядре.
+
+Обновления передаются пачками через `multiprocessing.Queue` в виде
+JSON-совместимых словарей. Внутри рабочего процесса обновления разных
+пользователей обрабатываются параллельно, а одного пользователя —
+строго по очереди.
+
+Данные, которые нужны нескольким процессам (связи сообщений, активные
+клиенты менеджеров, состояния FSM), хранятся в общей базе SQLite.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from webhook_server import WebhookConfig, add_set_webhook, serve_app
+
+# Пачка для рабочего процесса: обновления и ID менеджеров, проявивших активность
+Batch = tuple[list[dict[str, Any]], set[int]]
+
+
+def update_user_id(update: dict[str, Any]) -> int | None:
+    """
+    Возвращает ID пользователя, от которого пришло обновление,
+    или None, если у обновления нет отправителя (например, poll).
+    """
+    for value in update.values():
+        if isinstance(value, dict):
+            sender = value.get("from") or value.get("user") or value.get("chat")
+            if isinstance(sender, dict) and "id" in sender:
+                return sender["id"]
+    return None
+
+
+def shard_of(user_id: int | None, workers: int) -> int:
+    """
+    Номер рабочего процесса для пользователя.
+    """
+    return 0 if user_id is None else user_id % workers
+
+
+class ShardedFront:
+    """
+    Фронт-процесс: запускает `workers` рабочих процессов и распределяет
+    между ними входящие обновления.
+
+    :param target: Точка входа рабочего процесса, `target(index, queue)`;
+        должна быть функцией верхнего уровня модуля (процессы запускаются через spawn).
+    :param manager_ids: ID менеджеров; об их активности сообщается всем процессам,
+        чтобы маршрутизатор менеджеров в каждом процессе знал, кто на месте.
+    """
+    def __init__(
+        self,
+        workers: int,
+        target: Callable[[int, Any], None],
+        manager_ids: Iterable[int] = (),
+        queue_size: int = 1000,
+    ):
+        context = multiprocessing.get_context("spawn")
+        self.workers = workers
+        self._managers = set(manager_ids)
+        self._queues = [context.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._processes = [
+            context.Process(target=target, args=(index, queue), name=f"bot-worker-{index}")
+            for index, queue in enumerate(self._queues)
+        ]
+        self._routed = [0] * workers
+
+    def start(self) -> None:
+        for index, process in enumerate(self._processes):
+            # Номер процесса передается через окружение: он нужен уже при импорте main.py
+            os.environ["BOT_WORKER_INDEX"] = str(index)
+            process.start()
+        os.environ.pop("BOT_WORKER_INDEX", None)
+        logging.info(f"Запущено рабочих процессов: {self.workers}")
+
+    async def route(self, updates: list[dict[str, Any]]) -> None:
+        """
+        Раскладывает обновления по рабочим процессам, сохраняя их порядок.
+        Если очередь процесса заполнена, ждет (обратное давление на прием).
+        """
+        batches: list[list[dict[str, Any]]] = [[] for _ in range(self.workers)]
+        touched: set[int] = set()
+        for update in updates:
+            user_id = update_user_id(update)
+            batches[shard_of(user_id, self.workers)].append(update)
+            if user_id in self._managers:
+                touched.add(user_id)
+        for index, batch in enumerate(batches):
+            if batch or touched:
+                self._routed[index] += len(batch)
+                await asyncio.to_thread(self._queues[index].put, (batch, touched))
+
+    async def run_polling(self, bot: Bot, timeout: int = 30) -> None:
+        """
+        Получает обновления через getUpdates и раздает их рабочим процессам.
+        """
+        offset = None
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=timeout)
+            except Exception as e:
+                logging.error(f"Ошибка при получении обновлений: {e}")
+                await asyncio.sleep(1)
+                continue
+            if updates:
+                offset = updates[-1].update_id + 1
+                await self.route([
+                    update.model_dump(mode="json", by_alias=True, exclude_none=True) for update in updates
+                ])
+
+    def build_webhook_app(self, bot: Bot, config: WebhookConfig) -> web.Application:
+        """
+        Создает aiohttp-приложение, которое принимает обновления от Telegram
+        и сразу передает их рабочим процессам.
+        """
+        async def handle(request: web.Request) -> web.Response:
+            if config.secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != config.secret:
+                return web.Response(status=401)
+            await self.route([await request.json()])
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_post(config.path, handle)
+        add_set_webhook(app, bot, config)
+        return app
+
+    async def run_webhook(self, bot: Bot, config: WebhookConfig) -> None:
+        await serve_app(self.build_webhook_app(bot, config), config)
+
+    def stop(self, timeout: float = 30) -> None:
+        """
+        Просит рабочие процессы завершиться после обработки очереди и ждет их.
+        """
+        for queue in self._queues:
+            queue.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                logging.warning(f"{process.name} не завершился за {timeout} с, останавливаем принудительно")
+                process.terminate()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Возвращает число обновлений, переданных каждому процессу.
+        """
+        return {f"routed_{index}": routed for index, routed in enumerate(self._routed)}
+
+
+async def _feed(dp: Dispatcher, bot: Bot, update: Update, previous: asyncio.Task | None) -> None:
+    if previous is not None:
+        # Обновления одного пользователя — строго после предыдущего
+        await asyncio.wait([previous])
+    try:
+        await dp.feed_update(bot, update)
+    except Exception as e:
+        logging.error(f"Ошибка при обработке обновления {update.update_id}: {e}")
+
+
+async def consume(
+    queue: Any,
+    dp: Dispatcher,
+    bot: Bot,
+    on_manager_active: Callable[[int], None] | None = None,
+    max_in_flight: int = 1000,
+) -> None:
+    """
+    Цикл рабочего процесса: читает пачки из очереди фронта и передает
+    обновления диспетчеру. Завершается, получив None, после обработки
+    всех принятых обновлений.
+    """
+    loop = asyncio.get_running_loop()
+    in_flight = asyncio.Semaphore(max_in_flight)
+    # user_id -> задача последнего обновления пользователя
+    tails: dict[int | None, asyncio.Task] = {}
+
+    def done(user_id: int | None, task: asyncio.Task) -> None:
+        in_flight.release()
+        if tails.get(user_id) is task:
+            del tails[user_id]
+
+    while (batch := await loop.run_in_executor(None, queue.get)) is not None:
+        updates, touched = batch
+        if on_manager_active is not None:
+            for manager_id in touched:
+                on_manager_active(manager_id)
+        for raw in updates:
+            await in_flight.acquire()
+            user_id = update_user_id(raw)
+            update = Update.model_validate(raw, context={"bot": bot})
+            task = asyncio.create_task(_feed(dp, bot, update, tails.get(user_id)))
+            tails[user_id] = task
+            task.add_done_callback(lambda task, user_id=user_id: done(user_id, task))
+    if tails:
+        await asyncio.wait(list(tails.values()))
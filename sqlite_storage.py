@@ -0,0 +1,193 @@
+"""
+Модуль постоянного хранилища состояний FSM на базе SQLite.
+
+`SQLiteStorage` работает как `MemoryStorage`: все чтения и записи идут
+в словарь в памяти ("горячий" слой). Измененные ключи помечаются как
+"грязные" и периодически сбрасываются на диск одной транзакцией
+(write-behind), поэтому обработка обновления не ждет диска.
+После перезапуска записи подгружаются из файла при первом обращении.
+Горячий слой ограничен `max_records` записями: после сброса самые давно
+загруженные записи без несохраненных изменений выгружаются из памяти.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import sqlite3
+from collections.abc import Mapping
+from typing import Any
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorageRecord
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище FSM с горячим слоем в памяти и пакетной записью в SQLite.
+
+    - Чтение: словарь в памяти; при промахе — одна точечная выборка из SQLite.
+    - Запись: изменяется только память, ключ попадает в множество "грязных".
+    - Сброс: фоновая задача раз в `flush_interval` секунд (или при накоплении
+      `max_batch` изменений) записывает все "грязные" ключи одной транзакцией
+      в отдельном потоке.
+    - Память: сверх `max_records` сохраненные записи выгружаются после сброса
+      и при следующем обращении снова читаются из SQLite.
+
+    Файл открывается в режиме WAL, поэтому после аварийного завершения
+    база остается целостной; теряются не более чем изменения за последний
+    интервал сброса.
+    """
+    def __init__(
+        self,
+        path: str = "fsm_storage.sqlite3",
+        flush_interval: float = 0.5,
+        max_batch: int = 1000,
+        max_records: int = 100_000,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_records = max_records
+        self._records: dict[StorageKey, MemoryStorageRecord] = {}
+        self._dirty: set[StorageKey] = set()
+        # Отдельные соединения для чтения (в цикле событий) и записи (в потоке)
+        self._reader = self._connect()
+        self._writer = self._connect()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._flush_task: asyncio.Task | None = None
+        self._closing = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            "key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL)"
+        )
+        conn.commit()
+        return conn
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return (
+            f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:"
+            f"{key.business_connection_id or ''}:{key.destiny}"
+        )
+
+    def _record(self, key: StorageKey) -> MemoryStorageRecord:
+        """
+        Возвращает запись из горячего слоя, при промахе подгружая ее из SQLite.
+        """
+        record = self._records.get(key)
+        if record is None:
+            row = self._reader.execute(
+                "SELECT state, data FROM fsm WHERE key = ?", (self._key(key),)
+            ).fetchone()
+            record = MemoryStorageRecord(data=json.loads(row[1]), state=row[0]) if row else MemoryStorageRecord()
+            self._records[key] = record
+        return record
+
+    def _mark_dirty(self, key: StorageKey) -> None:
+        self._dirty.add(key)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        if len(self._dirty) >= self.max_batch:
+            self._wakeup.set()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._record(key).state = state.state if isinstance(state, State) else state
+        self._mark_dirty(key)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return self._record(key).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        self._record(key).data = data.copy()
+        self._mark_dirty(key)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return self._record(key).data.copy()
+
+    async def _flush_loop(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Записывает все накопленные изменения на диск одной транзакцией.
+        """
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, set()
+            upserts, deletes, failed = [], [], set()
+            for key in dirty:
+                record = self._records.get(key)
+                if record is None or (record.state is None and not record.data):
+                    # Пустая запись (например, после state.clear()) удаляется из файла
+                    deletes.append((self._key(key),))
+                    continue
+                try:
+                    data = json.dumps(record.data, ensure_ascii=False)
+                except (TypeError, ValueError) as e:
+                    # Несериализуемое значение не должно мешать сохранению остальных ключей
+                    logging.error(f"Не удалось сериализовать данные FSM {self._key(key)}: {e}")
+                    failed.add(key)
+                    continue
+                upserts.append((self._key(key), record.state, data))
+            try:
+                await asyncio.to_thread(self._write, upserts, deletes)
+            except Exception as e:
+                logging.error(f"Не удалось сохранить состояния FSM в {self.path}: {e}")
+                # Возвращаем ключи, чтобы повторить запись при следующем сбросе
+                self._dirty |= dirty
+                return
+            self._dirty |= failed
+            self._evict()
+
+    def _evict(self) -> None:
+        """
+        Выгружает из памяти самые давно загруженные сохраненные записи сверх `max_records`.
+        """
+        excess = len(self._records) - self.max_records
+        if excess <= 0:
+            return
+        clean = (key for key in self._records if key not in self._dirty)
+        for key in list(itertools.islice(clean, excess)):
+            del self._records[key]
+
+    def _write(self, upserts: list[tuple], deletes: list[tuple]) -> None:
+        with self._writer:
+            if upserts:
+                self._writer.executemany(
+                    "INSERT INTO fsm (key, state, data) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data",
+                    upserts,
+                )
+            if deletes:
+                self._writer.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+
+    async def close(self) -> None:
+        # Не отменяем фоновую задачу, чтобы не прервать запись посреди транзакции:
+        # будим ее, дожидаемся последнего сброса и только потом закрываем файл.
+        self._closing = True
+        if self._flush_task is not None:
+            self._wakeup.set()
+            await self._flush_task
+            self._flush_task = None
+        await self.flush()
+        self._reader.close()
+        self._writer.close()
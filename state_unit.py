@@ -0,0 +1,173 @@
+"""
+Единица работы с состоянием FSM на время обработки одного обновления.
+
+За одно сообщение клиента хендлеры несколько раз обращаются к хранилищу:
+`get_data()` и `update_data()` в отправке карточки, `clear()` при вызове
+менеджера, `get_state()` при пересылке. Для `MemoryStorage` это дешево,
+а для постоянного хранилища каждое обращение — отдельный запрос.
+
+`StateUnitMiddleware` подменяет `FSMContext` на `BufferedFSMContext`:
+состояние берется из `raw_state`, который aiogram уже прочитал, данные
+читаются из хранилища один раз при первом обращении, все остальные чтения
+и записи идут в память, а после хендлера изменения записываются в
+хранилище одним сбросом (состояние и данные — только если изменились).
+
+Если хендлер меняет лишь отдельные ключи (`update_data`), при сбросе
+в хранилище записываются только они, поэтому параллельные обновления
+одного пользователя не затирают ключи друг друга.
+"""
+from collections.abc import Awaitable, Callable, Mapping
+from typing import Any
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.types import TelegramObject
+
+# Маркер "значение еще не прочитано из хранилища"
+_UNSET: Any = object()
+
+
+def _state_name(state: StateType) -> str | None:
+    return state.state if isinstance(state, State) else state
+
+
+class BufferedFSMContext(FSMContext):
+    """
+    `FSMContext`, который копит изменения в памяти до `flush()`.
+    После сброса контекст работает напрямую с хранилищем, как обычный
+    (например, если его сохранила фоновая задача).
+
+    :param state: Уже прочитанное состояние (`raw_state`); по умолчанию
+        читается из хранилища при первом обращении.
+    """
+    def __init__(self, storage: BaseStorage, key: StorageKey, state: str | None = _UNSET):
+        super().__init__(storage, key)
+        self._state = self._stored_state = state
+        self._data: dict[str, Any] | None = None
+        # Данные в том виде, в каком они лежат в хранилище (если читались)
+        self._stored_data: dict[str, Any] | None = None
+        # Измененные ключи данных; None — данные заменены целиком
+        self._updates: dict[str, Any] | None = {}
+        self._state_changed = False
+        self._flushed = False
+        self.reads = 0
+        self.writes = 0
+
+    async def _load_data(self) -> dict[str, Any]:
+        if self._data is None:
+            self._stored_data = await self.storage.get_data(self.key)
+            self._data = self._stored_data.copy()
+            self.reads += 1
+        return self._data
+
+    async def set_state(self, state: StateType = None) -> None:
+        if self._flushed:
+            return await super().set_state(state)
+        self._state = _state_name(state)
+        self._state_changed = True
+
+    async def get_state(self) -> str | None:
+        if self._flushed:
+            return await super().get_state()
+        if self._state is _UNSET:
+            self._state = self._stored_state = await self.storage.get_state(self.key)
+            self.reads += 1
+        return self._state
+
+    async def set_data(self, data: Mapping[str, Any]) -> None:
+        if self._flushed:
+            return await super().set_data(data)
+        self._data = dict(data)
+        self._updates = None
+
+    async def get_data(self) -> dict[str, Any]:
+        if self._flushed:
+            return await super().get_data()
+        return (await self._load_data()).copy()
+
+    async def get_value(self, key: str, default: Any | None = None) -> Any | None:
+        if self._flushed:
+            return await super().get_value(key, default)
+        return (await self._load_data()).get(key, default)
+
+    async def update_data(self, data: Mapping[str, Any] | None = None, **kwargs: Any) -> dict[str, Any]:
+        if self._flushed:
+            return await super().update_data(data, **kwargs)
+        changes = {**(data or {}), **kwargs}
+        current = await self._load_data()
+        current.update(changes)
+        if self._updates is not None:
+            self._updates.update(changes)
+        return current.copy()
+
+    async def clear(self) -> None:
+        if self._flushed:
+            return await super().clear()
+        self._state = None
+        self._state_changed = True
+        self._data = {}
+        self._updates = None
+
+    async def flush(self) -> None:
+        """
+        Записывает накопленные изменения в хранилище. Значения, совпадающие
+        с уже сохраненными, не записываются. Повторные вызовы ничего не делают.
+        """
+        if self._flushed:
+            return
+        self._flushed = True
+        if self._state_changed and self._state != self._stored_state:
+            await self.storage.set_state(self.key, self._state)
+            self.writes += 1
+        if self._updates is None and self._data != self._stored_data:
+            await self.storage.set_data(self.key, self._data)
+            self.writes += 1
+        elif self._updates:
+            await self.storage.update_data(self.key, self._updates)
+            self.writes += 1
+
+
+class StateUnitMiddleware(BaseMiddleware):
+    """
+    Внешний middleware обновлений: один `BufferedFSMContext` на обновление
+    и сброс изменений после обработки (в том числе при ошибке в хендлере).
+    """
+    def __init__(self):
+        self._updates = 0
+        self._reads = 0
+        self._writes = 0
+
+    def install(self, dp: Dispatcher) -> None:
+        """
+        Подключает middleware после FSM, которое создает `state` и `raw_state`.
+        Вызывать после остальных изменений порядка внешних middleware
+        (например, `Tracer.install`).
+        """
+        dp.update.outer_middleware(self)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        state = data.get("state")
+        if not isinstance(state, FSMContext):
+            return await handler(event, data)
+        unit = BufferedFSMContext(state.storage, state.key, data.get("raw_state", _UNSET))
+        data["state"] = unit
+        try:
+            return await handler(event, data)
+        finally:
+            await unit.flush()
+            self._updates += 1
+            self._reads += unit.reads
+            self._writes += unit.writes
+
+    def stats(self) -> dict[str, int]:
+        """
+        Возвращает число обработанных обновлений и обращений к хранилищу из них.
+        """
+        return {"updates": self._updates, "storage_reads": self._reads, "storage_writes": self._writes}
@@ -0,0 +1,168 @@
+import sys
+import os
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Добавляем путь к корневой папке проекта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram.exceptions import TelegramBadRequest
+
+from card_index import CardIndex
+from fsm_handlers import process_houses
+
+
+def make_user(user_id: int = 12345):
+    user = MagicMock()
+    user.id = user_id
+    user.full_name = "Иван"
+    user.username = "ivan"
+    return user
+
+
+def make_message(user):
+    message = MagicMock()
+    message.from_user = user
+    message.answer = AsyncMock()
+    return message
+
+
+def make_bot(message_id: int = 54321):
+    bot = AsyncMock()
+    sent_message = MagicMock()
+    sent_message.message_id = message_id
+    bot.send_message.return_value = sent_message
+    return bot
+
+
+async def visit(bot, card_index, message_map, user, manager_chat_id=98765):
+    """
+    Один проход клиента до вызова менеджера с чистым состоянием FSM.
+    """
+    state = AsyncMock()
+    state.get_data.return_value = {}
+    notification_service = MagicMock()
+    notification_service.manager_chat_id = manager_chat_id
+    await process_houses(
+        make_message(user), state, MagicMock(), notification_service, message_map, bot,
+        card_index=card_index,
+    )
+    return state
+
+
+def test_card_index_expires_old_cards():
+    """
+    Карточки старше `ttl` не возвращаются и удаляются из индекса.
+    """
+    index = CardIndex(ttl=10)
+    with patch("card_index.time.time", return_value=1000.0):
+        index.put(1, 100, 11)
+    with patch("card_index.time.time", return_value=1005.0):
+        index.put(2, 100, 12)
+        assert index.get(1).message_id == 11
+    with patch("card_index.time.time", return_value=1011.0):
+        assert index.get(1) is None
+        assert index.get(2).message_id == 12
+        assert len(index) == 1
+
+
+def test_card_index_reserve_blocks_concurrent_send():
+    """
+    Пока карточка отправляется, второй резерв не выдается;
+    после неудачной отправки резерв снимается.
+    """
+    index = CardIndex()
+    assert index.reserve(1, 100)
+    assert not index.reserve(1, 100)
+    index.release(1)
+    assert index.get(1) is None
+    assert index.reserve(1, 100)
+    index.put(1, 100, 11)
+    # Отправленная карточка не мешает отправить новую (например, другому менеджеру)
+    index.release(1)
+    assert index.get(1).message_id == 11
+
+
+def test_card_index_persists_cards(tmp_path):
+    """
+    Карточки и число обращений восстанавливаются из SQLite после перезапуска.
+    """
+    path = str(tmp_path / "cards.sqlite3")
+    index = CardIndex(path=path)
+    index.put(1, 100, 11)
+    index.visit(1)
+    index.close()
+
+    restored = CardIndex(path=path)
+    entry = restored.get(1)
+    assert (entry.chat_id, entry.message_id, entry.visits) == (100, 11, 2)
+    restored.close()
+
+
+@pytest.mark.asyncio
+async def test_repeat_visitor_updates_existing_card():
+    """
+    Повторное прохождение сценария (состояние FSM очищено) не отправляет
+    новую карточку, а обновляет уже отправленную.
+    """
+    card_index = CardIndex()
+    message_map = MagicMock()
+    bot = make_bot()
+    user = make_user()
+
+    await visit(bot, card_index, message_map, user)
+    state = await visit(bot, card_index, message_map, user)
+
+    bot.send_message.assert_awaited_once()
+    bot.edit_message_text.assert_awaited_once()
+    kwargs = bot.edit_message_text.await_args.kwargs
+    assert (kwargs["chat_id"], kwargs["message_id"]) == (98765, 54321)
+    assert "Повторное обращение (2)" in kwargs["text"]
+    state.update_data.assert_awaited_once_with(card_sent=True)
+    assert card_index.stats() == {"cards": 1, "deduplicated": 1}
+
+
+@pytest.mark.asyncio
+async def test_deleted_card_is_sent_again():
+    """
+    Если старую карточку изменить нельзя, отправляется новая.
+    """
+    card_index = CardIndex()
+    message_map = MagicMock()
+    bot = make_bot()
+    bot.edit_message_text.side_effect = TelegramBadRequest(MagicMock(), "message to edit not found")
+    user = make_user()
+
+    await visit(bot, card_index, message_map, user)
+    await visit(bot, card_index, message_map, user)
+
+    assert bot.send_message.await_count == 2
+    assert card_index.get(user.id).visits == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_updates_send_one_card():
+    """
+    Два одновременных обновления одного клиента отправляют одну карточку.
+    """
+    card_index = CardIndex()
+    message_map = MagicMock()
+    bot = make_bot()
+    sent = asyncio.Event()
+
+    async def slow_send(*args, **kwargs):
+        await sent.wait()
+        return bot.send_message.return_value
+
+    bot.send_message.side_effect = slow_send
+    user = make_user()
+
+    first = asyncio.create_task(visit(bot, card_index, message_map, user))
+    second = asyncio.create_task(visit(bot, card_index, message_map, user))
+    await asyncio.sleep(0)
+    sent.set()
+    await asyncio.gather(first, second)
+
+    bot.send_message.assert_awaited_once()
+    message_map.add.assert_called_once_with(54321, user.id)
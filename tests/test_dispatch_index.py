@@ -0,0 +1,94 @@
+import sys
+import os
+import pytest
+from datetime import datetime
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram import Dispatcher
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Chat, Message, Update, User
+from dispatch_index import DispatchIndex
+from states import Form
+
+CLIENT_ID = 12345
+MANAGER_ID = 98765
+
+
+def make_update(user_id, text):
+    user = User(id=user_id, is_bot=False, first_name="Test")
+    message = Message(
+        message_id=1, date=datetime.now(), chat=Chat(id=user_id, type="private"), from_user=user, text=text
+    )
+    return Update(update_id=1, message=message)
+
+
+async def make_dispatcher():
+    calls = []
+
+    def record(name):
+        async def handler(message: Message):
+            calls.append(name)
+        return handler
+
+    index = DispatchIndex(lambda user_id: user_id == MANAGER_ID)
+    index.add(record("welcome"), text="/start")
+    index.add(record("process_start"), text="Начать", state=Form.waiting_for_start)
+    index.add(record("houses"), state=Form.waiting_for_houses)
+    index.add(record("manager_command"), text="/manager")
+    index.add(record("manager_to_user"), manager=True)
+    index.add(record("user_to_manager"), manager=False, state=None)
+
+    storage = MemoryStorage()
+    dp = Dispatcher(storage=storage)
+    dp.message()(index.dispatch)
+    return dp, storage, calls
+
+
+async def set_state(storage, user_id, state):
+    await storage.set_state(StorageKey(bot_id=1, chat_id=user_id, user_id=user_id), state)
+
+
+@pytest.mark.asyncio
+async def test_index_routes_like_filter_chain():
+    """
+    Проверяет, что индекс выбирает те же обработчики, что и прежняя
+    цепочка фильтров: команды, кнопки, состояния FSM и роли.
+    """
+    dp, storage, calls = await make_dispatcher()
+    bot = MagicMock(id=1)
+
+    await dp.feed_update(bot, make_update(CLIENT_ID, "/start"))
+    await dp.feed_update(bot, make_update(CLIENT_ID, "Привет"))
+    await dp.feed_update(bot, make_update(MANAGER_ID, "Ответ клиенту"))
+    await dp.feed_update(bot, make_update(MANAGER_ID, "/manager"))
+    await set_state(storage, CLIENT_ID, Form.waiting_for_start)
+    await dp.feed_update(bot, make_update(CLIENT_ID, "Начать"))
+    await dp.feed_update(bot, make_update(CLIENT_ID, "Что-то другое"))
+    await set_state(storage, CLIENT_ID, Form.waiting_for_houses)
+    await dp.feed_update(bot, make_update(CLIENT_ID, "Да"))
+    # Состояния FSM проверяются раньше команды /manager, как и раньше
+    await dp.feed_update(bot, make_update(CLIENT_ID, "/manager"))
+
+    assert calls == [
+        "welcome", "user_to_manager", "manager_to_user", "manager_command",
+        "process_start", "houses", "houses",
+    ]
+
+
+def test_index_caches_routes_and_normalizes_commands():
+    """
+    Проверяет, что команда с параметром или упоминанием бота находит
+    тот же маршрут, а маршрут для ключа вычисляется один раз.
+    """
+    index = DispatchIndex(lambda user_id: False)
+    welcome = MagicMock()
+    index.add(welcome, text="/start")
+
+    route = index.resolve(False, None, "/start promo")
+    assert route is not None and route.callback is welcome
+    assert index.resolve(False, None, "/start@my_bot") is route
+    assert index.resolve(False, None, "обычный текст") is None
+    assert len(index._routes) == 2
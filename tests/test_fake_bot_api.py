@@ -0,0 +1,80 @@
+import sys
+import os
+import pytest
+from contextlib import asynccontextmanager
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram.exceptions import TelegramRetryAfter, TelegramServerError
+from aiogram.types import BufferedInputFile
+
+from fake_bot_api import FakeBotAPI
+
+
+@asynccontextmanager
+async def running_api():
+    api = FakeBotAPI(seed=1)
+    await api.start()
+    bot = api.bot("42:TEST")
+    try:
+        yield api, bot
+    finally:
+        await bot.session.close()
+        await api.stop()
+
+
+@pytest.mark.asyncio
+async def test_real_bot_talks_to_fake_api():
+    """
+    Проверяет, что настоящий Bot отправляет запросы фейковому серверу
+    и получает ответы в формате Bot API.
+    """
+    async with running_api() as (api, bot):
+        sent = await bot.send_message(123, "Привет")
+        photo = await bot.send_photo(123, BufferedInputFile(b"img", "house.jpg"), caption="Дом")
+        copied = await bot.copy_message(456, from_chat_id=123, message_id=sent.message_id)
+        chat = await bot.get_chat(123)
+        assert await bot.set_webhook("https://example.com/webhook")
+
+        assert sent.chat.id == 123 and sent.text == "Привет"
+        assert photo.photo[0].file_id.startswith("fake-photo-") and photo.caption == "Дом"
+        assert copied.message_id > photo.message_id
+        assert chat.id == 123
+        assert api.webhook_url == "https://example.com/webhook"
+        assert api.calls["sendMessage"] == 1 and api.calls["getChat"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_updates_returns_pushed_updates():
+    """
+    Проверяет, что getUpdates отдает добавленные обновления и учитывает offset.
+    """
+    async with running_api() as (api, bot):
+        first = api.push_update({"message": {
+            "message_id": 1, "date": 0, "chat": {"id": 7, "type": "private"},
+            "from": {"id": 7, "is_bot": False, "first_name": "Client"}, "text": "/start",
+        }})
+
+        updates = await bot.get_updates(timeout=1)
+        assert [update.update_id for update in updates] == [first]
+        assert updates[0].message.text == "/start"
+        assert await bot.get_updates(offset=first + 1) == []
+
+
+@pytest.mark.asyncio
+async def test_injected_errors():
+    """
+    Проверяет, что сервер отвечает 429 и 500 с заданной вероятностью.
+    """
+    async with running_api() as (api, bot):
+        api.flood_rate = 1.0
+        with pytest.raises(TelegramRetryAfter) as error:
+            await bot.send_message(123, "Привет")
+        assert error.value.retry_after == api.retry_after
+        # getChat не подпадает под лимиты отправки
+        assert (await bot.get_chat(123)).id == 123
+
+        api.flood_rate, api.error_rate = 0.0, 1.0
+        with pytest.raises(TelegramServerError):
+            await bot.send_message(123, "Привет")
+        assert api.errors == {429: 1, 500: 1}
@@ -0,0 +1,124 @@
+import sys
+import os
+import asyncio
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram.types import Chat, Message, User
+
+from flood_control import WARNING_TEXT, FloodControl
+from main import user_to_manager
+
+MANAGER_ID = 1
+
+
+def make_message(user_id: int, message_id: int, text: str = "привет") -> Message:
+    return Message(
+        message_id=message_id, date=datetime.now(), chat=Chat(id=user_id, type="private"),
+        from_user=User(id=user_id, is_bot=False, first_name="Test"), text=text,
+    )
+
+
+def make_flood_control(**kwargs) -> FloodControl:
+    return FloodControl(lambda user_id: user_id == MANAGER_ID, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_burst_passes_then_excess_is_dropped():
+    """
+    Клиент отправляет `burst` сообщений подряд, остальные отбрасываются,
+    а сообщения менеджера не ограничиваются.
+    """
+    flood = make_flood_control(rate=1, burst=3, action="drop")
+    handler = AsyncMock()
+    with patch("flood_control.time.monotonic", return_value=100.0):
+        for message_id in range(5):
+            await flood(handler, make_message(123, message_id), {})
+        for message_id in range(5):
+            await flood(handler, make_message(MANAGER_ID, message_id), {})
+    assert handler.await_count == 3 + 5
+    assert flood.stats() == {"passed": 3, "throttled": 2, "clients": 1, "overflow": 0}
+
+    # Через секунду появляется новый токен
+    with patch("flood_control.time.monotonic", return_value=101.0):
+        await flood(handler, make_message(123, 10), {})
+    assert handler.await_count == 9
+
+
+@pytest.mark.asyncio
+async def test_warning_is_sent_once_per_series():
+    """
+    В режиме warn клиент получает предупреждение один раз за серию.
+    """
+    flood = make_flood_control(rate=1, burst=1, action="warn")
+    handler = AsyncMock()
+    with patch("flood_control.time.monotonic", return_value=100.0), \
+            patch.object(Message, "answer", new_callable=AsyncMock) as answer:
+        for message_id in range(4):
+            await flood(handler, make_message(123, message_id), {})
+    handler.assert_awaited_once()
+    answer.assert_awaited_once_with(WARNING_TEXT)
+
+
+@pytest.mark.asyncio
+async def test_idle_clients_expire_from_time_wheel():
+    """
+    Запись клиента удаляется, как только его bucket снова полон,
+    поэтому память не растет с числом разных клиентов.
+    """
+    flood = make_flood_control(rate=1, burst=2, action="drop")
+    handler = AsyncMock()
+    with patch("flood_control.time.monotonic", return_value=100.0):
+        for user_id in range(1000, 2000):
+            await flood(handler, make_message(user_id, 1), {})
+    assert len(flood) == 1000
+    with patch("flood_control.time.monotonic", return_value=103.0):
+        await flood(handler, make_message(5000, 1), {})
+    assert len(flood) == 1
+
+
+@pytest.mark.asyncio
+async def test_max_users_bounds_memory():
+    """
+    Сверх `max_users` новые клиенты не отслеживаются и не ограничиваются.
+    """
+    flood = make_flood_control(rate=1, burst=1, action="drop", max_users=10)
+    handler = AsyncMock()
+    with patch("flood_control.time.monotonic", return_value=100.0):
+        for user_id in range(100, 120):
+            await flood(handler, make_message(user_id, 1), {})
+    assert len(flood) == 10
+    assert handler.await_count == 20
+    assert flood.stats()["overflow"] == 10
+
+
+@pytest.mark.asyncio
+async def test_coalesced_messages_reach_manager_as_one():
+    """
+    В режиме coalesce сообщения сверх лимита придерживаются и уходят
+    менеджеру одним сообщением.
+    """
+    flood = make_flood_control(rate=20, burst=1, action="coalesce")
+    bot = MagicMock()
+    bot.send_message = AsyncMock(return_value=MagicMock(message_id=600))
+    bot.copy_message = AsyncMock(return_value=MagicMock(message_id=601))
+    message_map = MagicMock()
+
+    async def handler(message, data):
+        await user_to_manager(
+            message, AsyncMock(), bot, MagicMock(manager_chat_id=999), MagicMock(), message_map,
+            skip_state_check=True, coalesced=data.get("coalesced"),
+        )
+
+    await flood(handler, make_message(123, 1, "раз"), {})
+    await asyncio.gather(*(
+        flood(handler, make_message(123, message_id, text), {})
+        for message_id, text in ((2, "два"), (3, "три"), (4, "четыре"))
+    ))
+
+    assert bot.send_message.await_count == 2
+    assert bot.send_message.await_args.args == (999, "Сообщение от Test (123):\nдва\nтри\nчетыре")
+    assert flood.stats()["throttled"] == 3
@@ -0,0 +1,215 @@
+import sys
+import os
+import asyncio
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram.types import Chat, Message, MessageEntity, PhotoSize, Sticker, User
+from forwarding import MESSAGE_LIMIT, AlbumBuffer, BurstBuffer, relay_album, relay_burst, relay_message
+from main import manager_to_user, user_to_manager
+from message_map import MessageMap
+
+USER = User(id=123, is_bot=False, first_name="Test")
+CHAT = Chat(id=123, type="private")
+
+
+def make_message(**content):
+    return Message(message_id=10, date=datetime.now(), chat=CHAT, from_user=USER, **content)
+
+
+def make_bot():
+    bot = MagicMock()
+    bot.send_message = AsyncMock(return_value=MagicMock(message_id=600))
+    bot.copy_message = AsyncMock(return_value=MagicMock(message_id=601))
+    return bot
+
+
+@pytest.mark.asyncio
+async def test_user_photo_is_copied_with_header_and_mapped():
+    """
+    Проверяет, что фото клиента копируется менеджеру через copy_message
+    с подписью-заголовком, а ID копии сохраняется в MessageMap.
+    """
+    photo = [PhotoSize(file_id="p", file_unique_id="u", width=1, height=1)]
+    message = make_message(photo=photo, caption="Мой дом", caption_entities=[
+        MessageEntity(type="bold", offset=0, length=3),
+    ])
+    state = AsyncMock()
+    state.get_state.return_value = None
+    bot = make_bot()
+    message_map = MagicMock()
+
+    await user_to_manager(message, state, bot, MagicMock(manager_chat_id=999), MagicMock(), message_map)
+
+    bot.send_message.assert_not_awaited()
+    args, kwargs = bot.copy_message.await_args
+    assert args == (999, 123, 10)
+    assert kwargs["caption"] == "Сообщение от Test (123):\nМой дом"
+    assert kwargs["caption_entities"][0].offset == len("Сообщение от Test (123):\n")
+    message_map.add.assert_called_once_with(601, 123)
+
+
+@pytest.mark.asyncio
+async def test_sticker_gets_separate_header():
+    """
+    Проверяет, что вложение без подписи (стикер) уходит копией
+    в ответ на отдельное сообщение-заголовок, и оба ID возвращаются.
+    """
+    sticker = Sticker(
+        file_id="s", file_unique_id="u", type="regular",
+        width=1, height=1, is_animated=False, is_video=False,
+    )
+    bot = make_bot()
+
+    assert await relay_message(bot, 999, make_message(sticker=sticker), "Сообщение от Test (123):\n") == [600, 601]
+    bot.send_message.assert_awaited_once_with(999, "Сообщение от Test (123):")
+    assert bot.copy_message.await_args.kwargs["reply_parameters"].message_id == 600
+
+
+@pytest.mark.asyncio
+async def test_manager_voice_is_copied_to_user():
+    """
+    Проверяет, что голосовое сообщение менеджера копируется клиенту.
+    """
+    voice = {"file_id": "v", "file_unique_id": "u", "duration": 3}
+    message = make_message(voice=voice, reply_to_message=make_message(text="Карточка"))
+    message_map = MagicMock()
+    message_map.get_user.return_value = 555
+    bot = make_bot()
+
+    await manager_to_user(message, bot, message_map, MagicMock())
+
+    args, kwargs = bot.copy_message.await_args
+    assert args == (555, 123, 10)
+    assert kwargs["caption"] == "Менеджер:"
+
+
+@pytest.mark.asyncio
+async def test_album_is_forwarded_in_one_request():
+    """
+    Проверяет, что элементы альбома, пришедшие отдельными обновлениями,
+    пересылаются одним send_media_group, а все ID связываются с клиентом.
+    """
+    def album_item(message_id, caption=None):
+        photo = [PhotoSize(file_id=f"p{message_id}", file_unique_id="u", width=1, height=1)]
+        return Message(
+            message_id=message_id, date=datetime.now(), chat=CHAT, from_user=USER,
+            media_group_id="album", photo=photo, caption=caption,
+        )
+
+    state = AsyncMock()
+    state.get_state.return_value = None
+    bot = make_bot()
+    bot.send_media_group = AsyncMock(return_value=[MagicMock(message_id=700 + i) for i in range(3)])
+    user_session = MagicMock()
+    message_map = MagicMock()
+    buffer = AlbumBuffer(window=0.05)
+
+    await asyncio.gather(*(
+        user_to_manager(item, state, bot, MagicMock(manager_chat_id=999), user_session, message_map, buffer)
+        for item in (album_item(11, "Дом"), album_item(13), album_item(12))
+    ))
+
+    bot.send_media_group.assert_awaited_once()
+    args, _ = bot.send_media_group.await_args
+    assert args[0] == 999
+    assert [media.media for media in args[1]] == ["p11", "p12", "p13"]
+    assert args[1][0].caption == "Сообщение от Test (123):\nДом"
+    bot.copy_message.assert_not_awaited()
+    user_session.set_active_user.assert_called_once_with(123)
+    assert [call.args for call in message_map.add.call_args_list] == [(700, 123), (701, 123), (702, 123)]
+    assert len(buffer) == 0
+
+
+@pytest.mark.asyncio
+async def test_single_album_item_is_copied_without_media_group():
+    """
+    Проверяет, что альбом из одного элемента (остальные пришли позже окна)
+    пересылается через copy_message, а не send_media_group.
+    """
+    photo = [PhotoSize(file_id="p", file_unique_id="u", width=1, height=1)]
+    bot = make_bot()
+    bot.send_media_group = AsyncMock()
+    item = make_message(photo=photo, media_group_id="album", caption="Дом")
+
+    assert await relay_album(bot, 999, [item], "Сообщение от Test (123):\n") == [601]
+    bot.send_media_group.assert_not_awaited()
+    assert bot.copy_message.await_args.kwargs["caption"] == "Сообщение от Test (123):\nДом"
+
+
+@pytest.mark.asyncio
+async def test_burst_is_forwarded_as_one_message_and_reply_routes_back():
+    """
+    Проверяет, что серия сообщений клиента уходит менеджеру одним
+    сообщением, исходные сообщения можно найти по пересланному,
+    а ответ менеджера на него доходит клиенту.
+    """
+    def text_item(message_id, text):
+        return Message(message_id=message_id, date=datetime.now(), chat=CHAT, from_user=USER, text=text)
+
+    state = AsyncMock()
+    bot = make_bot()
+    user_session = MagicMock()
+    message_map = MessageMap()
+    buffer = BurstBuffer(window=0.05)
+
+    await asyncio.gather(*(
+        user_to_manager(
+            item, state, bot, MagicMock(manager_chat_id=999), user_session, message_map,
+            skip_state_check=True, burst_buffer=buffer,
+        )
+        for item in (text_item(21, "Здравствуйте"), text_item(23, "сколько стоит?"), text_item(22, "хочу дом"))
+    ))
+
+    bot.send_message.assert_awaited_once_with(999, "Сообщение от Test (123):\nЗдравствуйте\nхочу дом\nсколько стоит?")
+    user_session.set_active_user.assert_called_once_with(123)
+    assert buffer.originals(600) == (21, 22, 23)
+    assert len(buffer) == 0
+
+    reply = Message(
+        message_id=50, date=datetime.now(), chat=Chat(id=999, type="private"),
+        from_user=User(id=999, is_bot=False, first_name="Manager"), text="Добрый день",
+        reply_to_message=Message(message_id=600, date=datetime.now(), chat=Chat(id=999, type="private")),
+    )
+    await manager_to_user(reply, bot, message_map, user_session)
+    bot.send_message.assert_awaited_with(123, "Менеджер: Добрый день")
+
+
+@pytest.mark.asyncio
+async def test_relay_burst_keeps_order_and_splits_long_text():
+    """
+    Проверяет, что вложение внутри серии разделяет тексты и сохраняет
+    порядок, а слишком длинная серия делится на несколько сообщений.
+    """
+    bot = make_bot()
+    bot.send_message = AsyncMock(side_effect=[MagicMock(message_id=700 + i) for i in range(3)])
+    photo = [PhotoSize(file_id="p", file_unique_id="u", width=1, height=1)]
+    burst = [
+        Message(message_id=1, date=datetime.now(), chat=CHAT, from_user=USER, text="раз"),
+        Message(message_id=2, date=datetime.now(), chat=CHAT, from_user=USER, text="два"),
+        Message(message_id=3, date=datetime.now(), chat=CHAT, from_user=USER, photo=photo),
+        Message(message_id=4, date=datetime.now(), chat=CHAT, from_user=USER, text="а" * (MESSAGE_LIMIT - 10)),
+        Message(message_id=5, date=datetime.now(), chat=CHAT, from_user=USER, text="б" * 20),
+    ]
+
+    relayed = await relay_burst(bot, 999, burst, "Клиент:\n")
+
+    assert relayed == [(700, [1, 2]), (601, [3]), (701, [4]), (702, [5])]
+    assert bot.send_message.await_args_list[0].args == (999, "Клиент:\nраз\nдва")
+    assert bot.copy_message.await_args.kwargs["caption"] == "Клиент:"
+
+
+def test_burst_window_grows_with_outbound_queue():
+    """
+    Проверяет, что окно серии растет с очередью исходящих, но не выше максимума.
+    """
+    depth = 0
+    buffer = BurstBuffer(window=1.0, max_window=3.0, queue_depth=lambda: depth, depth_scale=30)
+    assert buffer.current_window() == 1.0
+    depth = 30
+    assert buffer.current_window() == 2.0
+    depth = 300
+    assert buffer.current_window() == 3.0
@@ -0,0 +1,149 @@
+import sys
+import os
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import manager_to_user, user_to_manager
+from manager_router import ManagerRouter
+from message_map import MessageMap, PersistentMessageMap
+from user_session import UserSession
+
+MANAGER_A = 1001
+MANAGER_B = 1002
+
+
+def test_clients_are_balanced_and_sticky():
+    """
+    Проверяет, что новые клиенты распределяются по наименее
+    загруженным менеджерам, а повторные сообщения идут тому же менеджеру.
+    """
+    router = ManagerRouter([MANAGER_A, MANAGER_B])
+
+    assert [router.assign(user_id) for user_id in (1, 2, 3, 4)] == [MANAGER_A, MANAGER_B, MANAGER_A, MANAGER_B]
+    assert router.assign(1) == MANAGER_A
+    assert router.stats()["load_1001"] == 2 and router.stats()["load_1002"] == 2
+
+
+def test_idle_manager_clients_are_reassigned():
+    """
+    Проверяет, что клиенты неактивного менеджера при следующем
+    сообщении переходят к активному, а новые клиенты ему не достаются.
+    """
+    router = ManagerRouter([MANAGER_A, MANAGER_B], idle_timeout=60)
+    router.assign(1)  # -> A
+    router._last_seen[MANAGER_A] = time.monotonic() - 120
+
+    assert router.assign(1) == MANAGER_B
+    assert router.assign(2) == MANAGER_B
+    assert router.stats()["reassigned"] == 1
+    assert router.stats()["online"] == 1
+
+    router.touch(MANAGER_A)
+    assert router.assign(3) == MANAGER_A
+
+
+def test_clients_stay_put_when_no_manager_is_online():
+    """
+    Проверяет, что при всех ушедших менеджерах клиент не переходит
+    от одного ушедшего менеджера к другому.
+    """
+    router = ManagerRouter([MANAGER_A, MANAGER_B], idle_timeout=60)
+    router.assign(1)  # -> A
+    router.assign(2)  # -> B
+    router.assign(3)  # -> A
+    for manager_id in (MANAGER_A, MANAGER_B):
+        router._last_seen[manager_id] = time.monotonic() - 120
+
+    assert [router.assign(user_id) for user_id in (1, 2, 3)] == [MANAGER_A, MANAGER_B, MANAGER_A]
+    assert router.assign(4) == MANAGER_B
+    assert router.stats()["reassigned"] == 0
+
+    router.touch(MANAGER_B)
+    assert router.assign(1) == MANAGER_B
+    assert router.stats()["reassigned"] == 1
+
+
+def test_sessions_are_per_manager():
+    """
+    Проверяет, что у каждого менеджера свой последний активный клиент.
+    """
+    router = ManagerRouter([MANAGER_A, MANAGER_B])
+    session = UserSession(router)
+    session.set_active_user(1)  # -> A
+    session.set_active_user(2)  # -> B
+
+    assert session.get_active_user(MANAGER_A) == 1
+    assert session.get_active_user(MANAGER_B) == 2
+    assert session.get_active_user() == 2
+
+
+@pytest.mark.asyncio
+async def test_replies_are_routed_by_manager_chat():
+    """
+    Проверяет, что одинаковые ID сообщений в чатах разных менеджеров
+    не путаются: каждый менеджер отвечает своему клиенту.
+    """
+    router = ManagerRouter([MANAGER_A, MANAGER_B])
+    session = UserSession(router)
+    message_map = MessageMap()
+    bot = MagicMock()
+    # В обоих чатах менеджеров пересланное сообщение получит ID 500
+    bot.send_message = AsyncMock(return_value=MagicMock(message_id=500))
+    state = AsyncMock()
+    state.get_state.return_value = None
+
+    for user_id in (1, 2):
+        message = MagicMock(text="Здравствуйте", media_group_id=None)
+        message.from_user = MagicMock(id=user_id, first_name="Клиент")
+        await user_to_manager(message, state, bot, MagicMock(), session, message_map, None, router)
+    assert [call.args[0] for call in bot.send_message.await_args_list] == [MANAGER_A, MANAGER_B]
+
+    bot.send_message.reset_mock()
+    reply = MagicMock(text="Ответ")
+    reply.chat.id = MANAGER_B
+    reply.reply_to_message = MagicMock(message_id=500)
+    await manager_to_user(reply, bot, message_map, session, router)
+
+    bot.send_message.assert_awaited_once_with(2, "Менеджер: Ответ")
+
+
+def test_message_keys_survive_manager_list_change(tmp_path):
+    """
+    Проверяет, что после изменения MANAGER_IDS старые связи сообщений
+    ведут к тем же клиентам: номера менеджеров берутся из файла.
+    """
+    map_path = str(tmp_path / "message_map.bin")
+    slots_path = map_path + ".managers.json"
+    router = ManagerRouter([MANAGER_A, MANAGER_B], slots_path=slots_path)
+    message_map = PersistentMessageMap(map_path)
+    message_map.add(router.message_key(MANAGER_A, 500), 1)
+    message_map.add(router.message_key(MANAGER_B, 500), 2)
+    message_map.close()
+
+    # Новый менеджер с меньшим ID не сдвигает номера старых
+    router = ManagerRouter([900, MANAGER_A, MANAGER_B], slots_path=slots_path)
+    message_map = PersistentMessageMap(map_path)
+    assert message_map.get_user(router.message_key(MANAGER_A, 500)) == 1
+    assert message_map.get_user(router.message_key(MANAGER_B, 500)) == 2
+    assert message_map.get_user(router.message_key(900, 500)) is None
+    message_map.close()
+
+    # Номер удаленного менеджера не достается следующему новому
+    router = ManagerRouter([MANAGER_B, 800], slots_path=slots_path)
+    message_map = PersistentMessageMap(map_path)
+    assert message_map.get_user(router.message_key(MANAGER_B, 500)) == 2
+    assert message_map.get_user(router.message_key(800, 500)) is None
+    message_map.close()
+
+
+def test_message_key_rejects_unknown_manager():
+    """
+    Проверяет, что ключ для чата, не принадлежащего менеджеру, не строится:
+    иначе он совпал бы с ключом первого менеджера.
+    """
+    router = ManagerRouter([MANAGER_A])
+    with pytest.raises(ValueError):
+        router.message_key(MANAGER_B, 500)
@@ -0,0 +1,107 @@
+import sys
+import os
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendPhoto
+from fsm_handlers import HOUSE_PHOTO_URL, send_third_reminder
+from media_registry import MediaRegistry
+
+CHAT_ID = 12345
+
+
+def make_bot(file_id="file-1"):
+    bot = MagicMock()
+    bot.send_photo = AsyncMock(return_value=MagicMock(message_id=1, photo=[MagicMock(file_id=file_id)]))
+    bot.delete_message = AsyncMock()
+    return bot
+
+
+@pytest.mark.asyncio
+async def test_photo_is_uploaded_once_and_then_sent_by_file_id(tmp_path):
+    """
+    Проверяет, что файл загружается только при первой отправке,
+    а file_id сохраняется и используется после перезапуска.
+    """
+    photo = tmp_path / "house.jpg"
+    photo.write_bytes(b"jpeg")
+    cache_path = str(tmp_path / "media.json")
+    bot = make_bot()
+
+    registry = MediaRegistry(bot, path=cache_path)
+    await registry.send_photo(CHAT_ID, str(photo), caption="1")
+    await registry.send_photo(CHAT_ID, str(photo), caption="2")
+    assert bot.send_photo.await_args.kwargs["photo"] == "file-1"
+    assert registry.stats() == {"cached": 1, "hits": 1, "uploads": 1, "invalidated": 0}
+
+    restored = MediaRegistry(bot, path=cache_path)
+    assert await restored.warm([str(photo)]) == 1
+    await restored.send_photo(CHAT_ID, str(photo))
+    assert bot.send_photo.await_args.kwargs["photo"] == "file-1"
+    assert restored.stats()["uploads"] == 0
+
+
+@pytest.mark.asyncio
+async def test_changed_source_is_invalidated_and_warmed(tmp_path):
+    """
+    Проверяет, что при изменении файла file_id сбрасывается,
+    а при заданном служебном чате файл загружается заново при запуске.
+    """
+    photo = tmp_path / "house.jpg"
+    photo.write_bytes(b"old")
+    cache_path = str(tmp_path / "media.json")
+    await MediaRegistry(make_bot("old-id"), path=cache_path).send_photo(CHAT_ID, str(photo))
+
+    photo.write_bytes(b"new")
+    bot = make_bot("new-id")
+    registry = MediaRegistry(bot, path=cache_path, warmup_chat_id=-100)
+    assert await registry.warm([str(photo)]) == 1
+
+    assert registry.get_file_id(str(photo)) == "new-id"
+    assert registry.stats()["invalidated"] == 1
+    bot.delete_message.assert_awaited_once_with(-100, 1)
+
+
+@pytest.mark.asyncio
+async def test_third_reminder_reuploads_when_file_id_rejected():
+    """
+    Проверяет, что если Telegram отклонил сохраненный file_id,
+    напоминание все равно уходит — по исходному URL.
+    """
+    bot = make_bot("fresh-id")
+    registry = MediaRegistry(bot)
+    registry._entries[HOUSE_PHOTO_URL] = {"file_id": "stale-id", "fingerprint": None}
+    registry._fingerprint = AsyncMock(return_value=None)
+    bot.send_photo.side_effect = [
+        TelegramBadRequest(method=SendPhoto(chat_id=CHAT_ID, photo="stale-id"), message="wrong file identifier"),
+        bot.send_photo.return_value,
+    ]
+
+    await send_third_reminder(CHAT_ID, AsyncMock(), bot, media_registry=registry)
+
+    assert bot.send_photo.await_args.kwargs["photo"] == HOUSE_PHOTO_URL
+    assert registry.get_file_id(HOUSE_PHOTO_URL) == "fresh-id"
+
+
+@pytest.mark.asyncio
+async def test_unrelated_bad_request_keeps_file_id():
+    """
+    Проверяет, что ошибка, не связанная с файлом (например, чат не найден),
+    не сбрасывает file_id и не вызывает повторной загрузки.
+    """
+    bot = make_bot("fresh-id")
+    registry = MediaRegistry(bot)
+    registry._entries[HOUSE_PHOTO_URL] = {"file_id": "cached-id", "fingerprint": None}
+    bot.send_photo.side_effect = TelegramBadRequest(
+        method=SendPhoto(chat_id=CHAT_ID, photo="cached-id"), message="Bad Request: chat not found",
+    )
+
+    with pytest.raises(TelegramBadRequest):
+        await registry.send_photo(CHAT_ID, HOUSE_PHOTO_URL)
+
+    bot.send_photo.assert_awaited_once()
+    assert registry.get_file_id(HOUSE_PHOTO_URL) == "cached-id"
+    assert registry.stats()["invalidated"] == 0
@@ -0,0 +1,89 @@
+import sys
+import os
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram import Dispatcher
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetChat, SendMessage
+from aiogram.types import Update
+
+from dispatch_index import DispatchIndex
+from fake_bot_api import FakeBotAPI
+from metrics import ApiMetrics, HandlerMetrics, Metrics, build_metrics_app
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 10,
+        "date": 0,
+        "chat": {"id": 123, "type": "private"},
+        "from": {"id": 123, "is_bot": False, "first_name": "Test"},
+        "text": "Hello",
+    },
+}
+
+
+def test_histogram_buckets_are_cumulative():
+    """
+    Проверяет формат гистограммы: корзины накопительные, есть _sum и _count.
+    """
+    metrics = Metrics(buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        metrics.handler_seconds[("start",)].observe(value)
+
+    text = metrics.render()
+    assert 'bot_handler_seconds_bucket{handler="start",le="0.1"} 1' in text
+    assert 'bot_handler_seconds_bucket{handler="start",le="1.0"} 2' in text
+    assert 'bot_handler_seconds_bucket{handler="start",le="+Inf"} 3' in text
+    assert 'bot_handler_seconds_count{handler="start"} 3' in text
+
+
+@pytest.mark.asyncio
+async def test_handler_and_api_metrics_are_exposed():
+    """
+    Проверяет, что время хендлеров, вызовы и ошибки Bot API и показатели
+    сервисов доступны на /metrics.
+    """
+    metrics = Metrics()
+    api = FakeBotAPI()
+    await api.start()
+    bot = api.bot("42:TEST")
+    bot.session.middleware(ApiMetrics(metrics))
+
+    async def handle_user_to_manager(message, bot):
+        await bot.send_message(message.chat.id, "ok")
+
+    index = DispatchIndex(lambda user_id: False)
+    index.add(handle_user_to_manager, manager=False)
+    dp = Dispatcher()
+    dp.message()(index.dispatch)
+    dp.message.middleware(HandlerMetrics(
+        metrics, lambda message, data: index.route_name(message, data).removeprefix("handle_"),
+    ))
+    metrics.register_stats("message_map", lambda: {"size": 7})
+
+    client = TestClient(TestServer(build_metrics_app(metrics)))
+    await client.start_server()
+    try:
+        await dp.feed_update(bot, Update.model_validate(UPDATE, context={"bot": bot}))
+        await bot(GetChat(chat_id=123))
+        api.flood_rate = 1.0
+        with pytest.raises(TelegramRetryAfter):
+            await bot(SendMessage(chat_id=123, text="x"))
+
+        response = await client.get("/metrics")
+        text = await response.text()
+    finally:
+        await client.close()
+        await bot.session.close()
+        await api.stop()
+
+    assert response.status == 200
+    assert 'bot_handler_seconds_count{handler="user_to_manager"} 1' in text
+    assert 'bot_api_seconds_count{method="sendMessage"} 2' in text
+    assert 'bot_api_seconds_count{method="getChat"} 1' in text
+    assert 'bot_api_errors_total{method="sendMessage",error="TelegramRetryAfter"} 1.0' in text
+    assert "bot_message_map_size 7.0" in text
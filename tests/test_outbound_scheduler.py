@@ -0,0 +1,131 @@
+import sys
+import os
+import asyncio
+import time
+import pytest
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetChat, SendMessage
+from outbound_scheduler import Lane, OutboundScheduler, send_lane
+
+
+async def _send(scheduler, make_request, chat_id, text, lane=Lane.REPLY):
+    with send_lane(lane):
+        return await scheduler(make_request, MagicMock(), SendMessage(chat_id=chat_id, text=text))
+
+
+@pytest.mark.asyncio
+async def test_scheduler_sends_by_priority():
+    """
+    Проверяет, что накопившиеся в очереди запросы отправляются
+    в порядке приоритета: ответы, затем карточки, затем напоминания.
+    """
+    scheduler = OutboundScheduler()
+    sent = []
+
+    async def make_request(bot, method):
+        sent.append(method.text)
+        return method.text
+
+    scheduler._paused_until = time.monotonic() + 0.05
+    await asyncio.gather(
+        _send(scheduler, make_request, 1, "reminder", Lane.REMINDER),
+        _send(scheduler, make_request, 2, "card", Lane.CARD),
+        _send(scheduler, make_request, 3, "reply", Lane.REPLY),
+    )
+
+    assert sent == ["reply", "card", "reminder"]
+    assert scheduler.stats()["sent"] == 3
+    await scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_limits_per_chat():
+    """
+    Проверяет, что сообщения в один чат идут не быстрее лимита чата,
+    а другие чаты при этом не ждут.
+    """
+    scheduler = OutboundScheduler(chat_rate=20, chat_burst=1)
+    sent_at = {}
+
+    async def make_request(bot, method):
+        sent_at.setdefault(method.chat_id, []).append(time.monotonic())
+
+    start = time.monotonic()
+    await asyncio.gather(
+        *(_send(scheduler, make_request, 1, str(i)) for i in range(3)),
+        _send(scheduler, make_request, 2, "other"),
+    )
+
+    assert sent_at[1][-1] - start >= 0.09
+    assert sent_at[2][0] - start < 0.05
+    await scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_retries_after_flood_control():
+    """
+    Проверяет, что при TelegramRetryAfter запрос повторяется автоматически.
+    """
+    scheduler = OutboundScheduler()
+    calls = []
+
+    async def make_request(bot, method):
+        calls.append(method)
+        if len(calls) == 1:
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0)
+        return "ok"
+
+    assert await _send(scheduler, make_request, 1, "hello") == "ok"
+    assert len(calls) == 2
+    assert scheduler.stats()["retry_after"] == 1
+    await scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_retry_keeps_order_within_chat():
+    """
+    Проверяет, что повтор после TelegramRetryAfter уходит раньше
+    более позднего сообщения в тот же чат.
+    """
+    scheduler = OutboundScheduler()
+    sent = []
+    failed = set()
+
+    async def make_request(bot, method):
+        await asyncio.sleep(0.01)
+        if method.text == "first" and not failed:
+            failed.add(method.text)
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0)
+        sent.append(method.text)
+
+    await asyncio.gather(
+        _send(scheduler, make_request, 1, "first"),
+        _send(scheduler, make_request, 1, "second"),
+        _send(scheduler, make_request, 1, "third"),
+    )
+
+    assert sent == ["first", "second", "third"]
+    assert scheduler.stats()["retry_after"] == 1
+    await scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_does_not_delay_other_methods():
+    """
+    Проверяет, что методы, не отправляющие сообщения (например, getChat),
+    проходят мимо очереди даже во время паузы.
+    """
+    scheduler = OutboundScheduler()
+    scheduler._paused_until = time.monotonic() + 60
+
+    async def make_request(bot, method):
+        return "chat"
+
+    result = await asyncio.wait_for(scheduler(make_request, MagicMock(), GetChat(chat_id=1)), timeout=1)
+    assert result == "chat"
+    assert scheduler.queue_depth() == 0
+    await scheduler.close()
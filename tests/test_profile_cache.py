@@ -0,0 +1,74 @@
+import sys
+import os
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram.types import Chat, User
+from fsm_handlers import send_second_reminder
+from notification_service import build_manager_message
+from profile_cache import ProfileCache
+
+USER = User(id=12345, is_bot=False, first_name="Тестовый", username="testuser")
+
+
+@pytest.mark.asyncio
+async def test_middleware_populates_cache():
+    """
+    Проверяет, что middleware запоминает отправителя обновления
+    и передает обновление дальше.
+    """
+    cache = ProfileCache()
+    handler = AsyncMock(return_value="ok")
+
+    assert await cache(handler, MagicMock(), {"event_from_user": USER}) == "ok"
+
+    profile = cache.get(USER.id)
+    assert profile.first_name == "Тестовый" and profile.username == "testuser"
+    assert "Username: @testuser" in build_manager_message(profile)
+
+
+def test_cache_evicts_least_recently_used_and_expires():
+    """
+    Проверяет вытеснение давно не использованных профилей
+    и устаревание записей по TTL.
+    """
+    cache = ProfileCache(max_size=2)
+    for user_id in (1, 2):
+        cache.put(User(id=user_id, is_bot=False, first_name=str(user_id)))
+    cache.get(1)
+    cache.put(User(id=3, is_bot=False, first_name="3"))
+
+    assert cache.get(2) is None
+    assert cache.get(1).first_name == "1"
+    assert cache.stats()["evictions"] == 1
+
+    expired = ProfileCache(ttl=0)
+    expired.put(USER)
+    assert expired.get(USER.id) is None
+    assert expired.stats()["expired"] == 1
+
+
+@pytest.mark.asyncio
+async def test_second_reminder_uses_cache_and_falls_back_to_get_chat():
+    """
+    Проверяет, что напоминание берет имя из кэша без запроса к API,
+    а при промахе вызывает get_chat один раз и запоминает результат.
+    """
+    cache = ProfileCache()
+    cache.put(USER)
+    bot = MagicMock()
+    bot.get_chat = AsyncMock(return_value=Chat(id=777, type="private", first_name="Гость"))
+    bot.send_message = AsyncMock()
+    state = AsyncMock()
+
+    await send_second_reminder(USER.id, state, bot, profile_cache=cache)
+    bot.get_chat.assert_not_awaited()
+    assert bot.send_message.await_args.args[1].startswith("Тестовый,")
+
+    await send_second_reminder(777, state, bot, profile_cache=cache)
+    await send_second_reminder(777, state, bot, profile_cache=cache)
+    bot.get_chat.assert_awaited_once_with(777)
+    assert bot.send_message.await_args.args[1].startswith("Гость,")
+    assert cache.stats()["hit_rate"] == pytest.approx(2 / 3)
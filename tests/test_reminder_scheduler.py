@@ -0,0 +1,189 @@
+import sys
+import os
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from fsm_handlers import process_houses, process_start, send_second_reminder
+from reminder_scheduler import ReminderScheduler
+from states import Form
+
+CHAT_ID = 12345
+
+
+async def make_scheduler(state=Form.waiting_for_houses):
+    bot = MagicMock(id=1)
+    storage = MemoryStorage()
+    await storage.set_state(StorageKey(bot_id=1, chat_id=CHAT_ID, user_id=CHAT_ID), state)
+    return ReminderScheduler(bot, storage, tick=0.01), bot
+
+
+@pytest.mark.asyncio
+async def test_reminder_fires_when_state_unchanged():
+    """
+    Проверяет, что напоминание срабатывает, если пользователь
+    не ответил и остался в ожидаемом состоянии.
+    """
+    scheduler, bot = await make_scheduler()
+    callback = AsyncMock()
+
+    scheduler.arm(CHAT_ID, Form.waiting_for_houses, 0.03, callback)
+    assert len(scheduler) == 1
+    await asyncio.sleep(0.1)
+
+    callback.assert_awaited_once()
+    args, kwargs = callback.await_args
+    assert args[0] == CHAT_ID and args[2] is bot
+    assert kwargs["reminder_scheduler"] is scheduler
+    assert scheduler.stats() == {"pending": 0, "due": 0, "fired": 1, "cancelled": 0}
+    await scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_reminder_cancel_and_state_guard():
+    """
+    Проверяет, что отмененное напоминание не срабатывает,
+    как и напоминание для пользователя, который уже сменил состояние.
+    """
+    scheduler, _ = await make_scheduler(state=Form.waiting_for_questions)
+    cancelled = AsyncMock()
+    stale = AsyncMock()
+
+    scheduler.arm(CHAT_ID, Form.waiting_for_houses, 0.03, cancelled)
+    assert scheduler.cancel(CHAT_ID)
+    scheduler.arm(CHAT_ID, Form.waiting_for_houses, 0.03, stale)
+    await asyncio.sleep(0.1)
+
+    cancelled.assert_not_awaited()
+    stale.assert_not_awaited()
+    assert scheduler.stats()["cancelled"] == 1
+    await scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_process_houses_cancels_pending_reminder():
+    """
+    Проверяет, что ответ пользователя на вопрос отменяет
+    ожидающее напоминание.
+    """
+    message = MagicMock()
+    message.chat.id = CHAT_ID
+    message.from_user = MagicMock(id=CHAT_ID)
+    message.answer = AsyncMock()
+    state = AsyncMock()
+    state.get_data.return_value = {"card_sent": True}
+    reminder_scheduler = MagicMock()
+
+    await process_houses(
+        message, state, MagicMock(), MagicMock(), MagicMock(), AsyncMock(), reminder_scheduler
+    )
+
+    reminder_scheduler.cancel.assert_called_once_with(CHAT_ID)
+
+
+async def send_test_reminder(chat_id, state, bot, reminder_scheduler=None):
+    send_test_reminder.calls.append(chat_id)
+
+send_test_reminder.calls = []
+
+
+@pytest.mark.asyncio
+async def test_reminders_survive_restart(tmp_path):
+    """
+    Проверяет, что ожидающее напоминание сохраняется в базе
+    и восстанавливается новым планировщиком после перезапуска.
+    """
+    path = str(tmp_path / "reminders.sqlite3")
+    bot = MagicMock(id=1)
+    scheduler = ReminderScheduler(bot, MemoryStorage(), path=path, callbacks=[send_test_reminder])
+    scheduler.arm(CHAT_ID, Form.waiting_for_houses, 300, send_test_reminder)
+    scheduler.arm(777, Form.waiting_for_houses, 300, send_test_reminder)
+    scheduler.cancel(777)
+    await scheduler.close()
+
+    restored = ReminderScheduler(bot, MemoryStorage(), path=path, callbacks=[send_test_reminder])
+    assert restored.restore() == 1
+    assert restored.stats()["pending"] == 1
+    assert restored._pending[CHAT_ID].expected_state == Form.waiting_for_houses.state
+    await restored.close()
+
+
+@pytest.mark.asyncio
+async def test_overdue_reminders_are_spread_and_guarded(tmp_path):
+    """
+    Проверяет, что просроченные за время простоя напоминания
+    распределяются по времени и по-прежнему проверяют состояние FSM.
+    """
+    path = str(tmp_path / "reminders.sqlite3")
+    bot = MagicMock(id=1)
+    storage = MemoryStorage()
+    scheduler = ReminderScheduler(bot, storage, path=path, callbacks=[send_test_reminder])
+    for chat_id in (1, 2, 3):
+        scheduler.arm(chat_id, Form.waiting_for_houses, 300, send_test_reminder)
+        # Срок давно прошел, пока бот был остановлен
+        scheduler._dirty[chat_id] = (chat_id, Form.waiting_for_houses.state, chat_id, "send_test_reminder")
+    await scheduler.close()
+
+    # Пользователь 2 успел ответить: его состояние уже другое
+    for chat_id, state in ((1, Form.waiting_for_houses), (2, None), (3, Form.waiting_for_houses)):
+        await storage.set_state(StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id), state)
+
+    send_test_reminder.calls = []
+    restored = ReminderScheduler(bot, storage, tick=0.01, path=path, callbacks=[send_test_reminder])
+    assert restored.restore(overdue_rate=50) == 3
+    fire_ticks = [restored._pending[chat_id].fire_tick for chat_id in (1, 2, 3)]
+    assert len(set(fire_ticks)) == 3
+    await asyncio.sleep(0.15)
+
+    assert send_test_reminder.calls == [1, 3]
+    await restored.close()
+
+
+@pytest.mark.asyncio
+async def test_process_start_arms_scheduler_with_no_pending_reminders():
+    """
+    Проверяет, что пустой планировщик (без ожидающих напоминаний)
+    все равно используется вместо отдельной задачи wait_for_reply.
+    """
+    message = MagicMock()
+    message.chat.id = CHAT_ID
+    message.answer = AsyncMock()
+    reminder_scheduler = ReminderScheduler(MagicMock(id=1), MemoryStorage())
+    assert len(reminder_scheduler) == 0
+
+    await process_start(message, AsyncMock(), reminder_scheduler)
+
+    assert reminder_scheduler._pending[CHAT_ID].callback is send_second_reminder
+    await reminder_scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_reminder_does_not_override_answer_given_while_queued():
+    """
+    Проверяет, что напоминание не возвращает пользователя в сценарий,
+    если он ответил, пока напоминание ждало очереди на отправку.
+    """
+    bot = MagicMock(id=1)
+    storage = MemoryStorage()
+    state = FSMContext(storage, StorageKey(bot_id=1, chat_id=CHAT_ID, user_id=CHAT_ID))
+    await state.set_state(Form.waiting_for_houses)
+
+    async def answer_while_queued(*args, **kwargs):
+        # Пользователь ответил, и сценарий завершился
+        await state.clear()
+
+    bot.send_message = AsyncMock(side_effect=answer_while_queued)
+    reminder_scheduler = MagicMock()
+
+    await send_second_reminder(
+        CHAT_ID, state, bot, reminder_scheduler=reminder_scheduler, profile_cache=AsyncMock(),
+    )
+
+    bot.send_message.assert_awaited_once()
+    assert await state.get_state() is None
+    reminder_scheduler.arm.assert_not_called()
@@ -6,7 +6,7 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from notification_service import NotificationService, build_manager_message
-from message_map import MessageMap
+from message_map import MessageMap, PersistentMessageMap
 
 @pytest.mark.asyncio
 async def test_notify_manager_sends_message():
@@ -52,6 +52,129 @@ def test_message_map_functionality():
     m.clear(100)
     assert m.get_user(100) is None
 
+def test_message_map_evicts_oldest_when_full():
+    """
+    Проверяет, что при достижении max_size вытесняется
+    самая старая связь, а статистика учитывает вытеснение.
+    """
+    m = MessageMap(max_size=3)
+    for msg_id in (1, 2, 3, 4):
+        m.add(msg_id, msg_id * 10)
+
+    assert m.get_user(1) is None
+    assert [m.get_user(i) for i in (2, 3, 4)] == [20, 30, 40]
+    stats = m.stats()
+    assert stats["size"] == 3
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 1
+
+def test_message_map_ttl_expiry(monkeypatch):
+    """
+    Проверяет, что связи старше ttl не возвращаются и удаляются.
+    """
+    now = [1_000_000.0]
+    monkeypatch.setattr("message_map.time.time", lambda: now[0])
+    m = MessageMap(ttl=60)
+    m.add(1, 10)
+    now[0] += 30
+    m.add(2, 20)
+    assert m.get_user(1) == 10
+
+    now[0] += 31
+    assert m.get_user(1) is None
+    assert m.get_user(2) == 20
+    m.add(3, 30)
+    assert len(m) == 2
+    assert m.stats()["expired"] == 1
+
+def test_message_map_matches_dict_under_churn():
+    """
+    Сравнивает MessageMap со словарем на случайной последовательности
+    добавлений, перезаписей и удалений (с ростом и вытеснением).
+    """
+    import random
+    rnd = random.Random(42)
+    m = MessageMap(max_size=5000)
+    reference: dict[int, int] = {}
+    for i in range(20000):
+        msg_id = rnd.randrange(8000)
+        if rnd.random() < 0.2:
+            m.clear(msg_id)
+            reference.pop(msg_id, None)
+        else:
+            m.add(msg_id, i)
+            reference.pop(msg_id, None)
+            reference[msg_id] = i
+            while len(reference) > 5000:
+                del reference[next(iter(reference))]
+    assert len(m) == len(reference)
+    for msg_id in range(8000):
+        assert m.get_user(msg_id) == reference.get(msg_id)
+
+def test_persistent_message_map_survives_restart(tmp_path):
+    """
+    Проверяет, что связи и удаления восстанавливаются после
+    штатного закрытия (через сохраненный индекс).
+    """
+    path = str(tmp_path / "message_map.log")
+    m = PersistentMessageMap(path)
+    for msg_id in range(100):
+        m.add(msg_id, 1000 + msg_id)
+    m.clear(5)
+    m.close()
+
+    restored = PersistentMessageMap(path)
+    assert restored.get_user(7) == 1007
+    assert restored.get_user(5) is None
+    assert len(restored) == 99
+    restored.close()
+
+def test_persistent_message_map_replays_tail_after_crash(tmp_path):
+    """
+    Проверяет, что записи, добавленные после последнего сохранения
+    индекса, дочитываются из журнала, даже если close() не был вызван.
+    """
+    path = str(tmp_path / "message_map.log")
+    m = PersistentMessageMap(path, checkpoint_every=10)
+    for msg_id in range(25):
+        m.add(msg_id, 1000 + msg_id)
+    m.clear(3)
+    del m  # имитация аварийного завершения
+
+    restored = PersistentMessageMap(path)
+    assert restored.get_user(24) == 1024
+    assert restored.get_user(3) is None
+    assert len(restored) == 24
+    restored.close()
+
+def test_persistent_message_map_compaction(tmp_path, monkeypatch):
+    """
+    Проверяет, что сжатие удаляет перезаписанные, удаленные
+    и истекшие связи, сохраняя живые.
+    """
+    now = [1_000_000.0]
+    monkeypatch.setattr("message_map.time.time", lambda: now[0])
+    path = str(tmp_path / "message_map.log")
+    m = PersistentMessageMap(path, ttl=60)
+    m.add(1, 10)
+    now[0] += 100
+    m.add(2, 20)
+    m.add(2, 21)
+    m.add(3, 30)
+    m.clear(3)
+    assert m.stats()["log_records"] == 5
+
+    m.compact()
+    assert m.stats()["log_records"] == 1
+    assert m.get_user(2) == 21
+    assert m.get_user(1) is None
+    m.close()
+
+    restored = PersistentMessageMap(path, ttl=60)
+    assert restored.get_user(2) == 21
+    assert len(restored) == 1
+    restored.close()
+
 def test_build_manager_message():
     """
     Проверяет, что карточка клиента генерируется
@@ -0,0 +1,91 @@
+import sys
+import os
+import asyncio
+import queue
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+
+from message_map import SharedMessageMap
+from sharding import consume, shard_of, update_user_id
+from user_session import SharedUserSession
+
+
+def _update(update_id, user_id, text="hi"):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "User"},
+            "text": text,
+        },
+    }
+
+
+def test_update_user_id_and_shard():
+    """
+    Проверяет, что обновления пользователя всегда попадают в один процесс.
+    """
+    assert update_user_id(_update(1, 42)) == 42
+    assert update_user_id({"update_id": 1, "poll": {"id": "p"}}) is None
+    assert shard_of(42, 4) == shard_of(update_user_id(_update(2, 42)), 4) == 2
+    assert shard_of(None, 4) == 0
+
+
+@pytest.mark.asyncio
+async def test_consume_keeps_per_user_order():
+    """
+    Проверяет, что рабочий процесс обрабатывает обновления разных
+    пользователей параллельно, а одного пользователя — по порядку,
+    и сообщает об активности менеджеров.
+    """
+    dp = Dispatcher()
+    bot = Bot(token="42:TEST")
+    handled = []
+
+    @dp.message()
+    async def handler(message: Message):
+        # Первое сообщение пользователя 1 обрабатывается дольше остальных
+        await asyncio.sleep(0.05 if message.message_id == 1 else 0)
+        handled.append((message.from_user.id, message.message_id))
+
+    touched = []
+    updates = queue.Queue()
+    updates.put(([_update(1, 1), _update(2, 2), _update(3, 1)], {2}))
+    updates.put(None)
+    try:
+        await consume(updates, dp, bot, touched.append)
+    finally:
+        await bot.session.close()
+
+    assert touched == [2]
+    assert handled.index((1, 1)) < handled.index((1, 3))
+    assert handled[0] == (2, 2)
+
+
+def test_shared_state_is_visible_across_instances(tmp_path):
+    """
+    Проверяет, что связи сообщений и активный клиент, записанные
+    одним процессом, видны другому процессу.
+    """
+    path = str(tmp_path / "shared.sqlite3")
+    writer_map, reader_map = SharedMessageMap(path), SharedMessageMap(path)
+    writer_session, reader_session = SharedUserSession(path), SharedUserSession(path)
+    try:
+        writer_map.add(10, 555)
+        writer_session.set_active_user(555)
+
+        assert reader_map.get_user(10) == 555
+        assert reader_map.get_user(11) is None
+        assert reader_session.get_active_user() == 555
+
+        reader_map.clear(10)
+        assert writer_map.get_user(10) is None
+    finally:
+        for item in (writer_map, reader_map, writer_session, reader_session):
+            item.close()
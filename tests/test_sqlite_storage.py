@@ -0,0 +1,111 @@
+import sys
+import os
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram.fsm.storage.base import StorageKey
+from sqlite_storage import SQLiteStorage
+from states import Form
+
+KEY = StorageKey(bot_id=1, chat_id=123, user_id=123)
+
+
+@pytest.mark.asyncio
+async def test_sqlite_storage_survives_restart(tmp_path):
+    """
+    Проверяет, что состояние и данные FSM восстанавливаются
+    после закрытия и повторного открытия хранилища.
+    """
+    path = str(tmp_path / "fsm.sqlite3")
+    storage = SQLiteStorage(path)
+    await storage.set_state(KEY, Form.waiting_for_houses)
+    await storage.update_data(KEY, {"card_sent": True})
+    await storage.close()
+
+    restored = SQLiteStorage(path)
+    assert await restored.get_state(KEY) == Form.waiting_for_houses.state
+    assert await restored.get_data(KEY) == {"card_sent": True}
+    await restored.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_storage_writes_behind(tmp_path):
+    """
+    Проверяет, что запись попадает на диск только при сбросе,
+    а чтения сразу видят новое значение из памяти.
+    """
+    path = str(tmp_path / "fsm.sqlite3")
+    storage = SQLiteStorage(path, flush_interval=60)
+    await storage.set_state(KEY, Form.waiting_for_start)
+    assert await storage.get_state(KEY) == Form.waiting_for_start.state
+
+    other = SQLiteStorage(path)
+    assert await other.get_state(KEY) is None
+
+    await storage.flush()
+    fresh = SQLiteStorage(path)
+    assert await fresh.get_state(KEY) == Form.waiting_for_start.state
+
+    for s in (storage, other, fresh):
+        await s.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_storage_clear_removes_row(tmp_path):
+    """
+    Проверяет, что очищенное состояние (state.clear()) удаляется из файла.
+    """
+    path = str(tmp_path / "fsm.sqlite3")
+    storage = SQLiteStorage(path)
+    await storage.set_state(KEY, Form.waiting_for_houses)
+    await storage.flush()
+    await storage.set_state(KEY, None)
+    await storage.set_data(KEY, {})
+    await storage.close()
+
+    restored = SQLiteStorage(path)
+    assert await restored.get_state(KEY) is None
+    assert restored._reader.execute("SELECT COUNT(*) FROM fsm").fetchone()[0] == 0
+    await restored.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_storage_unserializable_value_keeps_other_keys(tmp_path):
+    """
+    Проверяет, что несериализуемые данные одного ключа не мешают
+    сохранить остальные, а сам ключ остается несохраненным.
+    """
+    path = str(tmp_path / "fsm.sqlite3")
+    bad_key = StorageKey(bot_id=1, chat_id=456, user_id=456)
+    storage = SQLiteStorage(path, flush_interval=60)
+    await storage.set_state(KEY, Form.waiting_for_houses)
+    await storage.set_data(bad_key, {"value": object()})
+    await storage.flush()
+
+    fresh = SQLiteStorage(path)
+    assert await fresh.get_state(KEY) == Form.waiting_for_houses.state
+    assert bad_key in storage._dirty
+
+    await storage.set_data(bad_key, {"value": 1})
+    await storage.flush()
+    assert not storage._dirty
+    for s in (storage, fresh):
+        await s.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_storage_evicts_clean_records(tmp_path):
+    """
+    Проверяет, что горячий слой не растет больше `max_records`,
+    а выгруженные записи снова читаются из файла.
+    """
+    path = str(tmp_path / "fsm.sqlite3")
+    storage = SQLiteStorage(path, flush_interval=60, max_records=10)
+    for chat_id in range(100):
+        await storage.set_state(StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id), Form.waiting_for_houses)
+    await storage.flush()
+
+    assert len(storage._records) == 10
+    assert await storage.get_state(StorageKey(bot_id=1, chat_id=0, user_id=0)) == Form.waiting_for_houses.state
+    await storage.close()
@@ -0,0 +1,106 @@
+import sys
+import os
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from state_unit import BufferedFSMContext, StateUnitMiddleware
+from states import Form
+
+KEY = StorageKey(bot_id=1, chat_id=123, user_id=123)
+
+
+def spy(storage: MemoryStorage) -> MemoryStorage:
+    """
+    Оборачивает методы хранилища в моки, чтобы считать обращения.
+    """
+    for name in ("get_state", "set_state", "get_data", "set_data", "update_data"):
+        setattr(storage, name, AsyncMock(side_effect=getattr(storage, name)))
+    return storage
+
+
+@pytest.mark.asyncio
+async def test_buffered_context_reads_once_and_flushes_once():
+    """
+    Сценарий отправки карточки (чтение данных, отметка, сброс состояния)
+    читает данные один раз и записывает изменения только при `flush()`.
+    """
+    storage = MemoryStorage()
+    await storage.set_state(KEY, Form.waiting_for_houses)
+    await storage.set_data(KEY, {"name": "Иван"})
+    spy(storage)
+
+    state = BufferedFSMContext(storage, KEY, Form.waiting_for_houses.state)
+    assert await state.get_data() == {"name": "Иван"}
+    await state.update_data(card_sent=True)
+    assert await state.get_value("card_sent") is True
+    await state.clear()
+    assert await state.get_state() is None
+    storage.set_state.assert_not_awaited()
+    storage.set_data.assert_not_awaited()
+
+    await state.flush()
+    storage.get_state.assert_not_awaited()
+    storage.get_data.assert_awaited_once()
+    storage.set_state.assert_awaited_once_with(KEY, None)
+    storage.set_data.assert_awaited_once_with(KEY, {})
+    assert (state.reads, state.writes) == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_buffered_context_merges_updated_keys():
+    """
+    `update_data` сбрасывает только измененные ключи, не затирая ключи,
+    которые записало параллельное обновление того же пользователя.
+    """
+    storage = MemoryStorage()
+    first = BufferedFSMContext(storage, KEY, None)
+    second = BufferedFSMContext(storage, KEY, None)
+    await first.update_data(card_sent=True)
+    await second.update_data(phone="+7900")
+    await first.flush()
+    await second.flush()
+    assert await storage.get_data(KEY) == {"card_sent": True, "phone": "+7900"}
+
+
+@pytest.mark.asyncio
+async def test_buffered_context_skips_unchanged_values():
+    """
+    Состояние и данные, совпадающие с сохраненными, не записываются,
+    а после `flush()` контекст работает с хранилищем напрямую.
+    """
+    storage = spy(MemoryStorage())
+    state = BufferedFSMContext(storage, KEY, None)
+    await state.get_data()
+    await state.clear()
+    await state.flush()
+    storage.set_state.assert_not_awaited()
+    storage.set_data.assert_not_awaited()
+
+    await state.set_state(Form.waiting_for_start)
+    assert await storage.get_state(KEY) == Form.waiting_for_start.state
+
+
+@pytest.mark.asyncio
+async def test_middleware_flushes_after_handler_error():
+    """
+    Middleware подменяет `state` и сбрасывает изменения даже при ошибке в хендлере.
+    """
+    storage = MemoryStorage()
+    middleware = StateUnitMiddleware()
+    data = {"state": FSMContext(storage, KEY), "raw_state": None}
+
+    async def handler(event, data):
+        assert isinstance(data["state"], BufferedFSMContext)
+        await data["state"].set_state(Form.waiting_for_houses)
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await middleware(handler, MagicMock(), data)
+    assert await storage.get_state(KEY) == Form.waiting_for_houses.state
+    assert middleware.stats() == {"updates": 1, "storage_reads": 0, "storage_writes": 1}
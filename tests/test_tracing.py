@@ -0,0 +1,91 @@
+import sys
+import os
+import json
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Message, Update
+
+from dispatch_index import DispatchIndex
+from fake_bot_api import FakeBotAPI
+from tracing import BotCallSpans, TracedStorage, Tracer, span
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 10,
+        "date": 0,
+        "chat": {"id": 123, "type": "private"},
+        "from": {"id": 123, "is_bot": False, "first_name": "Test"},
+        "text": "Hello",
+    },
+}
+
+
+async def _run(tracer: Tracer, updates: int = 1) -> None:
+    async def handle_user_to_manager(message: Message, state: FSMContext, bot: Bot):
+        await state.get_data()
+        with span("message_map.get_user"):
+            pass
+        await bot.send_message(message.chat.id, "ok")
+
+    api = FakeBotAPI()
+    await api.start()
+    bot = api.bot("42:TEST")
+    bot.session.middleware(BotCallSpans())
+    index = DispatchIndex(lambda user_id: False)
+    index.add(handle_user_to_manager)
+    dp = Dispatcher(storage=TracedStorage(MemoryStorage()))
+    tracer.install(dp)
+    dp.message()(index.dispatch)
+    try:
+        for _ in range(updates):
+            await dp.feed_update(bot, Update.model_validate(UPDATE, context={"bot": bot}))
+    finally:
+        tracer.close()
+        await bot.session.close()
+        await api.stop()
+
+
+@pytest.mark.asyncio
+async def test_trace_contains_span_tree(tmp_path):
+    """
+    Проверяет, что трасса обновления содержит спаны чтения состояния,
+    поиска маршрута, хендлера и вызова Bot API в формате OTLP/JSON.
+    """
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(str(path), sample_rate=1.0)
+    await _run(tracer)
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1
+    spans = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    by_name = {item["name"]: item for item in spans}
+    assert {"update", "state.get_state", "dispatch.resolve", "handler",
+            "state.get_data", "message_map.get_user", "bot.sendMessage"} <= set(by_name)
+    assert "parentSpanId" not in by_name["update"]
+    assert by_name["state.get_state"]["parentSpanId"] == by_name["update"]["spanId"]
+    assert by_name["bot.sendMessage"]["parentSpanId"] == by_name["handler"]["spanId"]
+    assert {"key": "handler", "value": {"stringValue": "handle_user_to_manager"}} in by_name["handler"]["attributes"]
+    assert len({item["traceId"] for item in spans}) == 1
+    assert int(by_name["update"]["endTimeUnixNano"]) >= int(by_name["handler"]["endTimeUnixNano"])
+
+
+@pytest.mark.asyncio
+async def test_sampling_and_slow_threshold(tmp_path):
+    """
+    Проверяет, что вне выборки трассы не сохраняются,
+    а медленные обновления сохраняются всегда.
+    """
+    skipped = Tracer(str(tmp_path / "skipped.jsonl"), sample_rate=0.0, slow_threshold=60)
+    await _run(skipped, updates=3)
+    assert skipped.stats() == {"traced": 3, "exported": 0, "slow": 0}
+
+    slow = Tracer(str(tmp_path / "slow.jsonl"), sample_rate=0.0, slow_threshold=0)
+    await _run(slow, updates=2)
+    assert slow.stats() == {"traced": 2, "exported": 2, "slow": 2}
+    assert len((tmp_path / "slow.jsonl").read_text(encoding="utf-8").splitlines()) == 2
@@ -0,0 +1,77 @@
+import sys
+import os
+import pytest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram import Dispatcher
+from aiogram.fsm.storage.base import StorageKey
+
+from states import Form
+from ttl_storage import TTLMemoryStorage
+
+
+def key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+@pytest.mark.asyncio
+async def test_idle_contexts_are_evicted_incrementally():
+    """
+    Записи, к которым не обращались дольше `ttl`, удаляются по `sweep_batch`
+    за обращение, а активные пользователи остаются.
+    """
+    storage = TTLMemoryStorage(ttl=100, sweep_batch=2)
+    with patch("ttl_storage.time.monotonic", return_value=0.0):
+        for user_id in range(5):
+            await storage.set_state(key(user_id), Form.waiting_for_start)
+    with patch("ttl_storage.time.monotonic", return_value=50.0):
+        await storage.update_data(key(4), {"card_sent": True})
+    with patch("ttl_storage.time.monotonic", return_value=120.0):
+        await storage.get_state(key(100))
+        assert len(storage) == 3
+        await storage.get_state(key(100))
+        assert len(storage) == 1
+        assert await storage.get_state(key(4)) == Form.waiting_for_start.state
+        assert await storage.get_data(key(4)) == {"card_sent": True}
+    assert storage.stats() == {"contexts": 1, "evicted": 4}
+
+
+@pytest.mark.asyncio
+async def test_expired_context_is_not_returned():
+    """
+    Устаревшая запись не возвращается, даже если уборка до нее не дошла.
+    """
+    storage = TTLMemoryStorage(ttl=100, sweep_batch=0)
+    with patch("ttl_storage.time.monotonic", return_value=0.0):
+        await storage.set_state(key(1), Form.waiting_for_house_choice)
+    with patch("ttl_storage.time.monotonic", return_value=100.0):
+        assert await storage.get_state(key(1)) is None
+    assert storage.stats() == {"contexts": 0, "evicted": 1}
+
+
+@pytest.mark.asyncio
+async def test_reads_and_clear_do_not_keep_records():
+    """
+    Чтение незнакомого пользователя не создает запись, а `clear` ее удаляет.
+    """
+    storage = TTLMemoryStorage()
+    assert await storage.get_state(key(1)) is None
+    assert await storage.get_data(key(1)) == {}
+    assert len(storage) == 0
+    await storage.set_state(key(1), Form.waiting_for_start)
+    await storage.set_data(key(1), {"card_sent": True})
+    await storage.set_state(key(1), None)
+    await storage.set_data(key(1), {})
+    assert len(storage) == 0
+
+
+def test_empty_storage_is_used_by_dispatcher():
+    """
+    Пустое хранилище передается в Dispatcher как есть, а не заменяется
+    на отдельный MemoryStorage.
+    """
+    storage = TTLMemoryStorage(ttl=60)
+    dp = Dispatcher(storage=storage)
+    assert dp.fsm.storage is storage
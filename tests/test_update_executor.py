@@ -0,0 +1,207 @@
+import sys
+import os
+import asyncio
+import itertools
+import pytest
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Chat, Message, Update, User
+
+from metrics import Metrics
+from sqlite_storage import SQLiteStorage
+from states import Form
+from update_executor import UpdateExecutor, yield_turn
+
+_update_ids = itertools.count(1)
+
+
+def make_update(user_id: int, text: str) -> Update:
+    update_id = next(_update_ids)
+    message = Message(
+        message_id=update_id, date=datetime.now(), chat=Chat(id=user_id, type="private"),
+        from_user=User(id=user_id, is_bot=False, first_name="Client"), text=text,
+    )
+    return Update(update_id=update_id, message=message)
+
+
+def make_dispatcher(executor: UpdateExecutor, handler) -> Dispatcher:
+    dp = Dispatcher()
+    dp.message.register(handler)
+    executor.install(dp)
+    return dp
+
+
+@pytest.mark.asyncio
+async def test_updates_of_one_user_keep_order_and_do_not_block_others():
+    """
+    Медленное обновление клиента задерживает только его следующие
+    обновления, а другой клиент обслуживается сразу.
+    """
+    executor = UpdateExecutor(workers=4)
+    done: list[str] = []
+
+    async def handler(message: Message):
+        if message.text == "медленно":
+            await asyncio.sleep(0.05)
+        done.append(f"{message.chat.id}:{message.text}")
+
+    dp = make_dispatcher(executor, handler)
+    bot = Bot(token="42:TEST")
+    assert isinstance(dp.update.outer_middleware[0], UpdateExecutor)
+    await dp.feed_update(bot, make_update(1, "медленно"))
+    await dp.feed_update(bot, make_update(1, "Начать"))
+    await dp.feed_update(bot, make_update(2, "Да"))
+    await executor.close()
+
+    assert done == ["2:Да", "1:медленно", "1:Начать"]
+    assert executor.stats() == {"pending": 0, "users": 0, "processed": 3, "throttled": 0}
+
+
+@pytest.mark.asyncio
+async def test_intake_waits_above_high_water():
+    """
+    При `high_water` необработанных обновлений прием ждет, пока их не станет `low_water`.
+    """
+    executor = UpdateExecutor(workers=1, high_water=3, low_water=1)
+    release = asyncio.Event()
+
+    async def handler(message: Message):
+        await release.wait()
+
+    dp = make_dispatcher(executor, handler)
+    bot = Bot(token="42:TEST")
+    await dp.feed_update(bot, make_update(1, "a"))
+    await dp.feed_update(bot, make_update(2, "b"))
+    intake = asyncio.create_task(dp.feed_update(bot, make_update(3, "c")))
+    await asyncio.sleep(0.01)
+    assert not intake.done()
+    assert executor.stats()["throttled"] == 1
+
+    release.set()
+    await asyncio.wait_for(intake, 1)
+    await executor.close()
+    assert executor.stats()["processed"] == 3
+
+
+@pytest.mark.asyncio
+async def test_yield_turn_lets_next_update_of_user_start():
+    """
+    Хендлер, ожидающий следующие сообщения клиента (сборка альбома),
+    отдает очередь через `yield_turn`.
+    """
+    executor = UpdateExecutor(workers=4)
+    second_seen = asyncio.Event()
+
+    async def handler(message: Message):
+        if message.text == "первое":
+            yield_turn()
+            await asyncio.wait_for(second_seen.wait(), 1)
+        else:
+            second_seen.set()
+
+    dp = make_dispatcher(executor, handler)
+    bot = Bot(token="42:TEST")
+    await dp.feed_update(bot, make_update(1, "первое"))
+    await dp.feed_update(bot, make_update(1, "второе"))
+    await executor.close()
+    assert second_seen.is_set()
+    assert executor.stats()["processed"] == 2
+
+
+@pytest.mark.asyncio
+async def test_handler_error_does_not_stop_user_queue():
+    """
+    Ошибка в хендлере не останавливает обработку следующих обновлений клиента.
+    """
+    executor = UpdateExecutor(workers=2)
+    done: list[str] = []
+
+    async def handler(message: Message):
+        if message.text == "ошибка":
+            raise RuntimeError("boom")
+        done.append(message.text)
+
+    dp = make_dispatcher(executor, handler)
+    bot = Bot(token="42:TEST")
+    await dp.feed_update(bot, make_update(1, "ошибка"))
+    await dp.feed_update(bot, make_update(1, "дальше"))
+    await executor.close()
+    assert done == ["дальше"]
+
+
+@pytest.mark.asyncio
+async def test_manager_updates_overtake_client_backlog():
+    """
+    Обновление менеджера обрабатывается раньше накопившихся клиентских,
+    а время обработки пишется в гистограмму своей полосы.
+    """
+    executor = UpdateExecutor(workers=1, is_priority=lambda user_id: user_id == 100)
+    executor.latency = Metrics().histogram("bot_update_seconds", "test", ("lane",))
+    done: list[int] = []
+
+    async def handler(message: Message):
+        done.append(message.chat.id)
+
+    dp = make_dispatcher(executor, handler)
+    bot = Bot(token="42:TEST")
+    for user_id in (1, 2, 3, 100):
+        await dp.feed_update(bot, make_update(user_id, "привет"))
+    await executor.close()
+
+    assert done == [100, 1, 2, 3]
+    assert executor.latency[("managers",)].count == 1
+    assert executor.latency[("clients",)].count == 3
+
+
+@pytest.mark.asyncio
+async def test_clients_are_not_starved_by_managers():
+    """
+    После `priority_run` обновлений менеджеров подряд обслуживается один клиент.
+    """
+    executor = UpdateExecutor(workers=1, is_priority=lambda user_id: user_id >= 100, priority_run=2)
+    done: list[int] = []
+
+    async def handler(message: Message):
+        done.append(message.chat.id)
+
+    dp = make_dispatcher(executor, handler)
+    bot = Bot(token="42:TEST")
+    for user_id in (1, 2, 100, 101, 102, 103):
+        await dp.feed_update(bot, make_update(user_id, "привет"))
+    await executor.close()
+
+    assert done == [100, 101, 1, 102, 103, 2]
+
+
+@pytest.mark.asyncio
+async def test_shutdown_drains_queue_before_storage_closes(tmp_path):
+    """
+    Остановка диспетчера сначала дообрабатывает принятые обновления,
+    и их изменения FSM успевают сохраниться до закрытия хранилища.
+    """
+    path = str(tmp_path / "fsm.sqlite3")
+    executor = UpdateExecutor(workers=2)
+
+    async def handler(message: Message, state: FSMContext):
+        await asyncio.sleep(0.01)
+        await state.set_state(Form.waiting_for_houses)
+
+    dp = Dispatcher(storage=SQLiteStorage(path))
+    dp.message.register(handler)
+    executor.install(dp)
+    bot = Bot(token="42:TEST")
+    for user_id in (1, 2, 3, 4):
+        await dp.feed_update(bot, make_update(user_id, "привет"))
+    await dp.emit_shutdown(bot=bot)
+
+    assert executor.stats()["processed"] == 4
+    restored = SQLiteStorage(path)
+    for user_id in (1, 2, 3, 4):
+        key = StorageKey(bot_id=bot.id, chat_id=user_id, user_id=user_id)
+        assert await restored.get_state(key) == Form.waiting_for_houses.state
+    await restored.close()
@@ -0,0 +1,92 @@
+import sys
+import os
+import asyncio
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+from webhook_server import WebhookConfig, build_webhook_app
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 10,
+        "date": 0,
+        "chat": {"id": 123, "type": "private"},
+        "from": {"id": 123, "is_bot": False, "first_name": "Test"},
+        "text": "Hello",
+    },
+}
+
+
+@pytest.fixture
+def config(monkeypatch):
+    monkeypatch.setenv("BOT_MODE", "webhook")
+    monkeypatch.setenv("WEBHOOK_SECRET", "s3cret")
+    monkeypatch.delenv("WEBHOOK_URL", raising=False)
+    return WebhookConfig()
+
+
+def test_webhook_config_from_env(config):
+    """
+    Проверяет, что режим и секрет читаются из переменных окружения.
+    """
+    assert config.is_webhook
+    assert config.secret == "s3cret"
+    assert config.path == "/webhook"
+
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_wrong_secret(config):
+    """
+    Проверяет, что запрос с неверным секретом отклоняется
+    и не попадает в диспетчер.
+    """
+    dp = Dispatcher()
+    calls = []
+
+    async def handler(message: Message):
+        calls.append(message)
+
+    dp.message()(handler)
+    bot = Bot(token="123456:TEST")
+
+    async with TestClient(TestServer(build_webhook_app(dp, bot, config))) as client:
+        resp = await client.post(
+            "/webhook", json=UPDATE,
+            headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}
+        )
+        assert resp.status == 401
+
+    assert calls == []
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_webhook_feeds_update_in_background(config):
+    """
+    Проверяет, что корректное обновление сразу подтверждается
+    и затем обрабатывается хендлером диспетчера.
+    """
+    dp = Dispatcher()
+    received = asyncio.Event()
+
+    async def handler(message: Message):
+        assert message.text == "Hello"
+        received.set()
+
+    dp.message()(handler)
+    bot = Bot(token="123456:TEST")
+
+    async with TestClient(TestServer(build_webhook_app(dp, bot, config))) as client:
+        resp = await client.post(
+            "/webhook", json=UPDATE,
+            headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+        )
+        assert resp.status == 200
+        await asyncio.wait_for(received.wait(), timeout=1)
+
+    await bot.session.close()
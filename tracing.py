@@ -0,0 +1,222 @@
+"""
+Выборочная трассировка обработки обновлений.
+
+`Tracer` — внешний middleware обновлений: для каждого обновления он
+собирает дерево спанов (чтение состояния FSM, поиск маршрута, хендлер,
+вызовы Bot API, ожидание в очереди отправки, поиск в `MessageMap`...)
+и записывает трассу в JSONL-файл, если обновление попало в выборку
+(`sample_rate`) или обрабатывалось дольше `slow_threshold` секунд.
+Медленные обновления записываются всегда.
+
+Каждая строка файла — объект в формате OTLP/JSON (`resourceSpans`),
+поэтому файл можно загрузить в OpenTelemetry Collector (filelog/otlpjson)
+или разобрать скриптом.
+
+Спаны добавляются в код через `with span("имя", ключ=значение):`.
+Вне трассируемого обновления `span` ничего не делает.
+"""
+import json
+import logging
+import random
+import time
+from collections.abc import Awaitable, Callable, Mapping
+from contextvars import ContextVar
+from typing import Any
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.methods import TelegramMethod
+from aiogram.types import TelegramObject, Update
+
+SERVICE_NAME = "telegram-manager-bot"
+
+
+class _Trace:
+    __slots__ = ("trace_id", "start_ns", "start_perf", "spans")
+
+    def __init__(self):
+        self.trace_id = random.getrandbits(128)
+        self.start_ns = time.time_ns()
+        self.start_perf = time.perf_counter_ns()
+        # [имя, индекс родителя, начало, конец, атрибуты, ошибка]
+        self.spans: list[list] = []
+
+
+# Текущая трасса и индекс открытого спана в ней
+_current: ContextVar[tuple[_Trace, int] | None] = ContextVar("trace", default=None)
+
+
+class span:
+    """
+    Контекстный менеджер спана внутри текущей трассы.
+    """
+    __slots__ = ("name", "attributes", "_record", "_token")
+
+    def __init__(self, name: str, **attributes: Any):
+        self.name = name
+        self.attributes = attributes
+        self._token = None
+
+    def __enter__(self) -> "span":
+        current = _current.get()
+        if current is not None:
+            trace, parent = current
+            self._record = [self.name, parent, time.perf_counter_ns(), 0, self.attributes, None]
+            trace.spans.append(self._record)
+            self._token = _current.set((trace, len(trace.spans) - 1))
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._token is not None:
+            self._record[3] = time.perf_counter_ns()
+            if exc_type is not None:
+                self._record[5] = f"{exc_type.__name__}: {exc}"
+            _current.reset(self._token)
+
+
+def _attribute(key: str, value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+class Tracer(BaseMiddleware):
+    """
+    Собирает спаны каждого обновления и сохраняет выбранные трассы.
+
+    :param path: JSONL-файл, в который дописываются трассы.
+    :param sample_rate: Доля обновлений, трассы которых сохраняются (0..1).
+    :param slow_threshold: Обновления дольше стольких секунд сохраняются всегда.
+    """
+    def __init__(self, path: str, sample_rate: float = 0.01, slow_threshold: float = 1.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.slow_threshold_ns = int(slow_threshold * 1_000_000_000)
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        self._traced = 0
+        self._exported = 0
+        self._slow = 0
+
+    def install(self, dp: Dispatcher) -> None:
+        """
+        Подключает трассировку к диспетчеру раньше FSM, чтобы в трассу
+        попало чтение состояния пользователя.
+        """
+        dp.update.outer_middleware.unregister(dp.fsm)
+        dp.update.outer_middleware(self)
+        dp.update.outer_middleware(dp.fsm)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        trace = _Trace()
+        attributes = {"update_id": event.update_id, "type": event.event_type} if isinstance(event, Update) else {}
+        root = ["update", -1, trace.start_perf, 0, attributes, None]
+        trace.spans.append(root)
+        token = _current.set((trace, 0))
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            root[5] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            root[3] = time.perf_counter_ns()
+            self._traced += 1
+            slow = root[3] - root[2] >= self.slow_threshold_ns
+            if slow or random.random() < self.sample_rate:
+                self._slow += slow
+                self._export(trace)
+
+    def _export(self, trace: _Trace) -> None:
+        trace_id = f"{trace.trace_id:032x}"
+        span_ids = [f"{random.getrandbits(64):016x}" for _ in trace.spans]
+        spans = []
+        for index, (name, parent, start, end, attributes, error) in enumerate(trace.spans):
+            record = {
+                "traceId": trace_id,
+                "spanId": span_ids[index],
+                "name": name,
+                "kind": 1,
+                "startTimeUnixNano": str(trace.start_ns + start - trace.start_perf),
+                "endTimeUnixNano": str(trace.start_ns + (end or start) - trace.start_perf),
+                "attributes": [_attribute(key, value) for key, value in attributes.items()],
+                "status": {"code": 2, "message": error} if error else {"code": 0},
+            }
+            if parent >= 0:
+                record["parentSpanId"] = span_ids[parent]
+            spans.append(record)
+        line = {
+            "resourceSpans": [{
+                "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{"scope": {"name": "bot"}, "spans": spans}],
+            }],
+        }
+        try:
+            self._file.write(json.dumps(line, ensure_ascii=False) + "\n")
+            self._exported += 1
+        except (OSError, ValueError) as e:
+            logging.error(f"Не удалось записать трассу в {self.path}: {e}")
+
+    def close(self) -> None:
+        self._file.close()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Возвращает число обработанных и сохраненных трасс (из них медленных).
+        """
+        return {"traced": self._traced, "exported": self._exported, "slow": self._slow}
+
+
+class BotCallSpans(BaseRequestMiddleware):
+    """
+    Request middleware сессии бота: спан на каждый вызов Bot API.
+    """
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        with span(f"bot.{method.__api_method__}"):
+            return await make_request(bot, method)
+
+
+class TracedStorage(BaseStorage):
+    """
+    Обертка хранилища FSM: спаны на чтение и запись состояния и данных.
+    Остальные атрибуты берутся из исходного хранилища.
+    """
+    def __init__(self, storage: BaseStorage):
+        self.storage = storage
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.storage, name)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        with span("state.set_state"):
+            await self.storage.set_state(key, state)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        with span("state.get_state"):
+            return await self.storage.get_state(key)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        with span("state.set_data"):
+            await self.storage.set_data(key, data)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        with span("state.get_data"):
+            return await self.storage.get_data(key)
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> dict[str, Any]:
+        with span("state.update_data"):
+            return await self.storage.update_data(key, data)
+
+    async def close(self) -> None:
+        await self.storage.close()
@@ -0,0 +1,117 @@
+"""
+Хранилище состояний FSM в памяти с вытеснением неактивных пользователей.
+
+В `MemoryStorage` запись пользователя живет вечно: кто нажал /start и
+больше не вернулся, навсегда остается в `Form.waiting_for_start`, а после
+третьего напоминания — в `Form.waiting_for_house_choice`. К тому же
+`MemoryStorage` создает запись даже при чтении состояния незнакомого
+пользователя.
+
+`TTLMemoryStorage` хранит записи в `OrderedDict` в порядке последнего
+обращения, поэтому самые давние всегда в начале. Каждое обращение к
+хранилищу проверяет не больше `sweep_batch` записей с начала и удаляет
+те, к которым не обращались дольше `ttl` секунд. Полного обхода нет:
+уборка размазана по обычным операциям и стоит O(1) на каждую. Чтение
+не создает записей, а запись без состояния и данных (после
+`state.clear()`) удаляется сразу.
+"""
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorageRecord
+
+
+class TTLMemoryStorage(BaseStorage):
+    """
+    Хранилище FSM в памяти, из которого удаляются записи пользователей,
+    неактивных дольше `ttl` секунд.
+
+    :param ttl: Сколько секунд хранится запись после последнего обращения.
+    :param sweep_batch: Сколько самых давних записей проверяется за одно обращение.
+    """
+    def __init__(self, ttl: float = 24 * 60 * 60, sweep_batch: int = 16):
+        self.ttl = ttl
+        self.sweep_batch = sweep_batch
+        # key -> [запись, время последнего обращения]; самые давние в начале
+        self._records: OrderedDict[StorageKey, list] = OrderedDict()
+        self._evicted = 0
+
+    def _sweep(self, now: float) -> None:
+        deadline = now - self.ttl
+        for _ in range(self.sweep_batch):
+            if not self._records:
+                return
+            key, entry = next(iter(self._records.items()))
+            if entry[1] > deadline:
+                return
+            del self._records[key]
+            self._evicted += 1
+
+    def _record(self, key: StorageKey, create: bool = False) -> MemoryStorageRecord | None:
+        """
+        Возвращает запись пользователя и отмечает обращение к ней.
+        """
+        now = time.monotonic()
+        self._sweep(now)
+        entry = self._records.get(key)
+        if entry is not None and entry[1] <= now - self.ttl:
+            # Запись устарела, но уборка до нее еще не дошла
+            del self._records[key]
+            self._evicted += 1
+            entry = None
+        if entry is None:
+            if not create:
+                return None
+            entry = self._records[key] = [MemoryStorageRecord(), now]
+        else:
+            entry[1] = now
+            self._records.move_to_end(key)
+        return entry[0]
+
+    def _drop_if_empty(self, key: StorageKey, record: MemoryStorageRecord) -> None:
+        if record.state is None and not record.data:
+            del self._records[key]
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = self._record(key, create=True)
+        record.state = state.state if isinstance(state, State) else state
+        self._drop_if_empty(key, record)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        record = self._record(key)
+        return record.state if record is not None else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        record = self._record(key, create=True)
+        record.data = data.copy()
+        self._drop_if_empty(key, record)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        record = self._record(key)
+        return record.data.copy() if record is not None else {}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __bool__(self) -> bool:
+        # Пустое хранилище не должно быть "ложным": Dispatcher подставляет
+        # свой MemoryStorage вместо переданного при `storage or MemoryStorage()`
+        return True
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> dict[str, int]:
+        """
+        Возвращает число хранимых записей и число вытесненных по времени.
+        """
+        return {"contexts": len(self._records), "evicted": self._evicted}
@@ -0,0 +1,248 @@
+"""
+Исполнитель обновлений: по порядку для одного пользователя, параллельно
+для разных, с обратным давлением на прием.
+
+При обычном polling (`handle_as_tasks=False`) обновления обрабатываются
+строго по одному, и медленная отправка менеджеру для одного клиента
+задерживает всех остальных. При `handle_as_tasks=True` обновления одного
+клиента могут обогнать друг друга (например, "Начать" и ответ на вопрос
+о домах).
+
+`UpdateExecutor` — самый внешний middleware обновлений. Он кладет
+обновление в очередь его пользователя и сразу возвращает управление;
+`workers` задач по очереди берут пользователей, у которых есть
+необработанные обновления, и обрабатывают по одному обновлению за раз,
+поэтому одно обновление пользователя не начнется раньше, чем закончится
+предыдущее. Пользователи обслуживаются по кругу, так что клиент с длинной
+очередью не задерживает остальных.
+
+Когда необработанных обновлений становится `high_water`, прием ждет,
+пока их не станет `low_water`: polling перестает вызывать getUpdates,
+а webhook — отвечать Telegram, и Telegram придерживает новые обновления.
+Для этого прием должен ждать `feed_update`: polling запускается
+с `handle_as_tasks=False`, webhook — без обработки в фоне.
+
+Обновления менеджеров (`is_priority`) идут в отдельную приоритетную
+полосу: свободный обработчик сначала берет менеджера, поэтому ответ
+клиенту не ждет за тысячами клиентских сообщений во время всплеска.
+Чтобы клиенты не голодали, после `priority_run` менеджеров подряд, пока
+клиенты ждут, обслуживается один клиент. Обновления менеджеров не
+останавливают прием при `high_water`, но, пока прием остановлен, ждут
+у Telegram вместе с клиентскими. Время от приема до конца обработки
+по полосам пишется в гистограмму `latency` (`bot_update_seconds`);
+ожидание у Telegram в него не входит. Чем больше `high_water`, тем больше
+обновлений прием забирает разом и тем дольше менеджер ждет свободного
+цикла событий (см. `benchmarks/priority_lane_bench.py`).
+
+Хендлер, который ждет следующие обновления того же пользователя
+(сборка альбома или серии сообщений в `forwarding.py`), вызывает
+`yield_turn()`, чтобы они начали обрабатываться, не дожидаясь его.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+from typing import Any
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import TelegramObject, Update
+
+from metrics import Histogram
+
+
+# Передает очередь пользователя следующему обновлению (внутри обработки обновления)
+_turn: ContextVar[Callable[[], None] | None] = ContextVar("update_turn", default=None)
+
+
+def yield_turn() -> None:
+    """
+    Разрешает начать обработку следующих обновлений пользователя,
+    не дожидаясь окончания текущего. Вне `UpdateExecutor` ничего не делает.
+    """
+    release = _turn.get()
+    if release is not None:
+        release()
+
+
+class UpdateExecutor(BaseMiddleware):
+    """
+    Очереди обновлений по пользователям и общий пул обработчиков.
+
+    :param workers: Сколько обновлений (разных пользователей) обрабатывается одновременно.
+    :param high_water: При стольких необработанных обновлениях прием останавливается.
+    :param low_water: Прием возобновляется, когда их становится не больше этого числа
+        (по умолчанию половина `high_water`).
+    :param is_priority: Функция, определяющая по ID пользователя, чьи обновления
+        идут в приоритетную полосу (менеджеры). По умолчанию полоса одна.
+    :param priority_run: Сколько обновлений приоритетной полосы подряд
+        обрабатывается, пока ждут клиенты.
+    """
+    def __init__(
+        self,
+        workers: int = 64,
+        high_water: int = 1000,
+        low_water: int | None = None,
+        is_priority: Callable[[int], bool] | None = None,
+        priority_run: int = 8,
+    ):
+        self.workers = workers
+        self.high_water = high_water
+        self.low_water = high_water // 2 if low_water is None else low_water
+        self.is_priority = is_priority
+        self.priority_run = priority_run
+        # Гистограмма "полоса -> время от приема до конца обработки"; задается снаружи (`Metrics.histogram`)
+        self.latency: dict[tuple[str, ...], Histogram] | None = None
+        # ключ пользователя -> его необработанные обновления; ключ есть, пока
+        # пользователь стоит в одной из полос или его обновление обрабатывается
+        self._queues: dict[int | None, deque] = {}
+        # Пользователи, готовые к обработке: приоритетная полоса и клиентская
+        self._lanes: tuple[deque, deque] = (deque(), deque())
+        # Сколько пользователей стоит в полосах (обработчики ждут на нем)
+        self._ready: asyncio.Semaphore | None = None
+        # Сколько раз подряд взята приоритетная полоса, пока ждут клиенты
+        self._run = 0
+        self._tasks: list[asyncio.Task] = []
+        self._resume: asyncio.Event | None = None
+        self._idle: asyncio.Event | None = None
+        self._pending = 0
+        self._processed = 0
+        self._throttled = 0
+
+    def install(self, dp: Dispatcher) -> None:
+        """
+        Ставит исполнитель первым среди внешних middleware обновлений,
+        чтобы FSM, трассировка и обработка ошибок выполнялись уже в очереди
+        пользователя, а его остановку — первой среди хендлеров `dp.shutdown`:
+        принятые обновления дообрабатываются до закрытия хранилища FSM.
+        """
+        existing = list(dp.update.outer_middleware)
+        for middleware in existing:
+            dp.update.outer_middleware.unregister(middleware)
+        dp.update.outer_middleware(self)
+        for middleware in existing:
+            dp.update.outer_middleware(middleware)
+        hooks = list(dp.shutdown.handlers)
+        dp.shutdown.handlers.clear()
+        dp.shutdown.register(self.close)
+        dp.shutdown.handlers.extend(hooks)
+
+    def _start(self) -> None:
+        # Задачи и события создаются в работающем цикле событий, при первом обновлении
+        self._ready = asyncio.Semaphore(0)
+        self._resume = asyncio.Event()
+        self._resume.set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+        if not self._tasks:
+            self._start()
+        context = UserContextMiddleware.resolve_event_context(event)
+        key = context.user_id if context.user_id is not None else context.chat_id
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._put(key)
+        queue.append((handler, event, data, time.perf_counter()))
+        self._pending += 1
+        self._idle.clear()
+        if self._is_priority(key):
+            # Менеджеры не ждут разбора клиентской очереди
+            return None
+        if self._pending >= self.high_water:
+            # Обратное давление: прием ждет, пока очередь не разберется
+            self._resume.clear()
+            self._throttled += 1
+        await self._resume.wait()
+        return None
+
+    def _is_priority(self, key: int | None) -> bool:
+        return self.is_priority is not None and key is not None and self.is_priority(key)
+
+    def _put(self, key: int | None) -> None:
+        self._lanes[0 if self._is_priority(key) else 1].append(key)
+        self._ready.release()
+
+    def _next(self) -> int | None:
+        """
+        Берет следующего пользователя: из приоритетной полосы, пока она не пуста,
+        но не больше `priority_run` раз подряд, если ждут клиенты.
+        """
+        priority, clients = self._lanes
+        if priority and (self._run < self.priority_run or not clients):
+            self._run = self._run + 1 if clients else 0
+            return priority.popleft()
+        self._run = 0
+        return clients.popleft()
+
+    async def _work(self) -> None:
+        while True:
+            await self._ready.acquire()
+            key = self._next()
+            queue = self._queues[key]
+            handler, event, data, accepted = queue.popleft()
+            released = False
+
+            def release() -> None:
+                nonlocal released
+                if released:
+                    return
+                released = True
+                if queue:
+                    # Следующее обновление пользователя — в конец круга своей полосы
+                    self._put(key)
+                else:
+                    del self._queues[key]
+
+            token = _turn.set(release)
+            try:
+                await handler(event, data)
+            except Exception as e:
+                logging.error(f"Ошибка при обработке обновления {event.update_id}: {e}")
+            finally:
+                _turn.reset(token)
+                release()
+                if self.latency is not None:
+                    lane = "managers" if self._is_priority(key) else "clients"
+                    self.latency[(lane,)].observe(time.perf_counter() - accepted)
+                self._pending -= 1
+                self._processed += 1
+                if self._pending <= self.low_water:
+                    self._resume.set()
+                if not self._pending:
+                    self._idle.set()
+
+    async def close(self) -> None:
+        """
+        Дожидается обработки всех принятых обновлений и останавливает обработчики.
+        """
+        if not self._tasks:
+            return
+        await self._idle.wait()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict[str, int]:
+        """
+        Возвращает число необработанных обновлений, пользователей с очередью,
+        обработанных обновлений и остановок приема.
+        """
+        return {
+            "pending": self._pending,
+            "users": len(self._queues),
+            "processed": self._processed,
+            "throttled": self._throttled,
+        }
@@ -3,7 +3,15 @@
 
 Хранит информацию о последнем активном пользователе, чтобы менеджер
 мог отправлять сообщения, не отвечая на конкретное сообщение.
+При нескольких менеджерах у каждого свой последний активный клиент.
 """
+import sqlite3
+
+from manager_router import ManagerRouter
+
+# Ключ общей (не привязанной к менеджеру) сессии в SharedUserSession
+_GLOBAL = 0
+
 
 class UserSession:
     """
@@ -11,20 +19,30 @@ class UserSession:
 
     В более сложных системах это можно заменить на хранилище в Redis
     или базе данных для сохранения состояния м��жду перезапусками бота.
+
+    Если передан `manager_router`, пользователь дополнительно становится
+    активным у своего менеджера.
     """
-    def __init__(self):
+    def __init__(self, manager_router: ManagerRouter | None = None):
         self._active_user_id: int | None = None
+        self.manager_router = manager_router
+        self._active_by_manager: dict[int, int] = {}
 
     def set_active_user(self, user_id: int) -> None:
         """
         Устанавливает пользователя как последнего активного.
         """
         self._active_user_id = user_id
+        if self.manager_router is not None:
+            self._active_by_manager[self.manager_router.assign(user_id)] = user_id
 
-    def get_active_user(self) -> int | None:
+    def get_active_user(self, manager_id: int | None = None) -> int | None:
         """
-        Возвращает ID последнего активного пользователя.
+        Возвращает ID последнего активного пользователя (у менеджера
+        `manager_id`, если включена маршрутизация).
         """
+        if manager_id is not None and self.manager_router is not None:
+            return self._active_by_manager.get(manager_id)
         return self._active_user_id
 
     def clear(self) -> None:
@@ -32,4 +50,47 @@ class UserSession:
         Сбрасывает сессию (очищает ID активного пользователя).
         """
         self._active_user_id = None
- 
\ No newline at end of file
+        self._active_by_manager.clear()
+
+    def close(self) -> None:
+        """
+        Освобождает ресурсы сессии (для сессии в памяти ничего не делает).
+        """
+
+
+class SharedUserSession(UserSession):
+    """
+    Сессия в общей базе SQLite для режима нескольких процессов
+    (BOT_WORKERS > 1): клиента делает активным процесс клиента,
+    а читает — процесс менеджера.
+    """
+    def __init__(self, path: str, manager_router: ManagerRouter | None = None):
+        super().__init__(manager_router)
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS active_users ("
+            "manager_id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL)"
+        )
+
+    def _put(self, manager_id: int, user_id: int) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO active_users (manager_id, user_id) VALUES (?, ?)", (manager_id, user_id)
+        )
+
+    def set_active_user(self, user_id: int) -> None:
+        self._put(_GLOBAL, user_id)
+        if self.manager_router is not None:
+            self._put(self.manager_router.assign(user_id), user_id)
+
+    def get_active_user(self, manager_id: int | None = None) -> int | None:
+        if manager_id is None or self.manager_router is None:
+            manager_id = _GLOBAL
+        row = self._db.execute("SELECT user_id FROM active_users WHERE manager_id = ?", (manager_id,)).fetchone()
+        return row[0] if row else None
+
+    def clear(self) -> None:
+        self._db.execute("DELETE FROM active_users")
+
+    def close(self) -> None:
+        self._db.close()
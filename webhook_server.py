@@ -0,0 +1,112 @@
+"""
+Модуль для приема обновлений через webhook.
+
+Альтернатива long polling: aiohttp-сервер принимает обновления от Telegram,
+проверяет секретный токен, сразу отвечает 200 OK и передает обновление
+в существующий `Dispatcher` в фоновой задаче.
+"""
+import asyncio
+import logging
+import os
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения при старте модуля
+load_dotenv()
+
+
+class WebhookConfig:
+    """
+    Настройки режима приема обновлений, прочитанные из переменных окружения.
+
+    - BOT_MODE: "polling" (по умолчанию) или "webhook".
+    - WEBHOOK_URL: публичный адрес, который сообщается Telegram через setWebhook.
+    - WEBHOOK_PATH: путь, на котором сервер принимает обновления.
+    - WEBHOOK_SECRET: секрет для заголовка X-Telegram-Bot-Api-Secret-Token.
+    - WEBHOOK_HOST / WEBHOOK_PORT: адрес, который слушает aiohttp-сервер.
+    """
+    def __init__(self):
+        self.mode = os.getenv("BOT_MODE", "polling").strip().lower()
+        self.url = os.getenv("WEBHOOK_URL", "")
+        self.path = os.getenv("WEBHOOK_PATH", "/webhook")
+        self.secret = os.getenv("WEBHOOK_SECRET") or None
+        self.host = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+        self.port = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+    @property
+    def is_webhook(self) -> bool:
+        """
+        Возвращает True, если бот должен работать в режиме webhook.
+        """
+        return self.mode == "webhook"
+
+
+def build_webhook_app(
+    dp: Dispatcher,
+    bot: Bot,
+    config: WebhookConfig,
+    handle_in_background: bool = True
+) -> web.Application:
+    """
+    Создает aiohttp-приложение, которое принимает обновления от Telegram.
+
+    Запрос с неверным секретом отклоняется (401). Корректный запрос
+    подтверждается сразу, а само обновление обрабатывается диспетчером
+    в фоне, поэтому Telegram не ждет окончания работы хендлеров.
+    При `handle_in_background=False` ответ отправляется после `feed_update`:
+    так `UpdateExecutor` может придержать прием, когда очередь переполнена.
+    """
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=config.secret,
+        handle_in_background=handle_in_background,
+    ).register(app, path=config.path)
+    setup_application(app, dp, bot=bot)
+    # aiogram закрывает сессию бота раньше, чем вызывает dp.shutdown; ставим
+    # dp.shutdown первым, чтобы дообработка очереди еще могла отправлять сообщения
+    app.on_shutdown.insert(0, app.on_shutdown.pop())
+    add_set_webhook(app, bot, config)
+    return app
+
+
+def add_set_webhook(app: web.Application, bot: Bot, config: WebhookConfig) -> None:
+    """
+    Если задан WEBHOOK_URL, при запуске приложения сообщает его Telegram.
+    """
+    if config.url:
+        async def on_startup(_: web.Application) -> None:
+            # Сообщаем Telegram, куда присылать обновления
+            await bot.set_webhook(
+                config.url.rstrip("/") + config.path,
+                secret_token=config.secret,
+            )
+            logging.info(f"Webhook установлен: {config.url}")
+
+        app.on_startup.append(on_startup)
+
+
+async def serve_app(app: web.Application, config: WebhookConfig) -> None:
+    """
+    Запускает aiohttp-приложение и работает, пока задача не будет отменена.
+    """
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=config.host, port=config.port)
+    await site.start()
+    logging.info(f"Webhook-сервер слушает {config.host}:{config.port}{config.path}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, config: WebhookConfig, handle_in_background: bool = True) -> None:
+    """
+    Запускает webhook-сервер диспетчера и работает, пока задача не будет отменена.
+    """
+    await serve_app(build_webhook_app(dp, bot, config, handle_in_background), config)